@@ -272,6 +272,13 @@ def parse_args() -> argparse.Namespace:
         "ENABLE_LLM_CACHE_FOR_EXTRACT", True, bool
     )
     args.enable_llm_cache = get_env_value("ENABLE_LLM_CACHE", True, bool)
+    args.enable_semantic_cache = get_env_value("ENABLE_SEMANTIC_CACHE", False, bool)
+    args.semantic_cache_similarity_threshold = get_env_value(
+        "SEMANTIC_CACHE_SIMILARITY_THRESHOLD", 0.95, float
+    )
+    args.semantic_cache_use_llm_check = get_env_value(
+        "SEMANTIC_CACHE_USE_LLM_CHECK", False, bool
+    )
 
     # Inject LLM temperature configuration
     args.temperature = get_env_value("TEMPERATURE", 0.5, float)
@@ -279,6 +286,10 @@ def parse_args() -> argparse.Namespace:
     # Select Document loading tool (DOCLING, DEFAULT)
     args.document_loading_engine = get_env_value("DOCUMENT_LOADING_ENGINE", "DEFAULT")
 
+    # Document parsing runs in worker processes, killed after the timeout (0: none)
+    args.document_parse_workers = get_env_value("DOCUMENT_PARSE_WORKERS", 2, int)
+    args.document_parse_timeout = get_env_value("DOCUMENT_PARSE_TIMEOUT", 1800, int)
+
     # Add environment variables that were previously read directly
     args.cors_origins = get_env_value("CORS_ORIGINS", "*")
     args.summary_language = get_env_value("SUMMARY_LANGUAGE", "English")
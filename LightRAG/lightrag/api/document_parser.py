@@ -0,0 +1,265 @@
+"""
+Document parsing off the API event loop.
+
+PDF, DOCX, PPTX and XLSX extraction (PyPDF2, python-docx, python-pptx,
+openpyxl or docling) is CPU bound and runs for minutes on large files. Each
+parse runs in its own worker process so it can be killed on timeout or
+cancellation, which a shared pool cannot do for a single job. At most
+`max_workers` parses run at once, and docling parses, which load large
+models, one at a time.
+
+Workers write the extracted text to a temporary file, page by page where the
+format allows, and report progress over a pipe. The caller streams the file
+into the pipeline, so neither process holds the whole text twice.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import traceback
+from pathlib import Path
+from typing import Awaitable, Callable, TextIO
+
+# Extensions parsed in worker processes
+PARSED_FILE_EXTENSIONS = frozenset((".pdf", ".docx", ".pptx", ".xlsx"))
+# Seconds between checks of a worker's pipe, deadline and liveness
+POLL_INTERVAL = 0.5
+
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+
+class DocumentParseError(Exception):
+    """Parsing failed, timed out or its worker died"""
+
+
+# --- Worker side -----------------------------------------------------------
+
+
+def _extract_with_docling(file_path: str, out: TextIO, progress: Callable):
+    import pipmaster as pm
+
+    if not pm.is_installed("docling"):  # type: ignore
+        pm.install("docling")
+    from docling.document_converter import DocumentConverter  # type: ignore
+
+    converter = DocumentConverter()
+    result = converter.convert(file_path)
+    out.write(result.document.export_to_markdown())
+
+
+def _extract_pdf(file_path: str, out: TextIO, progress: Callable):
+    import pipmaster as pm
+
+    if not pm.is_installed("pypdf2"):  # type: ignore
+        pm.install("pypdf2")
+    from PyPDF2 import PdfReader  # type: ignore
+
+    reader = PdfReader(file_path)
+    total = len(reader.pages)
+    for i, page in enumerate(reader.pages):
+        out.write(page.extract_text() + "\n")
+        progress(i + 1, total)
+
+
+def _extract_docx(file_path: str, out: TextIO, progress: Callable):
+    import pipmaster as pm
+
+    if not pm.is_installed("python-docx"):  # type: ignore
+        try:
+            pm.install("python-docx")
+        except Exception:
+            pm.install("docx")
+    from docx import Document  # type: ignore
+
+    doc = Document(file_path)
+    out.write("\n".join([paragraph.text for paragraph in doc.paragraphs]))
+
+
+def _extract_pptx(file_path: str, out: TextIO, progress: Callable):
+    import pipmaster as pm
+
+    if not pm.is_installed("python-pptx"):  # type: ignore
+        pm.install("pptx")
+    from pptx import Presentation  # type: ignore
+
+    prs = Presentation(file_path)
+    total = len(prs.slides)
+    for i, slide in enumerate(prs.slides):
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                out.write(shape.text + "\n")
+        progress(i + 1, total)
+
+
+def _extract_xlsx(file_path: str, out: TextIO, progress: Callable):
+    import pipmaster as pm
+
+    if not pm.is_installed("openpyxl"):  # type: ignore
+        pm.install("openpyxl")
+    from openpyxl import load_workbook  # type: ignore
+
+    wb = load_workbook(file_path)
+    total = len(wb.sheetnames)
+    for i, sheet in enumerate(wb):
+        out.write(f"Sheet: {sheet.title}\n")
+        for row in sheet.iter_rows(values_only=True):
+            out.write(
+                "\t".join(str(cell) if cell is not None else "" for cell in row)
+                + "\n"
+            )
+        out.write("\n")
+        progress(i + 1, total)
+
+
+_EXTRACTORS = {
+    ".pdf": _extract_pdf,
+    ".docx": _extract_docx,
+    ".pptx": _extract_pptx,
+    ".xlsx": _extract_xlsx,
+}
+
+
+def _parse_worker(conn, ext: str, file_path: str, out_path: str, engine: str):
+    """Entry point of a worker process, reports ("progress", done, total), ("done",) or ("error", message)"""
+    try:
+        extractor = (
+            _extract_with_docling if engine == "DOCLING" else _EXTRACTORS[ext]
+        )
+        with open(out_path, "w", encoding="utf-8", newline="") as out:
+            extractor(
+                file_path, out, lambda done, total: conn.send(("progress", done, total))
+            )
+        conn.send(("done",))
+    except BaseException as e:
+        conn.send(("error", f"{type(e).__name__}: {e}\n{traceback.format_exc()}"))
+    finally:
+        conn.close()
+
+
+# --- Parent side -----------------------------------------------------------
+
+
+def _mp_context():
+    # Workers must not inherit the threads and locks of the server process
+    if sys.platform != "win32":
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class DocumentParserPool:
+    def __init__(self, max_workers: int = 2, timeout: float = 0):
+        """
+        Args:
+            max_workers: Maximum number of documents parsed at once
+            timeout: Seconds after which a parse is killed, 0 for no limit
+        """
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self._ctx = _mp_context()
+        self._slots: asyncio.Semaphore | None = None
+        self._docling_slot: asyncio.Semaphore | None = None
+        self._workers: set = set()
+
+    def _semaphores(self) -> tuple[asyncio.Semaphore, asyncio.Semaphore]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+            self._docling_slot = asyncio.Semaphore(1)
+        return self._slots, self._docling_slot
+
+    async def parse(
+        self,
+        file_path: Path,
+        engine: str = "DEFAULT",
+        on_progress: ProgressCallback | None = None,
+    ) -> str:
+        """Extract the text of `file_path` into a temporary file and return its path
+
+        The caller owns the returned file. Raises DocumentParseError when the
+        parse fails, times out or its worker dies; cancelling the calling task
+        kills the worker.
+        """
+        ext = file_path.suffix.lower()
+        if ext not in PARSED_FILE_EXTENSIONS:
+            raise ValueError(f"Unsupported file type: {ext}")
+        slots, docling_slot = self._semaphores()
+        async with slots:
+            if engine == "DOCLING":
+                async with docling_slot:
+                    return await self._run(file_path, ext, engine, on_progress)
+            return await self._run(file_path, ext, engine, on_progress)
+
+    async def _run(
+        self,
+        file_path: Path,
+        ext: str,
+        engine: str,
+        on_progress: ProgressCallback | None,
+    ) -> str:
+        fd, out_path = tempfile.mkstemp(prefix="lightrag-parse-", suffix=".txt")
+        os.close(fd)
+        parent_conn, child_conn = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=_parse_worker,
+            args=(child_conn, ext, str(file_path), out_path, engine),
+            name=f"lightrag-parse-{file_path.name}",
+            daemon=True,
+        )
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        succeeded = False
+        try:
+            await asyncio.to_thread(process.start)
+            child_conn.close()
+            self._workers.add(process)
+            while True:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise DocumentParseError(
+                        f"Parsing {file_path.name} timed out after {self.timeout}s"
+                    )
+                if not await asyncio.to_thread(parent_conn.poll, POLL_INTERVAL):
+                    if not process.is_alive() and not parent_conn.poll():
+                        raise DocumentParseError(
+                            f"Parser of {file_path.name} exited with code {process.exitcode}"
+                        )
+                    continue
+                try:
+                    message = parent_conn.recv()
+                except EOFError:
+                    # The worker died without reporting, e.g. killed for memory
+                    await asyncio.to_thread(process.join, POLL_INTERVAL)
+                    raise DocumentParseError(
+                        f"Parser of {file_path.name} exited with code {process.exitcode}"
+                    ) from None
+                if message[0] == "progress":
+                    if on_progress is not None:
+                        await on_progress(message[1], message[2])
+                elif message[0] == "done":
+                    succeeded = True
+                    return out_path
+                else:
+                    raise DocumentParseError(
+                        f"Failed to parse {file_path.name}: {message[1]}"
+                    )
+        finally:
+            # Also reached on timeout and when the calling task is cancelled
+            if process.is_alive():
+                process.kill()
+            if process.pid is not None:
+                await asyncio.to_thread(process.join, 5)
+            self._workers.discard(process)
+            parent_conn.close()
+            if not succeeded:
+                os.unlink(out_path)
+
+    def shutdown(self):
+        """Kill the workers of parses still running"""
+        for process in list(self._workers):
+            if process.is_alive():
+                process.kill()
+        self._workers.clear()
@@ -42,6 +42,7 @@ from lightrag.api.routers.document_routes import (
     DocumentManager,
     create_document_routes,
     run_scanning_process,
+    shutdown_document_parser_pool,
 )
 from lightrag.api.routers.query_routes import create_query_routes
 from lightrag.api.routers.graph_routes import create_graph_routes
@@ -150,6 +151,8 @@ def create_app(args):
             yield
 
         finally:
+            # Stop parses of uploads still running
+            shutdown_document_parser_pool()
             # Clean up database connections
             await rag.finalize_storages()
 
@@ -344,6 +347,7 @@ def create_app(args):
             if args.llm_binding == "lollms" or args.llm_binding == "ollama"
             else {},
             embedding_func=embedding_func,
+            embedding_disk_cache_model_key=f"{args.embedding_binding}:{args.embedding_model}@{args.embedding_binding_host}",
             kv_storage=args.kv_storage,
             graph_storage=args.graph_storage,
             vector_storage=args.vector_storage,
@@ -353,6 +357,11 @@ def create_app(args):
             },
             enable_llm_cache_for_entity_extract=args.enable_llm_cache_for_extract,
             enable_llm_cache=args.enable_llm_cache,
+            embedding_cache_config={
+                "enabled": args.enable_semantic_cache,
+                "similarity_threshold": args.semantic_cache_similarity_threshold,
+                "use_llm_check": args.semantic_cache_use_llm_check,
+            },
             rerank_model_func=rerank_model_func,
             auto_manage_storages_states=False,
             max_parallel_insert=args.max_parallel_insert,
@@ -373,6 +382,7 @@ def create_app(args):
             llm_model_max_async=args.max_async,
             llm_model_max_token_size=args.max_tokens,
             embedding_func=embedding_func,
+            embedding_disk_cache_model_key=f"{args.embedding_binding}:{args.embedding_model}@{args.embedding_binding_host}",
             kv_storage=args.kv_storage,
             graph_storage=args.graph_storage,
             vector_storage=args.vector_storage,
@@ -382,6 +392,11 @@ def create_app(args):
             },
             enable_llm_cache_for_entity_extract=args.enable_llm_cache_for_extract,
             enable_llm_cache=args.enable_llm_cache,
+            embedding_cache_config={
+                "enabled": args.enable_semantic_cache,
+                "similarity_threshold": args.semantic_cache_similarity_threshold,
+                "use_llm_check": args.semantic_cache_use_llm_check,
+            },
             rerank_model_func=rerank_model_func,
             auto_manage_storages_states=False,
             max_parallel_insert=args.max_parallel_insert,
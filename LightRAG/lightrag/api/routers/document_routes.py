@@ -3,12 +3,13 @@ This module contains all document-related routes for the LightRAG API.
 """
 
 import asyncio
+import os
+import time
 from pyuca import Collator
 from lightrag.utils import logger
 import aiofiles
 import shutil
 import traceback
-import pipmaster as pm
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Literal
@@ -25,6 +26,11 @@ from pydantic import BaseModel, Field, field_validator
 from lightrag import LightRAG
 from lightrag.base import DeletionResult, DocProcessingStatus, DocStatus
 from lightrag.api.utils_api import get_combined_auth_dependency
+from lightrag.api.document_parser import (
+    PARSED_FILE_EXTENSIONS,
+    DocumentParseError,
+    DocumentParserPool,
+)
 from ..config import global_args
 
 
@@ -61,6 +67,45 @@ router = APIRouter(
 # Temporary file prefix
 temp_prefix = "__tmp__"
 
+# Extensions read as UTF-8 text and streamed into the pipeline
+TEXT_FILE_EXTENSIONS = frozenset(
+    (
+        ".txt",
+        ".md",
+        ".html",
+        ".htm",
+        ".tex",
+        ".json",
+        ".xml",
+        ".yaml",
+        ".yml",
+        ".rtf",
+        ".odt",
+        ".epub",
+        ".csv",
+        ".log",
+        ".conf",
+        ".ini",
+        ".properties",
+        ".sql",
+        ".bat",
+        ".sh",
+        ".c",
+        ".cpp",
+        ".py",
+        ".java",
+        ".js",
+        ".ts",
+        ".swift",
+        ".go",
+        ".rb",
+        ".php",
+        ".css",
+        ".scss",
+        ".less",
+    )
+)
+
 
 def sanitize_filename(filename: str, input_dir: Path) -> str:
     """
@@ -256,7 +301,9 @@ class ClearCacheRequest(BaseModel):
     """
 
     modes: Optional[
-        List[Literal["default", "naive", "local", "global", "hybrid", "mix"]]
+        List[
+            Literal["default", "naive", "local", "global", "hybrid", "mix", "keywords"]
+        ]
     ] = Field(
         default=None,
         description="Modes of cache to clear. If None, clears all cache.",
@@ -549,6 +596,62 @@ class DocumentManager:
         return any(filename.lower().endswith(ext) for ext in self.supported_extensions)
 
 
+_document_parser_pool: DocumentParserPool | None = None
+
+
+def get_document_parser_pool() -> DocumentParserPool:
+    global _document_parser_pool
+    if _document_parser_pool is None:
+        _document_parser_pool = DocumentParserPool(
+            max_workers=global_args.document_parse_workers,
+            timeout=global_args.document_parse_timeout,
+        )
+    return _document_parser_pool
+
+
+def shutdown_document_parser_pool():
+    """Kill parses still running, called on server shutdown"""
+    if _document_parser_pool is not None:
+        _document_parser_pool.shutdown()
+
+
+async def parse_document_file(file_path: Path) -> str:
+    """Parse a PDF/DOCX/PPTX/XLSX file in a worker process, reporting progress to the pipeline status
+
+    Returns:
+        str: Path of a temporary file holding the extracted text, owned by the caller
+    """
+    from lightrag.kg.shared_storage import (
+        get_namespace_data,
+        get_pipeline_status_lock,
+    )
+
+    pipeline_status = await get_namespace_data("pipeline_status")
+    pipeline_status_lock = get_pipeline_status_lock()
+
+    async def report(message: str, history: bool = True):
+        async with pipeline_status_lock:
+            pipeline_status["latest_message"] = message
+            if history:
+                pipeline_status["history_messages"].append(message)
+
+    async def on_progress(done: int, total: int):
+        await report(f"Parsing {file_path.name}: {done}/{total}", history=False)
+
+    engine = global_args.document_loading_engine
+    start = time.monotonic()
+    await report(f"Parsing {file_path.name} ({engine.lower()} engine)")
+    try:
+        text_file = await get_document_parser_pool().parse(
+            file_path, engine, on_progress
+        )
+    except DocumentParseError as e:
+        await report(f"Failed to parse {file_path.name}: {str(e).splitlines()[0]}")
+        raise
+    await report(f"Parsed {file_path.name} in {time.monotonic() - start:.1f}s")
+    return text_file
+
+
 async def pipeline_enqueue_file(rag: LightRAG, file_path: Path) -> bool:
     """Add a file to the queue for processing
 
@@ -560,182 +663,58 @@ async def pipeline_enqueue_file(rag: LightRAG, file_path: Path) -> bool:
     """
 
     try:
-        content = ""
         ext = file_path.suffix.lower()
 
-        file = None
-        async with aiofiles.open(file_path, "rb") as f:
-            file = await f.read()
-
         # Process based on file type
         match ext:
-            case (
-                ".txt"
-                | ".md"
-                | ".html"
-                | ".htm"
-                | ".tex"
-                | ".json"
-                | ".xml"
-                | ".yaml"
-                | ".yml"
-                | ".rtf"
-                | ".odt"
-                | ".epub"
-                | ".csv"
-                | ".log"
-                | ".conf"
-                | ".ini"
-                | ".properties"
-                | ".sql"
-                | ".bat"
-                | ".sh"
-                | ".c"
-                | ".cpp"
-                | ".py"
-                | ".java"
-                | ".js"
-                | ".ts"
-                | ".swift"
-                | ".go"
-                | ".rb"
-                | ".php"
-                | ".css"
-                | ".scss"
-                | ".less"
-            ):
+            case _ if ext in TEXT_FILE_EXTENSIONS:
                 try:
-                    # Try to decode as UTF-8
-                    content = file.decode("utf-8")
-
-                    # Validate content
-                    if not content or len(content.strip()) == 0:
-                        logger.error(f"Empty content in file: {file_path.name}")
-                        return False
-
-                    # Check if content looks like binary data string representation
-                    if content.startswith("b'") or content.startswith('b"'):
-                        logger.error(
-                            f"File {file_path.name} appears to contain binary data representation instead of text"
+                    async with aiofiles.open(file_path, "rb") as f:
+                        # Check if content looks like binary data string representation
+                        if await f.read(2) in (b"b'", b'b"'):
+                            logger.error(
+                                f"File {file_path.name} appears to contain binary data representation instead of text"
+                            )
+                            return False
+                        await f.seek(0)
+                        doc_id = await rag.apipeline_enqueue_document_stream(
+                            f, file_path=file_path.name
                         )
-                        return False
-
                 except UnicodeDecodeError:
                     logger.error(
                         f"File {file_path.name} is not valid UTF-8 encoded text. Please convert it to UTF-8 before processing."
                     )
                     return False
-            case ".pdf":
-                if global_args.document_loading_engine == "DOCLING":
-                    if not pm.is_installed("docling"):  # type: ignore
-                        pm.install("docling")
-                    from docling.document_converter import DocumentConverter  # type: ignore
-
-                    converter = DocumentConverter()
-                    result = converter.convert(file_path)
-                    content = result.document.export_to_markdown()
-                else:
-                    if not pm.is_installed("pypdf2"):  # type: ignore
-                        pm.install("pypdf2")
-                    from PyPDF2 import PdfReader  # type: ignore
-                    from io import BytesIO
-
-                    pdf_file = BytesIO(file)
-                    reader = PdfReader(pdf_file)
-                    for page in reader.pages:
-                        content += page.extract_text() + "\n"
-            case ".docx":
-                if global_args.document_loading_engine == "DOCLING":
-                    if not pm.is_installed("docling"):  # type: ignore
-                        pm.install("docling")
-                    from docling.document_converter import DocumentConverter  # type: ignore
-
-                    converter = DocumentConverter()
-                    result = converter.convert(file_path)
-                    content = result.document.export_to_markdown()
-                else:
-                    if not pm.is_installed("python-docx"):  # type: ignore
-                        try:
-                            pm.install("python-docx")
-                        except Exception:
-                            pm.install("docx")
-                    from docx import Document  # type: ignore
-                    from io import BytesIO
-
-                    docx_file = BytesIO(file)
-                    doc = Document(docx_file)
-                    content = "\n".join(
-                        [paragraph.text for paragraph in doc.paragraphs]
+
+                if doc_id is None:
+                    logger.error(f"Empty content in file: {file_path.name}")
+                    return False
+                logger.info(f"Successfully fetched and enqueued file: {file_path.name}")
+                return True
+            case _ if ext in PARSED_FILE_EXTENSIONS:
+                # Parsed in a worker process, the text arrives in a file
+                text_file = await parse_document_file(file_path)
+                try:
+                    with open(text_file, "rb") as f:
+                        doc_id = await rag.apipeline_enqueue_document_stream(
+                            f, file_path=file_path.name
+                        )
+                finally:
+                    os.unlink(text_file)
+
+                if doc_id is None:
+                    logger.error(
+                        f"No content could be extracted from file: {file_path.name}"
                     )
-            case ".pptx":
-                if global_args.document_loading_engine == "DOCLING":
-                    if not pm.is_installed("docling"):  # type: ignore
-                        pm.install("docling")
-                    from docling.document_converter import DocumentConverter  # type: ignore
-
-                    converter = DocumentConverter()
-                    result = converter.convert(file_path)
-                    content = result.document.export_to_markdown()
-                else:
-                    if not pm.is_installed("python-pptx"):  # type: ignore
-                        pm.install("pptx")
-                    from pptx import Presentation  # type: ignore
-                    from io import BytesIO
-
-                    pptx_file = BytesIO(file)
-                    prs = Presentation(pptx_file)
-                    for slide in prs.slides:
-                        for shape in slide.shapes:
-                            if hasattr(shape, "text"):
-                                content += shape.text + "\n"
-            case ".xlsx":
-                if global_args.document_loading_engine == "DOCLING":
-                    if not pm.is_installed("docling"):  # type: ignore
-                        pm.install("docling")
-                    from docling.document_converter import DocumentConverter  # type: ignore
-
-                    converter = DocumentConverter()
-                    result = converter.convert(file_path)
-                    content = result.document.export_to_markdown()
-                else:
-                    if not pm.is_installed("openpyxl"):  # type: ignore
-                        pm.install("openpyxl")
-                    from openpyxl import load_workbook  # type: ignore
-                    from io import BytesIO
-
-                    xlsx_file = BytesIO(file)
-                    wb = load_workbook(xlsx_file)
-                    for sheet in wb:
-                        content += f"Sheet: {sheet.title}\n"
-                        for row in sheet.iter_rows(values_only=True):
-                            content += (
-                                "\t".join(
-                                    str(cell) if cell is not None else ""
-                                    for cell in row
-                                )
-                                + "\n"
-                            )
-                        content += "\n"
+                    return False
+                logger.info(f"Successfully fetched and enqueued file: {file_path.name}")
+                return True
             case _:
                 logger.error(
                     f"Unsupported file type: {file_path.name} (extension {ext})"
                 )
                 return False
 
-        # Insert into the RAG queue
-        if content:
-            # Check if content contains only whitespace characters
-            if not content.strip():
-                logger.warning(
-                    f"File contains only whitespace characters. file_paths={file_path.name}"
-                )
-
-            await rag.apipeline_enqueue_documents(content, file_paths=file_path.name)
-            logger.info(f"Successfully fetched and enqueued file: {file_path.name}")
-            return True
-        else:
-            logger.error(f"No content could be extracted from file: {file_path.name}")
-
     except Exception as e:
         logger.error(f"Error processing or enqueueing file {file_path.name}: {str(e)}")
         logger.error(traceback.format_exc())
@@ -1583,7 +1562,7 @@ def create_document_routes(
         Clear cache data from the LLM response cache storage.
 
         This endpoint allows clearing specific modes of cache or all cache if no modes are specified.
-        Valid modes include: "default", "naive", "local", "global", "hybrid", "mix".
+        Valid modes include: "default", "naive", "local", "global", "hybrid", "mix", "keywords".
         - "default" represents extraction cache.
         - Other modes correspond to different query modes.
 
@@ -1598,7 +1577,7 @@ def create_document_routes(
         """
         try:
             # Validate modes if provided
-            valid_modes = ["default", "naive", "local", "global", "hybrid", "mix"]
+            valid_modes = ["default", "naive", "local", "global", "hybrid", "mix", "keywords"]
             if request.modes and not all(mode in valid_modes for mode in request.modes):
                 invalid_modes = [
                     mode for mode in request.modes if mode not in valid_modes
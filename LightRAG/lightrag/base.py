@@ -117,7 +117,8 @@ class QueryParam:
     """Number of complete conversation turns (user-assistant pairs) to consider in the response context."""
 
     ids: list[str] | None = None
-    """List of ids to filter the results."""
+    """List of ids to filter the results: document ids (full_doc_id) or file paths.
+    Entity and relation searches are scoped to the chunks of the selected documents."""
 
     model_func: Callable[..., object] | None = None
     """Optional override for the LLM model function to use for this specific query.
@@ -195,9 +196,32 @@ class BaseVectorStorage(StorageNameSpace, ABC):
 
     @abstractmethod
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding: Any = None,
     ) -> list[dict[str, Any]]:
-        """Query the vector storage and retrieve top_k results."""
+        """Query the vector storage and retrieve top_k results.
+
+        Args:
+            query: The query text
+            top_k: Number of results to return
+            ids: Optional list of ids to filter the results
+            query_embedding: Optional precomputed embedding of `query`. When provided,
+                implementations must use it instead of calling `embedding_func`.
+        """
+
+    async def get_ids_by_filter(self, ids: list[str]) -> list[str]:
+        """Return the ids of vectors selected by an `ids` query filter.
+
+        A vector is selected when its full_doc_id, one of its file paths or one of
+        its source chunk ids is in `ids`. Used to scope entity and relation searches
+        to the chunks of the filtered documents.
+
+        Storages that do not keep a filter index return an empty list.
+        """
+        return []
 
     @abstractmethod
     async def upsert(self, data: dict[str, dict[str, Any]]) -> None:
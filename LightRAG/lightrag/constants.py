@@ -43,6 +43,33 @@ DEFAULT_HISTORY_TURNS = 0
 DEFAULT_COSINE_THRESHOLD = 0.2
 DEFAULT_RELATED_CHUNK_NUMBER = 10
 
+# In-process LRU tier in front of the LLM response cache for query answers
+DEFAULT_QUERY_CACHE_MAX_ENTRIES = 1024
+DEFAULT_QUERY_CACHE_TTL = 0  # seconds, 0 means cached answers never expire
+# Query embeddings kept per semantic cache scope (mode, parameters, generation)
+DEFAULT_SEMANTIC_CACHE_MAX_ENTRIES = 10000
+
+# Adaptive embedding micro-batcher shared by all vector storages
+DEFAULT_EMBEDDING_BATCH_MAX_NUM = 64  # upper bound of the adaptive batch size
+DEFAULT_EMBEDDING_BATCH_MAX_TOKENS = 32768
+DEFAULT_EMBEDDING_BATCH_LINGER = 0.01  # seconds
+DEFAULT_EMBEDDING_BATCH_TARGET_LATENCY = 5.0  # seconds
+
+# Persistent embedding cache (embedding_cache.sqlite), bounded in megabytes
+DEFAULT_EMBEDDING_DISK_CACHE_MAX_MB = 1024
+
+# Executor chunking documents off the event loop: thread, process or none
+DEFAULT_CHUNKING_EXECUTOR = "thread"
+
+# Streamed documents beyond this size (MB of text) are spooled to a content file
+DEFAULT_DOCUMENT_SPOOL_THRESHOLD_MB = 16
+
+# Token counts memoized per Tokenizer, keyed by text digest
+DEFAULT_TOKEN_COUNT_CACHE_SIZE = 16384
+
+# In-process LRU of text chunks read by JsonKVStorage at query time, 0 disables
+DEFAULT_TEXT_CHUNK_CACHE_SIZE = 4096
+
 # Separator for graph fields
 GRAPH_FIELD_SEP = "<SEP>"
 
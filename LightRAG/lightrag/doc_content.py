@@ -0,0 +1,200 @@
+"""
+Streaming ingestion of documents too large to hold as one string.
+
+Text arrives as a stream (async or sync iterator of str/bytes, or a file
+handle) and is cleaned and hashed on the fly exactly like `clean_text` and
+`compute_mdhash_id`, so a streamed document gets the same id as the same text
+inserted whole. Documents up to a size threshold stay in memory and are
+enqueued as usual. Larger ones are spooled to a gzip file per document in the
+content directory; `doc_status` and `full_docs` then keep an empty content
+and the document is chunked from the file, one block at a time.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import codecs
+import gzip
+import os
+import tempfile
+from dataclasses import dataclass
+from hashlib import md5
+from typing import Any, AsyncIterator, Iterator
+
+from .utils import get_content_summary
+
+CONTENT_DIR_NAME = "doc_contents"
+CONTENT_FILE_SUFFIX = ".txt.gz"
+# Characters read from a stream or a content file per step
+READ_BLOCK_CHARS = 1 << 20
+# Characters kept for the summary and content checks of a spooled document
+HEAD_CHARS = 1024
+
+
+def content_file_path(content_dir: str, doc_id: str) -> str:
+    return os.path.join(content_dir, f"{doc_id}{CONTENT_FILE_SUFFIX}")
+
+
+def iter_document_text(
+    file_name: str, block_chars: int = READ_BLOCK_CHARS
+) -> Iterator[str]:
+    """Yield the text of a spooled document block by block"""
+    with gzip.open(file_name, "rt", encoding="utf-8", newline="") as f:
+        while block := f.read(block_chars):
+            yield block
+
+
+def read_document_text(file_name: str) -> str:
+    with gzip.open(file_name, "rt", encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+async def aiter_text_blocks(
+    source: Any, encoding: str = "utf-8"
+) -> AsyncIterator[str]:
+    """Yield text from a str, bytes, (async) iterator of either, or a file handle
+
+    Bytes are decoded incrementally, so multi-byte characters may span
+    blocks. Blocking reads of file handles run in a worker thread.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+
+    def decode(piece: str | bytes, final: bool = False) -> str:
+        if isinstance(piece, str):
+            return piece
+        return decoder.decode(piece, final=final)
+
+    if isinstance(source, (str, bytes)):
+        yield decode(source, final=True)
+        return
+
+    read = getattr(source, "read", None)
+    if read is not None:
+        while True:
+            if asyncio.iscoroutinefunction(read):
+                piece = await read(READ_BLOCK_CHARS)
+            else:
+                piece = await asyncio.to_thread(read, READ_BLOCK_CHARS)
+            if not piece:
+                break
+            yield decode(piece)
+    elif hasattr(source, "__aiter__"):
+        async for piece in source:
+            yield decode(piece)
+    else:
+        iterator = iter(source)
+        while True:
+            piece = await asyncio.to_thread(next, iterator, None)
+            if piece is None:
+                break
+            yield decode(piece)
+    yield decode(b"", final=True)
+
+
+@dataclass
+class SpooledDocument:
+    content: str | None
+    """Raw text when the document stayed under the spool threshold"""
+    temp_file: str | None
+    """Gzip file with the cleaned text otherwise"""
+    doc_hash: str
+    """md5 of the cleaned text, as compute_mdhash_id would compute it"""
+    content_length: int
+    content_summary: str
+    head: str
+    """Start of the cleaned text"""
+
+
+class _CleanTextWriter:
+    """Writes text cleaned like `clean_text` to a gzip file while hashing it"""
+
+    def __init__(self, file_name: str):
+        self._file = gzip.open(file_name, "wt", encoding="utf-8", newline="")
+        self._md5 = md5()
+        self._started = False
+        self._pending_space = ""
+        self.length = 0
+        self.head = ""
+
+    def _emit(self, text: str):
+        text = text.replace("\x00", "")
+        if not text:
+            return
+        self._file.write(text)
+        self._md5.update(text.encode())
+        self.length += len(text)
+        if len(self.head) < HEAD_CHARS:
+            self.head += text[: HEAD_CHARS - len(self.head)]
+
+    def write(self, text: str):
+        # strip() works on the raw text, so trailing whitespace is held back
+        # until it is known not to end the document
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started = True
+        core = text.rstrip()
+        if core:
+            self._emit(self._pending_space)
+            self._emit(core)
+            self._pending_space = text[len(core) :]
+        else:
+            self._pending_space += text
+
+    def close(self) -> str:
+        self._file.close()
+        return self._md5.hexdigest()
+
+
+async def spool_document(
+    source: Any, content_dir: str, threshold_chars: int
+) -> SpooledDocument:
+    """Read `source` into memory, or into a gzip file in `content_dir` once it exceeds `threshold_chars`"""
+    pieces: list[str] = []
+    size = 0
+    writer: _CleanTextWriter | None = None
+    temp_file = None
+    try:
+        async for text in aiter_text_blocks(source):
+            if writer is None:
+                pieces.append(text)
+                size += len(text)
+                if size <= threshold_chars:
+                    continue
+                os.makedirs(content_dir, exist_ok=True)
+                fd, temp_file = tempfile.mkstemp(
+                    dir=content_dir, prefix=".spool-", suffix=CONTENT_FILE_SUFFIX
+                )
+                os.close(fd)
+                writer = _CleanTextWriter(temp_file)
+                text = "".join(pieces)
+                pieces = []
+            await asyncio.to_thread(writer.write, text)
+
+        if writer is None:
+            content = "".join(pieces)
+            cleaned = content.strip().replace("\x00", "")
+            return SpooledDocument(
+                content=content,
+                temp_file=None,
+                doc_hash=md5(cleaned.encode()).hexdigest(),
+                content_length=len(cleaned),
+                content_summary=get_content_summary(cleaned),
+                head=cleaned[:HEAD_CHARS],
+            )
+        doc_hash = await asyncio.to_thread(writer.close)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if temp_file is not None:
+            os.unlink(temp_file)
+        raise
+    return SpooledDocument(
+        content=None,
+        temp_file=temp_file,
+        doc_hash=doc_hash,
+        content_length=writer.length,
+        content_summary=get_content_summary(writer.head),
+        head=writer.head,
+    )
@@ -0,0 +1,312 @@
+"""
+Adaptive micro-batching in front of an embedding function.
+
+Every vector storage of a LightRAG instance embeds through the same batcher.
+Texts from concurrent calls, across namespaces, are queued by priority and
+coalesced into batches bounded by a text count and a token budget. A batch
+leaves the queue as soon as it is full, after a short linger window
+otherwise, and never while all `max_async` request slots are busy, so load
+naturally produces larger batches.
+
+The batch size adapts to what the provider tolerates: it grows while full
+batches return within the target latency, shrinks when they are slow, and
+halves with a pause after rate limiting. Texts of a failed batch larger than
+the configured base size are retried in smaller batches, so growing never
+makes a call fail that would have succeeded without the batcher. A failed
+batch mixing several callers is retried once per caller, so a bad input or
+a transient error only fails the caller it belongs to.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from functools import wraps
+from typing import Any, Callable
+
+import numpy as np
+
+from .utils import Tokenizer, logger
+
+# Attempts per text before the error of its batch is returned to the caller
+MAX_ATTEMPTS = 3
+# Pause after rate limiting, doubled for consecutive rate limits
+RATE_LIMIT_PAUSE = 1.0
+MAX_RATE_LIMIT_PAUSE = 30.0
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    return status == 429 or "RateLimit" in type(error).__name__
+
+
+class _EmbeddingRequest:
+    """One caller's texts, completed once every row has been embedded"""
+
+    __slots__ = ("future", "rows", "remaining")
+
+    def __init__(self, future: asyncio.Future, size: int):
+        self.future = future
+        self.rows: list[Any] = [None] * size
+        self.remaining = size
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        func: Callable[..., Any],
+        max_async: int,
+        batch_size: int,
+        max_batch_size: int,
+        max_batch_tokens: int,
+        linger: float = 0.01,
+        target_latency: float = 5.0,
+        tokenizer: Tokenizer | None = None,
+    ):
+        """
+        Args:
+            func: Embedding function taking a list of texts and `_priority`
+            max_async: Maximum number of batches in flight
+            batch_size: Initial and minimum-guaranteed number of texts per batch
+            max_batch_size: Upper bound the adaptive batch size can grow to
+            max_batch_tokens: Token budget of a batch
+            linger: Seconds to wait for more texts before sending a partial batch
+            target_latency: Full batches slower than this shrink the batch size
+            tokenizer: Used to count tokens, text length is used without it
+        """
+        self.func = func
+        self.max_async = max_async
+        self.base_batch_size = max(1, batch_size)
+        self.max_batch_size = max(self.base_batch_size, max_batch_size)
+        self.batch_size = self.base_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.linger = linger
+        self.target_latency = target_latency
+        self.tokenizer = tokenizer
+        self._seq = itertools.count()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._rate_limit_pause = RATE_LIMIT_PAUSE
+        self._paused_until = 0.0
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and not self._dispatcher.done():
+            return
+        # Queue state is bound to the event loop that runs the dispatcher
+        self._loop = loop
+        self._heap: list[tuple] = []
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_async)
+        self._batches: set[asyncio.Task] = set()
+        self._dispatcher = loop.create_task(self._dispatch())
+
+    def _count_tokens(self, text: str) -> int:
+        if self.tokenizer is None:
+            return len(text)
+        return self.tokenizer.count_tokens(text)
+
+    async def embed(self, texts: list[str], priority: int = 10) -> np.ndarray:
+        if not texts:
+            return await self.func(texts, _priority=priority)
+        self._ensure_dispatcher()
+        request = _EmbeddingRequest(self._loop.create_future(), len(texts))
+        for index, text in enumerate(texts):
+            heapq.heappush(
+                self._heap,
+                (
+                    priority,
+                    next(self._seq),
+                    text,
+                    self._count_tokens(text),
+                    request,
+                    index,
+                    1,
+                ),
+            )
+        self._wakeup.set()
+        return await request.future
+
+    async def _dispatch(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self._slots.acquire()
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            elif len(self._heap) < self.batch_size and self.linger > 0:
+                await asyncio.sleep(self.linger)
+
+            batch = self._take_batch()
+            if not batch:
+                self._slots.release()
+                continue
+            self._start(self._run_batch(batch))
+
+    def _start(self, coro):
+        task = asyncio.create_task(coro)
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    def _take_batch(self) -> list[tuple]:
+        batch = []
+        tokens = 0
+        while self._heap and len(batch) < self.batch_size:
+            item = self._heap[0]
+            if item[4].future.done():
+                # The caller is gone (cancelled or already failed)
+                heapq.heappop(self._heap)
+                continue
+            if batch and tokens + item[3] > self.max_batch_tokens:
+                break
+            heapq.heappop(self._heap)
+            batch.append(item)
+            tokens += item[3]
+        return batch
+
+    async def _run_isolated(self, batch: list[tuple]):
+        """Retry the texts of one caller from a failed batch on their own"""
+        await self._slots.acquire()
+        await self._run_batch(batch)
+
+    async def _run_batch(self, batch: list[tuple]):
+        """Embed a batch, the caller must hold one of the request slots"""
+        texts = [item[2] for item in batch]
+        start = time.monotonic()
+        try:
+            embeddings = await self.func(texts, _priority=batch[0][0])
+            if len(embeddings) != len(texts):
+                raise ValueError(
+                    f"embedding is not 1-1 with texts, {len(embeddings)} != {len(texts)}"
+                )
+        except Exception as e:
+            self._on_failure(batch, e)
+        else:
+            self._on_success(len(texts), time.monotonic() - start)
+            for item, row in zip(batch, embeddings):
+                request, index = item[4], item[5]
+                if request.future.done():
+                    continue
+                request.rows[index] = row
+                request.remaining -= 1
+                if request.remaining == 0:
+                    request.future.set_result(np.asarray(request.rows, dtype=np.float32))
+        finally:
+            self._slots.release()
+
+    def _on_success(self, size: int, latency: float):
+        self._rate_limit_pause = RATE_LIMIT_PAUSE
+        if latency > self.target_latency:
+            new_size = max(self.base_batch_size, size * 3 // 4)
+        elif size >= self.batch_size:
+            new_size = min(self.max_batch_size, size + max(1, size // 4))
+        else:
+            return
+        if new_size != self.batch_size:
+            logger.debug(
+                f"Embedding batch size {self.batch_size} -> {new_size} (latency {latency:.2f}s)"
+            )
+            self.batch_size = new_size
+
+    def _on_failure(self, batch: list[tuple], error: Exception):
+        size = len(batch)
+        retry = False
+        if is_rate_limit_error(error):
+            self.batch_size = max(1, size // 2)
+            self._paused_until = time.monotonic() + self._rate_limit_pause
+            self._rate_limit_pause = min(self._rate_limit_pause * 2, MAX_RATE_LIMIT_PAUSE)
+            retry = True
+            logger.warning(
+                f"Embedding rate limited, batch size -> {self.batch_size}: {error}"
+            )
+        elif size > self.base_batch_size:
+            # Treat the failing size as beyond what the provider accepts
+            self.max_batch_size = max(self.base_batch_size, size - 1)
+            self.batch_size = self.base_batch_size
+            retry = True
+            logger.warning(
+                f"Embedding batch of {size} failed, limiting batches to {self.max_batch_size}: {error}"
+            )
+        else:
+            groups: dict[int, list[tuple]] = {}
+            for item in batch:
+                if not item[4].future.done() and item[6] < MAX_ATTEMPTS:
+                    groups.setdefault(id(item[4]), []).append(item)
+            if len(groups) > 1:
+                # Only the caller owning the bad input, if any, should fail
+                logger.warning(
+                    f"Embedding batch of {size} failed, retrying its {len(groups)} callers separately: {error}"
+                )
+                for items in groups.values():
+                    self._start(
+                        self._run_isolated([item[:6] + (item[6] + 1,) for item in items])
+                    )
+                retry_items = {id(item) for items in groups.values() for item in items}
+                batch = [item for item in batch if id(item) not in retry_items]
+
+        for item in batch:
+            request, attempts = item[4], item[6]
+            if request.future.done():
+                continue
+            if retry and attempts < MAX_ATTEMPTS:
+                heapq.heappush(self._heap, item[:6] + (attempts + 1,))
+            else:
+                request.future.set_exception(error)
+        self._wakeup.set()
+
+    async def aclose(self):
+        """Stop the dispatcher and cancel the batches and callers still waiting"""
+        if self._loop is None:
+            return
+        tasks = [self._dispatcher, *self._batches]
+        for task in tasks:
+            task.cancel()
+        for item in self._heap:
+            item[4].future.cancel()
+        self._heap.clear()
+        if self._loop is asyncio.get_running_loop():
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop = None
+
+
+def batched_embedding_func(
+    max_async: int,
+    batch_size: int,
+    max_batch_size: int,
+    max_batch_tokens: int,
+    linger: float = 0.01,
+    target_latency: float = 5.0,
+    tokenizer: Tokenizer | None = None,
+):
+    """Decorator routing calls of an embedding function through an EmbeddingBatcher
+
+    Calls with extra keyword arguments bypass the batcher, since their texts
+    cannot share a request with others. The batcher is exposed as `.batcher`.
+    """
+
+    def final_decro(func):
+        batcher = EmbeddingBatcher(
+            func,
+            max_async=max_async,
+            batch_size=batch_size,
+            max_batch_size=max_batch_size,
+            max_batch_tokens=max_batch_tokens,
+            linger=linger,
+            target_latency=target_latency,
+            tokenizer=tokenizer,
+        )
+
+        @wraps(func)
+        async def wait_func(texts, *args, _priority=10, **kwargs):
+            if args or kwargs:
+                return await func(texts, *args, _priority=_priority, **kwargs)
+            return await batcher.embed(list(texts), priority=_priority)
+
+        wait_func.batcher = batcher
+        return wait_func
+
+    return final_decro
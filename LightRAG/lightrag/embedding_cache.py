@@ -0,0 +1,230 @@
+"""
+Persistent, content-addressed cache in front of an embedding function.
+
+Embeddings are stored in a SQLite file keyed by md5(model key, text), with the
+vector as raw little-endian float32 bytes. The model key names the embedding
+model, its endpoint and dimension, so switching models never returns stale
+vectors; the cache stays off when the model cannot be identified. Several
+working directories (or processes) can share one cache file, which lets
+overlapping corpora and rebuilds reuse embeddings instead of paying for them
+again. The file is bounded by size with least-recently-used eviction.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import os
+import sqlite3
+import threading
+import time
+from functools import partial, wraps
+from hashlib import md5
+from typing import Any, Callable
+
+import numpy as np
+
+from .utils import logger
+
+CACHE_FILE_NAME = "embedding_cache.sqlite"
+# Rough per-row overhead of key, timestamp and b-tree pages
+ROW_OVERHEAD_BYTES = 64
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def embedding_model_key(
+    embedding_func: Any, model_name: str | None = None
+) -> str | None:
+    """Identify the model behind `embedding_func`, e.g. 'text-embedding-3-small@https://api.openai.com/v1:1536'
+
+    `model_name` wins when given. Otherwise the model and endpoint (`base_url`
+    or `host`) are taken from functools.partial keywords or the parameter
+    defaults of the wrapped function. Returns None when no model can be
+    found, e.g. for a lambda, since a guessed key could serve the vectors of
+    another model with the same dimension.
+    """
+    dim = getattr(embedding_func, "embedding_dim", "")
+    if model_name:
+        return f"{model_name}:{dim}"
+
+    func = getattr(embedding_func, "func", embedding_func)
+    keywords: dict[str, Any] = {}
+    while isinstance(func, partial):
+        # Keywords of outer partials override those of inner ones
+        for name, value in func.keywords.items():
+            keywords.setdefault(name, value)
+        func = func.func
+    try:
+        parameters = inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        parameters = {}
+
+    def lookup(*names: str) -> str | None:
+        for name in names:
+            value = keywords.get(name)
+            if value is None and name in parameters:
+                value = parameters[name].default
+            if isinstance(value, str) and value:
+                return value
+        return None
+
+    model = lookup("model", "embed_model")
+    if model is None:
+        return None
+    endpoint = lookup("base_url", "host")
+    return f"{model}@{endpoint}:{dim}" if endpoint else f"{model}:{dim}"
+
+
+class EmbeddingDiskCache:
+    """Size-bounded LRU store of float32 embeddings in a SQLite file"""
+
+    def __init__(self, file_name: str, model_key: str, dim: int, max_bytes: int):
+        self.file_name = file_name
+        self.model_key = model_key
+        self.dim = dim
+        self.max_entries = max(1, max_bytes // (dim * 4 + ROW_OVERHEAD_BYTES))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+        self._conn = sqlite3.connect(file_name, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            # WAL lets processes sharing the file read while one writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)"
+            )
+            (self._entries,) = self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()
+        logger.info(
+            f"Embedding cache {file_name}: {self._entries} entries, max {self.max_entries}"
+        )
+
+    def key(self, text: str) -> bytes:
+        return md5(f"{self.model_key}\x00{text}".encode("utf-8")).digest()
+
+    def get_many(self, keys: list[bytes]) -> dict[bytes, np.ndarray]:
+        """Cached vectors of `keys`, marking them as recently used"""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock, self._conn:
+            for i in range(0, len(unique), _SQL_BATCH):
+                part = unique[i : i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(part))
+                for key, vector in self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    part,
+                ):
+                    if len(vector) == self.dim * 4:
+                        found[key] = np.frombuffer(vector, dtype="<f4")
+                if found:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                        [time.time(), *part],
+                    )
+        return found
+
+    def put_many(self, items: list[tuple[bytes, np.ndarray]]):
+        now = time.time()
+        rows = [
+            (key, np.asarray(vector, dtype="<f4").tobytes(), now)
+            for key, vector in items
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._entries += len(rows)
+            if self._entries > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # Other processes may have written too, so count exactly before evicting
+        (self._entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = self._entries - self.max_entries
+        if excess <= 0:
+            return
+        # Evict a little extra so eviction does not run on every insert
+        excess += self.max_entries // 20
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._entries = max(0, self._entries - excess)
+        logger.debug(f"Embedding cache evicted {excess} entries")
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._entries,
+            "max_entries": self.max_entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def cached_embedding_func(cache: EmbeddingDiskCache):
+    """Decorator serving embeddings from `cache` and embedding only the misses
+
+    The cache is exposed as `.cache` on the decorated function.
+    """
+
+    def final_decro(func: Callable[..., Any]):
+        @wraps(func)
+        async def wait_func(texts, *args, **kwargs):
+            texts = list(texts)
+            if not texts:
+                return await func(texts, *args, **kwargs)
+            keys = [cache.key(text) for text in texts]
+            found = await asyncio.to_thread(cache.get_many, keys)
+
+            # Embed each missing text once, even if it repeats in this call
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in found:
+                    missing.setdefault(key, text)
+            cache.hits += len(texts) - sum(key not in found for key in keys)
+            cache.misses += len(missing)
+
+            if missing:
+                embeddings = await func(list(missing.values()), *args, **kwargs)
+                if len(embeddings) != len(missing) or np.shape(embeddings)[1:] != (
+                    cache.dim,
+                ):
+                    if not found:
+                        # Let the storage report the mismatch as before
+                        return embeddings
+                    raise ValueError(
+                        f"Embedding shape {np.shape(embeddings)} does not match "
+                        f"{len(missing)} texts of dimension {cache.dim}"
+                    )
+                computed = list(zip(missing, embeddings))
+                found.update(
+                    (key, np.asarray(vector, dtype=np.float32)) for key, vector in computed
+                )
+                await asyncio.to_thread(cache.put_many, computed)
+
+            matrix = np.empty((len(texts), cache.dim), dtype=np.float32)
+            for i, key in enumerate(keys):
+                matrix[i] = found[key]
+            return matrix
+
+        wait_func.cache = cache
+        return wait_func
+
+    return final_decro
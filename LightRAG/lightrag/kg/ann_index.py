@@ -0,0 +1,317 @@
+"""
+Approximate nearest neighbour helpers for the file-based vector storages.
+
+`IVFIndex` is a numpy inverted-file index over an externally owned matrix of
+normalized vectors: rows are clustered around `nlist` centroids and a query
+only scores the rows of its `nprobe` closest clusters. `recall_latency_report`
+compares any approximate search against exact search.
+"""
+
+import os
+import time
+from typing import Any, Callable, Sequence
+
+import numpy as np
+
+from lightrag.utils import logger
+
+# Below this many rows exact search is cheap enough and the index stays idle
+DEFAULT_ANN_MIN_ROWS = 10000
+DEFAULT_NPROBE = 8
+# Retrain once the matrix has grown this many times past the training size
+RETRAIN_GROWTH_FACTOR = 4
+
+
+def default_nlist(n_rows: int) -> int:
+    """Rule of thumb: about sqrt(n) clusters, bounded to a sane range"""
+    return int(min(max(np.sqrt(n_rows), 16), 4096))
+
+
+def _nearest_centroids(centroids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for i in range(0, len(vectors), 65536):
+        assign[i : i + 65536] = np.argmax(
+            np.asarray(vectors[i : i + 65536]) @ centroids.T, axis=1
+        )
+    return assign
+
+
+def top_k_by_score(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Positions of the top_k highest scores, best first"""
+    k = min(top_k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class IVFIndex:
+    """Inverted-file index whose row numbers follow an external vector matrix.
+
+    The owner keeps the index aligned with its matrix by calling `assign` for
+    inserted or updated rows and `remove` when rows are deleted. `search`
+    never trains: it returns None until the index covers every row, so
+    callers fall back to exact search. Training runs off the event loop
+    through `begin_build`, `build` (in a worker thread) and `install`.
+    Centroids survive `invalidate` and can be saved, so a reloaded or
+    restarted owner only reassigns rows instead of training again.
+    """
+
+    def __init__(
+        self,
+        nlist: int | None = None,
+        nprobe: int = DEFAULT_NPROBE,
+        min_rows: int = DEFAULT_ANN_MIN_ROWS,
+        train_iterations: int = 10,
+        seed: int = 0,
+    ):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_rows = min_rows
+        self.train_iterations = train_iterations
+        self._rng = np.random.default_rng(seed)
+        # Bumped whenever rows shift or change, so a build started before is discarded
+        self._epoch = 0
+        # Rows of the matrix snapshot a build in flight works on, 0 when idle
+        self._build_rows = 0
+        self.reset()
+
+    def reset(self):
+        """Drop the trained state, centroids included"""
+        self._centroids: np.ndarray | None = None
+        self._trained_rows = 0
+        self.unsaved = False
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop the row assignment but keep the centroids, e.g. after a reload"""
+        self._epoch += 1
+        self._assign = np.empty(0, dtype=np.int32)
+        self._lists_dirty = True
+        self._order = np.empty(0, dtype=np.int64)
+        self._offsets = np.empty(0, dtype=np.int64)
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    @property
+    def tracks_rows(self) -> bool:
+        """Whether the owner must report row changes through `assign` and `remove`"""
+        return self.is_trained or self._build_rows > 0
+
+    def is_ready(self, n_rows: int) -> bool:
+        return self.is_trained and len(self._assign) == n_rows
+
+    def needs_build(self, n_rows: int) -> bool:
+        """Whether a build should run for a matrix of `n_rows` rows"""
+        if self._build_rows or n_rows < self.min_rows:
+            return False
+        return (
+            not self.is_ready(n_rows)
+            or n_rows > RETRAIN_GROWTH_FACTOR * self._trained_rows
+        )
+
+    def begin_build(self, n_rows: int) -> int:
+        """Mark a build over the first `n_rows` rows as started, returns the token for `install`"""
+        self._build_rows = n_rows
+        return self._epoch
+
+    def end_build(self):
+        self._build_rows = 0
+
+    def build(self, matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray, int]:
+        """Compute (centroids, assignment, trained rows) for `matrix` without changing the index
+
+        Centroids are kept unless there are none yet or the matrix has grown
+        `RETRAIN_GROWTH_FACTOR` times past the training size. Safe to run in
+        a worker thread while the index keeps serving searches.
+        """
+        n_rows = len(matrix)
+        if self.is_trained and n_rows <= RETRAIN_GROWTH_FACTOR * self._trained_rows:
+            centroids, trained_rows = self._centroids, self._trained_rows
+        else:
+            centroids, trained_rows = self._train(matrix), n_rows
+        return centroids, _nearest_centroids(centroids, matrix), trained_rows
+
+    def install(
+        self, state: tuple[np.ndarray, np.ndarray, int], token: int, matrix: np.ndarray
+    ) -> bool:
+        """Adopt the result of `build` unless rows shifted or changed since `begin_build`
+
+        Rows appended to `matrix` meanwhile are assigned here.
+        """
+        n_rows = self._build_rows
+        self.end_build()
+        if token != self._epoch:
+            return False
+        centroids, assign, trained_rows = state
+        if centroids is not self._centroids:
+            self.unsaved = True
+        self._centroids = centroids
+        self._trained_rows = trained_rows
+        self._assign = assign
+        self._lists_dirty = True
+        if len(matrix) > n_rows:
+            rows = np.arange(n_rows, len(matrix))
+            self.assign(rows, matrix[rows])
+        return True
+
+    def _train(self, matrix: np.ndarray) -> np.ndarray:
+        """Spherical k-means on a sample of `matrix`"""
+        n_rows = len(matrix)
+        nlist = min(self.nlist or default_nlist(n_rows), n_rows)
+        sample_size = min(n_rows, nlist * 64)
+        sample = np.asarray(
+            matrix[np.sort(self._rng.choice(n_rows, sample_size, replace=False))],
+            dtype=np.float32,
+        )
+        centroids = sample[self._rng.choice(sample_size, nlist, replace=False)]
+
+        start = time.perf_counter()
+        for _ in range(self.train_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Keep the previous centroid for clusters that lost all members
+            centroids = np.where(norms > 0, sums / np.where(norms > 0, norms, 1), centroids)
+
+        logger.info(
+            f"IVF index trained: {n_rows} rows, {nlist} lists in {time.perf_counter() - start:.2f}s"
+        )
+        return centroids.astype(np.float32)
+
+    def assign(self, rows: np.ndarray, vectors: np.ndarray):
+        """(Re)assign `rows` holding `vectors`, growing the index if needed"""
+        if len(rows) == 0:
+            return
+        rows = np.asarray(rows, dtype=np.int64)
+        if int(rows.min()) < self._build_rows:
+            # A row of the snapshot being built changed
+            self._epoch += 1
+        if not self.is_trained:
+            return
+        size = int(rows.max()) + 1
+        if size > len(self._assign):
+            grown = np.zeros(size, dtype=np.int32)
+            grown[: len(self._assign)] = self._assign
+            self._assign = grown
+        self._assign[rows] = _nearest_centroids(
+            self._centroids, np.asarray(vectors, dtype=np.float32)
+        )
+        self._lists_dirty = True
+
+    def remove(self, keep: np.ndarray):
+        """Drop rows where the boolean mask `keep` is False, compacting row numbers"""
+        self._epoch += 1
+        if not self.is_trained:
+            return
+        self._assign = self._assign[keep[: len(self._assign)]]
+        self._lists_dirty = True
+
+    def save(self, file_name: str):
+        """Write the centroids, the row assignment is cheap to recompute"""
+        if not self.is_trained:
+            return
+        tmp_file = file_name + ".tmp.npz"
+        np.savez(tmp_file, centroids=self._centroids, trained_rows=self._trained_rows)
+        os.replace(tmp_file, file_name)
+        self.unsaved = False
+
+    def load(self, file_name: str, dim: int) -> bool:
+        """Adopt centroids saved by `save`, rows must be reassigned by a build"""
+        try:
+            with np.load(file_name) as saved:
+                centroids = saved["centroids"].astype(np.float32)
+                trained_rows = int(saved["trained_rows"])
+        except Exception as e:
+            logger.warning(f"Could not load IVF centroids from {file_name}: {e}")
+            return False
+        if centroids.ndim != 2 or centroids.shape[1] != dim:
+            return False
+        self.invalidate()
+        self._centroids = centroids
+        self._trained_rows = trained_rows
+        self.unsaved = False
+        return True
+
+    def _rebuild_lists(self):
+        # Rows sorted by list, with list boundaries, so probing is a slice
+        self._order = np.argsort(self._assign, kind="stable")
+        self._offsets = np.searchsorted(
+            self._assign[self._order], np.arange(len(self._centroids) + 1)
+        )
+        self._lists_dirty = False
+
+    def search(
+        self,
+        matrix: np.ndarray,
+        query: np.ndarray,
+        top_k: int,
+        nprobe: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        """Return (rows, scores) best first, or None when exact search should be used"""
+        n_rows = len(matrix)
+        if n_rows < self.min_rows or not self.is_ready(n_rows):
+            return None
+        if self._lists_dirty:
+            self._rebuild_lists()
+
+        nprobe = min(nprobe or self.nprobe, len(self._centroids))
+        probe = top_k_by_score(self._centroids @ query, nprobe)
+        candidates = np.concatenate(
+            [self._order[self._offsets[c] : self._offsets[c + 1]] for c in probe]
+        )
+        scores = np.asarray(matrix[candidates]) @ query
+        top = top_k_by_score(scores, top_k)
+        return candidates[top], scores[top]
+
+
+def recall_latency_report(
+    exact_search: Callable[[np.ndarray, int], Sequence[Any]],
+    ann_search: Callable[[np.ndarray, int, Any], Sequence[Any]],
+    queries: np.ndarray,
+    top_k: int,
+    settings: Sequence[Any],
+) -> list[dict[str, Any]]:
+    """Measure recall@top_k and mean latency of `ann_search` against `exact_search`
+
+    Args:
+        exact_search: fn(query, top_k) -> ids of the exact top_k
+        ann_search: fn(query, top_k, setting) -> ids found by the ANN index
+        queries: Query vectors, one per row
+        top_k: Number of neighbours compared
+        settings: Values passed to `ann_search`, e.g. nprobe or efSearch values
+
+    Returns:
+        One row for exact search, then one row per setting, each with
+        `setting`, `recall` and `latency_ms`
+    """
+    start = time.perf_counter()
+    truth = [set(exact_search(q, top_k)) for q in queries]
+    report = [
+        {
+            "setting": "exact",
+            "recall": 1.0,
+            "latency_ms": 1000 * (time.perf_counter() - start) / max(len(queries), 1),
+        }
+    ]
+
+    for setting in settings:
+        hits = 0
+        expected = 0
+        start = time.perf_counter()
+        found = [ann_search(q, top_k, setting) for q in queries]
+        elapsed = time.perf_counter() - start
+        for exact_ids, ann_ids in zip(truth, found):
+            hits += len(exact_ids.intersection(ann_ids))
+            expected += len(exact_ids)
+        report.append(
+            {
+                "setting": setting,
+                "recall": hits / expected if expected else 1.0,
+                "latency_ms": 1000 * elapsed / max(len(queries), 1),
+            }
+        )
+    return report
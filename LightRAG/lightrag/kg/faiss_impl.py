@@ -6,8 +6,16 @@ import json
 import numpy as np
 from dataclasses import dataclass
 
-from lightrag.utils import logger, compute_mdhash_id
+from lightrag.utils import logger, compute_mdhash_id, stack_embeddings
 from lightrag.base import BaseVectorStorage
+from .filter_index import FilterIndex
+from .ann_index import (
+    DEFAULT_ANN_MIN_ROWS,
+    DEFAULT_NPROBE,
+    default_nlist,
+    recall_latency_report,
+    top_k_by_score,
+)
 
 from .shared_storage import (
     get_storage_lock,
@@ -18,6 +26,9 @@ from .shared_storage import (
 # You must manually install faiss-cpu or faiss-gpu before using FAISS vector db
 import faiss  # type: ignore
 
+# Compact the index once deleted vectors make up more than this share of it
+DEFAULT_COMPACT_RATIO = 0.2
+
 
 @final
 @dataclass
@@ -25,6 +36,15 @@ class FaissVectorDBStorage(BaseVectorStorage):
     """
     A Faiss-based Vector DB Storage for LightRAG.
     Uses cosine similarity by storing normalized vectors in a Faiss index with inner product search.
+
+    Exact flat search is the default. Approximate search is enabled through
+    `vector_db_storage_cls_kwargs`:
+    - ann_index="hnsw": IndexHNSWFlat, tuned by ann_hnsw_m, ann_ef_construction, ann_ef_search
+    - ann_index="ivf": IndexIVFFlat, tuned by ann_nlist and ann_nprobe; it is trained
+      once the storage holds ann_min_rows vectors and a flat index is used before that
+
+    Training and compaction rebuild the index in a worker thread, queries keep
+    using the current index until the new one is swapped in.
     """
 
     def __post_init__(self):
@@ -37,6 +57,20 @@ class FaissVectorDBStorage(BaseVectorStorage):
             )
         self.cosine_better_than_threshold = cosine_threshold
 
+        self._ann_index = kwargs.get("ann_index")
+        if self._ann_index not in (None, "hnsw", "ivf"):
+            raise ValueError(
+                f"FaissVectorDBStorage does not support ann_index={self._ann_index!r}, "
+                "use 'hnsw' or 'ivf'"
+            )
+        self._hnsw_m = kwargs.get("ann_hnsw_m", 32)
+        self._ef_construction = kwargs.get("ann_ef_construction", 200)
+        self._ef_search = kwargs.get("ann_ef_search", 64)
+        self._nlist = kwargs.get("ann_nlist")
+        self._nprobe = kwargs.get("ann_nprobe", DEFAULT_NPROBE)
+        self._ann_min_rows = kwargs.get("ann_min_rows", DEFAULT_ANN_MIN_ROWS)
+        self._compact_ratio = kwargs.get("compact_ratio", DEFAULT_COMPACT_RATIO)
+
         # Where to save index file if you want persistent storage
         working_dir = self.global_config["working_dir"]
         if self.workspace:
@@ -58,12 +92,23 @@ class FaissVectorDBStorage(BaseVectorStorage):
         self._dim = self.embedding_func.embedding_dim
 
         # Create an empty Faiss index for inner product (useful for normalized vectors = cosine similarity).
-        # If you have a large number of vectors, you might want IVF or other indexes.
-        # For demonstration, we use a simple IndexFlatIP.
-        self._index = faiss.IndexFlatIP(self._dim)
+        self._index = self._create_index()
         # Keep a local store for metadata, IDs, etc.
         # Maps <int faiss_id> → metadata (including your original ID).
         self._id_to_meta = {}
+        # Reverse map <custom id> → <int faiss_id>, kept in sync with _id_to_meta
+        self._custom_id_to_fid: dict[str, int] = {}
+        # Faiss ids still in the index but deleted or superseded; searches
+        # exclude them and the next compaction drops them
+        self._tombstones: set[int] = set()
+        # IDSelector excluding the tombstones, rebuilt after they change
+        self._tombstone_selector = None
+        # Inverted index answering `ids` filters, kept in sync with _id_to_meta
+        self._filter_index = FilterIndex()
+        # Bumped whenever the index is reloaded, a rebuild from an older one is discarded
+        self._index_generation = 0
+        # Serializes index rebuilds
+        self._build_lock = asyncio.Lock()
 
         self._load_faiss_index()
 
@@ -84,7 +129,7 @@ class FaissVectorDBStorage(BaseVectorStorage):
                     f"Process {os.getpid()} FAISS reloading {self.namespace} due to update by another process"
                 )
                 # Reload data
-                self._index = faiss.IndexFlatIP(self._dim)
+                self._index = self._create_index()
                 self._id_to_meta = {}
                 self._load_faiss_index()
                 self.storage_updated.value = False
@@ -132,68 +177,79 @@ class FaissVectorDBStorage(BaseVectorStorage):
         embedding_tasks = [self.embedding_func(batch) for batch in batches]
         embeddings_list = await asyncio.gather(*embedding_tasks)
 
-        # Flatten the list of arrays
-        embeddings = np.concatenate(embeddings_list, axis=0)
+        # Flatten the list of arrays into one float32 matrix
+        embeddings = stack_embeddings(embeddings_list)
         if len(embeddings) != len(list_data):
             logger.error(
                 f"Embedding size mismatch. Embeddings: {len(embeddings)}, Data: {len(list_data)}"
             )
             return []
 
-        # Convert to float32 and normalize embeddings for cosine similarity (in-place)
-        embeddings = embeddings.astype(np.float32)
+        # Normalize embeddings for cosine similarity (in-place)
+        if not embeddings.flags.writeable:
+            embeddings = embeddings.copy()
         faiss.normalize_L2(embeddings)
 
         # Upsert logic:
-        # 1. Identify which vectors to remove if they exist
-        # 2. Remove them
-        # 3. Add the new vectors
-        existing_ids_to_remove = []
-        for meta, emb in zip(list_data, embeddings):
-            faiss_internal_id = self._find_faiss_id_by_custom_id(meta["__id__"])
-            if faiss_internal_id is not None:
-                existing_ids_to_remove.append(faiss_internal_id)
-
-        if existing_ids_to_remove:
-            await self._remove_faiss_ids(existing_ids_to_remove)
-
-        # Step 2: Add new vectors
+        # 1. Tombstone the current vectors of ids that already exist
+        # 2. Add the new vectors
         index = await self._get_index()
+        self._tombstone_custom_ids(meta["__id__"] for meta in list_data)
+
         start_idx = index.ntotal
         index.add(embeddings)
 
-        # Step 3: Store metadata + vector for each new ID
+        # Store metadata + vector for each new ID
         for i, meta in enumerate(list_data):
             fid = start_idx + i
-            # Store the raw vector so we can rebuild if something is removed
+            # Store the raw vector so we can rebuild on compaction
             meta["__vector__"] = embeddings[i].tolist()
-            self._id_to_meta.update({fid: meta})
+            self._id_to_meta[fid] = meta
+            self._custom_id_to_fid[meta["__id__"]] = fid
+            self._filter_index.add(meta["__id__"], meta)
+
+        await self._maybe_compact()
 
         logger.debug(f"Upserted {len(list_data)} vectors into Faiss index.")
         return [m["__id__"] for m in list_data]
 
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding=None,
     ) -> list[dict[str, Any]]:
         """
         Search by a textual query; returns top_k results with their metadata + similarity distance.
         """
-        embedding = await self.embedding_func(
-            [query], _priority=5
-        )  # higher priority for query
+        if query_embedding is not None:
+            embedding = [query_embedding]
+        else:
+            embedding = await self.embedding_func(
+                [query], _priority=5
+            )  # higher priority for query
         # embedding is shape (1, dim)
         embedding = np.array(embedding, dtype=np.float32)
         faiss.normalize_L2(embedding)  # we do in-place normalization
 
-        # Perform the similarity search
         index = await self._get_index()
-        distances, indices = index.search(embedding, top_k)
+        if ids:
+            return self._filtered_query(embedding[0], top_k, ids)
+
+        # Perform the similarity search, tombstones are excluded by the index
+        search_k = min(top_k, max(index.ntotal, 1))
+        distances, indices = index.search(
+            embedding, search_k, params=self._search_params(index)
+        )
 
         distances = distances[0]
         indices = indices[0]
 
         results = []
         for dist, idx in zip(distances, indices):
+            if len(results) >= top_k:
+                break
             if idx == -1:
                 # Faiss returns -1 if no neighbor
                 continue
@@ -202,7 +258,10 @@ class FaissVectorDBStorage(BaseVectorStorage):
             if dist < self.cosine_better_than_threshold:
                 continue
 
-            meta = self._id_to_meta.get(idx, {})
+            meta = self._id_to_meta.get(idx)
+            if meta is None:
+                # Deleted or superseded vector
+                continue
             results.append(
                 {
                     **meta,
@@ -214,6 +273,38 @@ class FaissVectorDBStorage(BaseVectorStorage):
 
         return results
 
+    def _filtered_query(
+        self, embedding: np.ndarray, top_k: int, ids: list[str]
+    ) -> list[dict[str, Any]]:
+        """Exact search over the vectors selected by the `ids` filter only"""
+        metas = [
+            self._id_to_meta[self._custom_id_to_fid[cid]]
+            for cid in self._filter_index.lookup(ids)
+        ]
+        if not metas:
+            return []
+        vectors = np.array([meta["__vector__"] for meta in metas], dtype=np.float32)
+        scores = vectors @ embedding
+
+        results = []
+        for i in top_k_by_score(scores, top_k):
+            if scores[i] < self.cosine_better_than_threshold:
+                break
+            results.append(
+                {
+                    **metas[i],
+                    "id": metas[i].get("__id__"),
+                    "distance": float(scores[i]),
+                    "created_at": metas[i].get("__created_at__"),
+                }
+            )
+        return results
+
+    async def get_ids_by_filter(self, ids: list[str]) -> list[str]:
+        """Return the ids of vectors selected by an `ids` query filter"""
+        await self._get_index()
+        return list(self._filter_index.lookup(ids))
+
     @property
     def client_storage(self):
         # Return whatever structure LightRAG might need for debugging
@@ -229,17 +320,10 @@ class FaissVectorDBStorage(BaseVectorStorage):
            KG-storage-log should be used to avoid data corruption
         """
         logger.debug(f"Deleting {len(ids)} vectors from {self.namespace}")
-        to_remove = []
-        for cid in ids:
-            fid = self._find_faiss_id_by_custom_id(cid)
-            if fid is not None:
-                to_remove.append(fid)
-
-        if to_remove:
-            await self._remove_faiss_ids(to_remove)
-        logger.debug(
-            f"Successfully deleted {len(to_remove)} vectors from {self.namespace}"
-        )
+        removed = self._tombstone_custom_ids(ids)
+        if removed:
+            await self._maybe_compact()
+        logger.debug(f"Successfully deleted {removed} vectors from {self.namespace}")
 
     async def delete_entity(self, entity_name: str) -> None:
         """
@@ -260,53 +344,243 @@ class FaissVectorDBStorage(BaseVectorStorage):
            KG-storage-log should be used to avoid data corruption
         """
         logger.debug(f"Searching relations for entity {entity_name}")
-        relations = []
-        for fid, meta in self._id_to_meta.items():
-            if meta.get("src_id") == entity_name or meta.get("tgt_id") == entity_name:
-                relations.append(fid)
+        relations = [
+            meta["__id__"]
+            for meta in self._id_to_meta.values()
+            if meta.get("src_id") == entity_name or meta.get("tgt_id") == entity_name
+        ]
 
         logger.debug(f"Found {len(relations)} relations for {entity_name}")
         if relations:
-            await self._remove_faiss_ids(relations)
+            self._tombstone_custom_ids(relations)
+            await self._maybe_compact()
             logger.debug(f"Deleted {len(relations)} relations for {entity_name}")
 
+    async def ann_report(
+        self,
+        num_queries: int = 100,
+        top_k: int = 10,
+        settings: list[int] | None = None,
+    ) -> list[dict[str, Any]]:
+        """Compare recall and latency of the ANN index against exact search
+
+        Stored vectors sampled from the storage are used as queries. Settings
+        are efSearch values for HNSW and nprobe values for IVF.
+
+        Returns:
+            One row per setting with `setting`, `recall` and `latency_ms`
+        """
+        index = await self._get_index()
+        if not isinstance(index, (faiss.IndexHNSW, faiss.IndexIVF)):
+            raise ValueError(f"No ANN index in use for FAISS {self.namespace}")
+
+        fids = np.array(list(self._id_to_meta), dtype=np.int64)
+        if len(fids) == 0:
+            return []
+        matrix = np.array(
+            [self._id_to_meta[fid]["__vector__"] for fid in fids], dtype=np.float32
+        )
+        rng = np.random.default_rng(0)
+        queries = matrix[
+            rng.choice(len(matrix), min(num_queries, len(matrix)), replace=False)
+        ]
+
+        def exact_search(query, k):
+            return fids[top_k_by_score(matrix @ query, k)].tolist()
+
+        def ann_search(query, k, setting):
+            self._apply_search_params(index, setting)
+            _, indices = index.search(
+                query.reshape(1, -1),
+                min(k, index.ntotal),
+                params=self._search_params(index, setting),
+            )
+            return [i for i in indices[0] if i in self._id_to_meta]
+
+        if settings is None:
+            settings = (
+                [16, 32, 64, 128, 256]
+                if isinstance(index, faiss.IndexHNSW)
+                else [1, 2, 4, 8, 16, 32]
+            )
+        try:
+            return recall_latency_report(
+                exact_search, ann_search, queries, top_k, settings
+            )
+        finally:
+            self._apply_search_params(index)
+
     # --------------------------------------------------------------------------------
     # Internal helper methods
     # --------------------------------------------------------------------------------
 
+    def _create_index(self, vectors: np.ndarray | None = None):
+        """
+        Create an empty index of the configured type.
+        IVF needs training data: `vectors` are used for it when there are enough,
+        otherwise a flat index is returned until the storage grows.
+        """
+        if self._ann_index == "hnsw":
+            index = faiss.IndexHNSWFlat(
+                self._dim, self._hnsw_m, faiss.METRIC_INNER_PRODUCT
+            )
+            index.hnsw.efConstruction = self._ef_construction
+        elif (
+            self._ann_index == "ivf"
+            and vectors is not None
+            and len(vectors) >= self._ann_min_rows
+        ):
+            nlist = min(self._nlist or default_nlist(len(vectors)), len(vectors))
+            quantizer = faiss.IndexFlatIP(self._dim)
+            index = faiss.IndexIVFFlat(
+                quantizer, self._dim, nlist, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(vectors)
+        else:
+            return faiss.IndexFlatIP(self._dim)
+        self._apply_search_params(index)
+        return index
+
+    def _apply_search_params(self, index, setting: int | None = None):
+        """Set efSearch (HNSW) or nprobe (IVF), `setting` overrides the configured value"""
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = setting or self._ef_search
+        elif isinstance(index, faiss.IndexIVF):
+            index.nprobe = setting or self._nprobe
+
+    def _search_params(self, index, setting: int | None = None):
+        """Search parameters excluding tombstoned ids, None when there are none
+
+        Parameters passed to a search override those set on the index, so
+        efSearch or nprobe are carried over.
+        """
+        if not self._tombstones:
+            return None
+        if self._tombstone_selector is None:
+            batch = faiss.IDSelectorBatch(
+                np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones))
+            )
+            # Faiss does not own the wrapped selector, keep both alive
+            self._tombstone_selector = (batch, faiss.IDSelectorNot(batch))
+        selector = self._tombstone_selector[1]
+        if isinstance(index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(
+                sel=selector, efSearch=setting or self._ef_search
+            )
+        if isinstance(index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=setting or self._nprobe)
+        return faiss.SearchParameters(sel=selector)
+
     def _find_faiss_id_by_custom_id(self, custom_id: str):
         """
         Return the Faiss internal ID for a given custom ID, or None if not found.
         """
-        for fid, meta in self._id_to_meta.items():
-            if meta.get("__id__") == custom_id:
-                return fid
-        return None
+        return self._custom_id_to_fid.get(custom_id)
+
+    def _rebuild_lookup(self):
+        """Derive the reverse id map and tombstones from _id_to_meta and the index"""
+        self._custom_id_to_fid = {
+            meta["__id__"]: fid for fid, meta in self._id_to_meta.items()
+        }
+        self._tombstones = set(range(self._index.ntotal)).difference(self._id_to_meta)
+        self._tombstone_selector = None
+        self._filter_index.build(self._id_to_meta.values())
+
+    def _tombstone_custom_ids(self, custom_ids) -> int:
+        """
+        Mark the vectors of the given custom IDs as deleted.
+        Their slots stay in the index until the next compaction.
+        """
+        removed = 0
+        for cid in custom_ids:
+            fid = self._custom_id_to_fid.pop(cid, None)
+            if fid is not None:
+                self._filter_index.remove(cid)
+                self._id_to_meta.pop(fid, None)
+                self._tombstones.add(fid)
+                removed += 1
+        if removed:
+            self._tombstone_selector = None
+        return removed
+
+    def _needs_compaction(self) -> bool:
+        return len(self._tombstones) > self._compact_ratio * max(self._index.ntotal, 1)
+
+    def _needs_rebuild(self) -> bool:
+        # An IVF index is only trained once enough vectors exist
+        return self._needs_compaction() or (
+            self._ann_index == "ivf"
+            and not isinstance(self._index, faiss.IndexIVF)
+            and self._index.ntotal >= self._ann_min_rows
+        )
+
+    async def _maybe_compact(self):
+        # A running rebuild picks up the rows added meanwhile, and
+        # tombstones left over are compacted by a later call
+        if not self._build_lock.locked() and self._needs_rebuild():
+            await self._compact()
 
-    async def _remove_faiss_ids(self, fid_list):
+    async def _compact(self):
         """
-        Remove a list of internal Faiss IDs from the index.
-        Because IndexFlatIP doesn't support 'removals',
-        we rebuild the index excluding those vectors.
+        Rebuild the index from live vectors only, dropping tombstones.
+        The new index is built and trained in a worker thread, then swapped in
+        under the storage lock. Faiss ids are renumbered to stay contiguous.
         """
-        keep_fids = [fid for fid in self._id_to_meta if fid not in fid_list]
+        async with self._build_lock:
+            async with self._storage_lock:
+                generation = self._index_generation
+                snapshot_total = self._index.ntotal
+                keep_fids = sorted(self._id_to_meta)
+                metas = [self._id_to_meta[fid] for fid in keep_fids]
 
-        # Rebuild the index
-        vectors_to_keep = []
-        new_id_to_meta = {}
-        for new_fid, old_fid in enumerate(keep_fids):
-            vec_meta = self._id_to_meta[old_fid]
-            vectors_to_keep.append(vec_meta["__vector__"])  # stored as list
-            new_id_to_meta[new_fid] = vec_meta
+            index = await asyncio.to_thread(self._build_index, metas)
 
-        async with self._storage_lock:
-            # Re-init index
-            self._index = faiss.IndexFlatIP(self._dim)
-            if vectors_to_keep:
-                arr = np.array(vectors_to_keep, dtype=np.float32)
-                self._index.add(arr)
+            async with self._storage_lock:
+                if generation != self._index_generation:
+                    # Reloaded or dropped during the build
+                    logger.debug(f"FAISS {self.namespace} discarded a stale rebuild")
+                    return
+                self._install_index(index, keep_fids, snapshot_total)
+        logger.debug(
+            f"FAISS {self.namespace} compacted to {self._index.ntotal} vectors"
+        )
+
+    def _stack_vectors(self, metas) -> np.ndarray:
+        return np.array(
+            [meta["__vector__"] for meta in metas], dtype=np.float32
+        ).reshape(-1, self._dim)
+
+    def _build_index(self, metas: list[dict]):
+        """Train and fill a new index with the given vectors, runs in a worker thread"""
+        vectors = self._stack_vectors(metas)
+        index = self._create_index(vectors)
+        if len(vectors):
+            index.add(vectors)
+        return index
 
-            self._id_to_meta = new_id_to_meta
+    def _install_index(self, index, keep_fids: list[int], snapshot_total: int):
+        """
+        Swap in an index built from `keep_fids`, the live ids when the build started.
+        Ids deleted since stay as tombstones and rows upserted since are added.
+        Caller must hold the storage lock.
+        """
+        new_id_to_meta = {}
+        for new_fid, old_fid in enumerate(keep_fids):
+            meta = self._id_to_meta.get(old_fid)
+            if meta is not None:
+                new_id_to_meta[new_fid] = meta
+
+        # Rows are only appended until the index is replaced
+        late_fids = sorted(fid for fid in self._id_to_meta if fid >= snapshot_total)
+        if late_fids:
+            late_metas = [self._id_to_meta[fid] for fid in late_fids]
+            index.add(self._stack_vectors(late_metas))
+            for i, meta in enumerate(late_metas):
+                new_id_to_meta[len(keep_fids) + i] = meta
+
+        self._index = index
+        self._id_to_meta = new_id_to_meta
+        self._rebuild_lookup()
 
     def _save_faiss_index(self):
         """
@@ -329,13 +603,16 @@ class FaissVectorDBStorage(BaseVectorStorage):
         Load the Faiss index + metadata from disk if it exists,
         and rebuild in-memory structures so we can query.
         """
+        self._index_generation += 1
         if not os.path.exists(self._faiss_index_file):
             logger.warning(f"No existing Faiss index file found for {self.namespace}")
+            self._rebuild_lookup()
             return
 
         try:
             # Load the Faiss index
             self._index = faiss.read_index(self._faiss_index_file)
+            self._apply_search_params(self._index)
             # Load metadata
             with open(self._meta_file, "r", encoding="utf-8") as f:
                 stored_dict = json.load(f)
@@ -352,8 +629,9 @@ class FaissVectorDBStorage(BaseVectorStorage):
         except Exception as e:
             logger.error(f"Failed to load Faiss index or metadata: {e}")
             logger.warning("Starting with an empty Faiss index.")
-            self._index = faiss.IndexFlatIP(self._dim)
+            self._index = self._create_index()
             self._id_to_meta = {}
+        self._rebuild_lookup()
 
     async def index_done_callback(self) -> None:
         async with self._storage_lock:
@@ -363,12 +641,19 @@ class FaissVectorDBStorage(BaseVectorStorage):
                 logger.warning(
                     f"Storage for FAISS {self.namespace} was updated by another process, reloading..."
                 )
-                self._index = faiss.IndexFlatIP(self._dim)
+                self._index = self._create_index()
                 self._id_to_meta = {}
                 self._load_faiss_index()
                 self.storage_updated.value = False
                 return False  # Return error
 
+        # Tombstones are persisted implicitly (no metadata), only
+        # compact when they take up too much of the index
+        try:
+            await self._maybe_compact()
+        except Exception as e:
+            logger.error(f"Error compacting FAISS index for {self.namespace}: {e}")
+
         # Acquire lock and perform persistence
         async with self._storage_lock:
             try:
@@ -456,7 +741,7 @@ class FaissVectorDBStorage(BaseVectorStorage):
         try:
             async with self._storage_lock:
                 # Reset the index
-                self._index = faiss.IndexFlatIP(self._dim)
+                self._index = self._create_index()
                 self._id_to_meta = {}
 
                 # Remove storage files if they exist
@@ -0,0 +1,61 @@
+"""
+Inverted index used by the file-based vector storages to answer `ids` filters.
+
+A record is reachable through its `full_doc_id`, each of its `file_path`
+entries and each chunk id in its `source_id`, so chunk vectors can be scoped by
+document id or file path and entity/relation vectors by file path or chunk id.
+"""
+
+from collections import defaultdict
+from typing import Any, Iterable
+
+from lightrag.constants import GRAPH_FIELD_SEP
+
+
+def filter_keys_of(meta: dict[str, Any]) -> set[str]:
+    """Keys under which a record can be selected by an `ids` filter"""
+    keys = set()
+    if meta.get("full_doc_id"):
+        keys.add(meta["full_doc_id"])
+    for field in ("file_path", "source_id"):
+        value = meta.get(field)
+        if value:
+            keys.update(k for k in value.split(GRAPH_FIELD_SEP) if k)
+    return keys
+
+
+class FilterIndex:
+    """Maps filter keys to the ids of the records they select"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._key_to_ids: dict[str, set[str]] = defaultdict(set)
+        self._id_to_keys: dict[str, set[str]] = {}
+
+    def build(self, metas: Iterable[dict[str, Any]]):
+        self.clear()
+        for meta in metas:
+            self.add(meta["__id__"], meta)
+
+    def add(self, id: str, meta: dict[str, Any]):
+        self.remove(id)
+        keys = filter_keys_of(meta)
+        self._id_to_keys[id] = keys
+        for key in keys:
+            self._key_to_ids[key].add(id)
+
+    def remove(self, id: str):
+        for key in self._id_to_keys.pop(id, ()):
+            ids = self._key_to_ids[key]
+            ids.discard(id)
+            if not ids:
+                del self._key_to_ids[key]
+
+    def lookup(self, keys: Iterable[str]) -> set[str]:
+        """Ids of all records selected by any of `keys`"""
+        found = set()
+        for key in keys:
+            found.update(self._key_to_ids.get(key, ()))
+        return found
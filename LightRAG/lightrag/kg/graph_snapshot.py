@@ -0,0 +1,276 @@
+"""
+Binary snapshot format for NetworkX graphs.
+
+GraphML parsing dominates the cold start of large NetworkXStorage graphs. This
+format keeps the same information in flat arrays that load with a single
+memory map:
+
+- node ids are interned: a node is its row number in the `node.__id__` column
+- edges are stored once each in CSR order (`indptr` over source rows,
+  `indices` holding target rows, source row <= target row)
+- node and edge attributes are stored column by column; strings as one UTF-8
+  blob with code point offsets, numbers as int64/float64 arrays, and anything
+  else as JSON text. Absent values are marked by a per-column presence mask.
+
+Layout: MAGIC, a little-endian uint64 header length, the JSON header, then the
+arrays, each aligned to ALIGN bytes. The header records the graph attributes,
+the columns and the dtype, shape and offset of every array.
+
+Run `python -m lightrag.kg.graph_snapshot <in> <out>` to convert between this
+format and GraphML by file extension (`.graphml` or `.lgraph`).
+"""
+
+import gc
+import json
+import os
+import sys
+from typing import Any
+
+import numpy as np
+import networkx as nx
+
+MAGIC = b"LRGRAPH\x01"
+ALIGN = 64
+BINARY_SNAPSHOT_SUFFIX = ".lgraph"
+ID_COLUMN = "__id__"
+
+_MISSING = object()
+
+
+def _encode_column(values: list[Any]) -> tuple[str, dict[str, np.ndarray]]:
+    """Encode one attribute column, `_MISSING` marks absent values"""
+    present = [v for v in values if v is not _MISSING]
+    arrays = {}
+    if len(present) < len(values):
+        arrays["mask"] = np.fromiter(
+            (v is not _MISSING for v in values), dtype=np.bool_, count=len(values)
+        )
+
+    types = {type(v) for v in present}
+    if types == {int}:
+        arrays["values"] = np.array(present, dtype=np.int64)
+        return "int", arrays
+    if types == {float}:
+        arrays["values"] = np.array(present, dtype=np.float64)
+        return "float", arrays
+
+    kind = "str"
+    if types - {str}:
+        kind = "json"
+        present = [json.dumps(v, ensure_ascii=False) for v in present]
+    arrays["offsets"] = np.zeros(len(present) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in present], out=arrays["offsets"][1:])
+    arrays["blob"] = np.frombuffer("".join(present).encode("utf-8"), dtype=np.uint8)
+    return kind, arrays
+
+
+def _decode_column(
+    kind: str, arrays: dict[str, np.ndarray], n_rows: int
+) -> tuple[np.ndarray | None, list[Any]]:
+    """Return (presence mask or None, present values in row order)"""
+    if kind in ("int", "float"):
+        values = arrays["values"].tolist()
+    else:
+        text = arrays["blob"].tobytes().decode("utf-8")
+        offsets = arrays["offsets"].tolist()
+        values = list(map(text.__getitem__, map(slice, offsets[:-1], offsets[1:])))
+        if kind == "json":
+            values = [json.loads(v) for v in values]
+    return arrays.get("mask"), values
+
+
+def _collect_columns(records: list[dict[str, Any]]) -> dict[str, list[Any]]:
+    names = {}
+    for record in records:
+        for name in record:
+            names.setdefault(name, None)
+    return {
+        name: [record.get(name, _MISSING) for record in records] for name in names
+    }
+
+
+def write_binary_graph(graph: nx.Graph, file_name: str):
+    """Write an undirected graph to `file_name` in the binary snapshot format"""
+    if graph.is_directed() or graph.is_multigraph():
+        raise ValueError("Binary graph snapshots support simple undirected graphs only")
+
+    nodes = list(graph.nodes)
+    node_index = {node: i for i, node in enumerate(nodes)}
+    n_edges = graph.number_of_edges()
+    src = np.empty(n_edges, dtype=np.int64)
+    dst = np.empty(n_edges, dtype=np.int64)
+    edge_records = []
+    for i, (u, v, data) in enumerate(graph.edges(data=True)):
+        src[i] = node_index[u]
+        dst[i] = node_index[v]
+        edge_records.append(data)
+    swap = src > dst
+    src[swap], dst[swap] = dst[swap], src[swap]
+    order = np.lexsort((dst, src))
+    edge_records = [edge_records[i] for i in order]
+
+    arrays: dict[str, np.ndarray] = {
+        "indptr": np.concatenate(
+            [[0], np.cumsum(np.bincount(src, minlength=len(nodes)))]
+        ).astype(np.int64),
+        "indices": dst[order].astype(np.int32 if len(nodes) < 2**31 else np.int64),
+    }
+    columns: dict[str, dict[str, str]] = {"node": {}, "edge": {}}
+    node_columns = {ID_COLUMN: nodes, **_collect_columns([graph.nodes[n] for n in nodes])}
+    for scope, scope_columns in (
+        ("node", node_columns),
+        ("edge", _collect_columns(edge_records)),
+    ):
+        for i, (name, values) in enumerate(scope_columns.items()):
+            kind, column_arrays = _encode_column(values)
+            columns[scope][name] = kind
+            for part, array in column_arrays.items():
+                arrays[f"{scope}.{i}.{part}"] = array
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header = json.dumps(
+        {
+            "graph": graph.graph,
+            "num_nodes": len(nodes),
+            "num_edges": n_edges,
+            "columns": columns,
+            "arrays": layout,
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    with open(file_name, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][2])
+            f.write(np.ascontiguousarray(array).tobytes())
+        # Pad the last array so the file covers every aligned slot
+        f.truncate(data_start + offset)
+
+
+def read_binary_graph(file_name: str) -> nx.Graph:
+    """Load a graph written by `write_binary_graph`"""
+    # Millions of new dicts would trigger many useless cyclic GC passes
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _read_binary_graph(file_name)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _read_binary_graph(file_name: str) -> nx.Graph:
+    raw = np.memmap(file_name, dtype=np.uint8, mode="r")
+    if raw[: len(MAGIC)].tobytes() != MAGIC:
+        raise ValueError(f"{file_name} is not a binary graph snapshot")
+    header_size = int(raw[len(MAGIC) : len(MAGIC) + 8].view(np.uint64)[0])
+    header_start = len(MAGIC) + 8
+    header = json.loads(raw[header_start : header_start + header_size].tobytes())
+    data_start = -(-(header_start + header_size) // ALIGN) * ALIGN
+
+    arrays = {}
+    for name, (dtype, shape, offset) in header["arrays"].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        start = data_start + offset
+        arrays[name] = (
+            raw[start : start + count * dtype.itemsize].view(dtype).reshape(shape)
+        )
+
+    def column_records(scope: str, n_rows: int) -> list[dict[str, Any]]:
+        full_names, full_values, partial = [], [], []
+        for i, (name, kind) in enumerate(header["columns"][scope].items()):
+            if scope == "node" and name == ID_COLUMN:
+                continue
+            prefix = f"{scope}.{i}."
+            column_arrays = {
+                key[len(prefix) :]: array
+                for key, array in arrays.items()
+                if key.startswith(prefix)
+            }
+            mask, values = _decode_column(kind, column_arrays, n_rows)
+            if mask is None:
+                full_names.append(name)
+                full_values.append(values)
+            else:
+                partial.append((name, np.flatnonzero(mask).tolist(), values))
+
+        # Columns present on every row are zipped into the dicts in one pass
+        if full_names:
+            records = [dict(zip(full_names, row)) for row in zip(*full_values)]
+        else:
+            records = [{} for _ in range(n_rows)]
+        for name, rows, values in partial:
+            for row, value in zip(rows, values):
+                records[row][name] = value
+        return records
+
+    n_nodes = header["num_nodes"]
+    id_index = list(header["columns"]["node"]).index(ID_COLUMN)
+    id_kind = header["columns"]["node"][ID_COLUMN]
+    _, node_ids = _decode_column(
+        id_kind,
+        {
+            key.rsplit(".", 1)[1]: array
+            for key, array in arrays.items()
+            if key.startswith(f"node.{id_index}.")
+        },
+        n_nodes,
+    )
+    node_records = column_records("node", n_nodes)
+    edge_records = column_records("edge", header["num_edges"])
+
+    graph = nx.Graph()
+    graph.graph.update(header["graph"])
+    # Fill the adjacency dicts directly, as add_edges_from would, without its
+    # per-edge attribute copies
+    graph._node.update(zip(node_ids, node_records))
+    adj = graph._adj
+    for node in node_ids:
+        adj[node] = {}
+    indptr = arrays["indptr"].tolist()
+    indices = arrays["indices"].tolist()
+    edge = 0
+    for row, source in enumerate(node_ids):
+        source_adj = adj[source]
+        for col in indices[indptr[row] : indptr[row + 1]]:
+            target = node_ids[col]
+            data = edge_records[edge]
+            source_adj[target] = data
+            adj[target][source] = data
+            edge += 1
+    return graph
+
+
+def read_graph(file_name: str) -> nx.Graph:
+    if file_name.endswith(BINARY_SNAPSHOT_SUFFIX):
+        return read_binary_graph(file_name)
+    return nx.read_graphml(file_name)
+
+
+def write_graph(graph: nx.Graph, file_name: str):
+    if file_name.endswith(BINARY_SNAPSHOT_SUFFIX):
+        write_binary_graph(graph, file_name)
+    else:
+        nx.write_graphml(graph, file_name)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m lightrag.kg.graph_snapshot <input> <output>")
+        print(f"Converts between GraphML and binary ({BINARY_SNAPSHOT_SUFFIX}) graph files")
+        sys.exit(1)
+    source, target = sys.argv[1:]
+    if not os.path.exists(source):
+        print(f"{source} not found")
+        sys.exit(1)
+    write_graph(read_graph(source), target)
+    print(f"Converted {source} -> {target}")
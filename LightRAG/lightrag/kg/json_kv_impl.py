@@ -5,7 +5,10 @@ from typing import Any, final
 from lightrag.base import (
     BaseKVStorage,
 )
+from lightrag.constants import DEFAULT_TEXT_CHUNK_CACHE_SIZE
+from lightrag.namespace import NameSpace, is_namespace
 from lightrag.utils import (
+    TTLLRUCache,
     load_json,
     logger,
     write_json,
@@ -20,6 +23,10 @@ from .shared_storage import (
     try_initialize_namespace,
 )
 
+TEXT_CHUNK_CACHE_SIZE = int(
+    os.getenv("TEXT_CHUNK_CACHE_SIZE", DEFAULT_TEXT_CHUNK_CACHE_SIZE)
+)
+
 
 @final
 @dataclass
@@ -41,11 +48,25 @@ class JsonKVStorage(BaseKVStorage):
         self._data = None
         self._storage_lock = None
         self.storage_updated = None
+        # Hot text chunks read at query time skip the shared storage lock
+        self._read_cache: TTLLRUCache | None = None
+        self._read_cache_updated = None
+        self._read_cache_epoch = 0
 
     async def initialize(self):
         """Initialize storage data"""
         self._storage_lock = get_storage_lock()
         self.storage_updated = await get_update_flag(self.namespace)
+        if (
+            is_namespace(self.namespace, NameSpace.KV_STORE_TEXT_CHUNKS)
+            and TEXT_CHUNK_CACHE_SIZE > 0
+        ):
+            self._read_cache = TTLLRUCache(TEXT_CHUNK_CACHE_SIZE)
+            # Set by every process that changes the data, so each process
+            # knows when to drop its own cached chunks
+            self._read_cache_updated = await get_update_flag(
+                self._read_cache_namespace
+            )
         async with get_data_init_lock():
             # check need_init must before get_namespace_data
             need_init = await try_initialize_namespace(self.namespace)
@@ -66,6 +87,44 @@ class JsonKVStorage(BaseKVStorage):
                         f"Process {os.getpid()} KV load {self.namespace} with {data_count} records"
                     )
 
+    @property
+    def _read_cache_namespace(self) -> str:
+        return f"{self.namespace}_read_cache"
+
+    async def _set_updated(self):
+        """Flag the data as changed for persistence and for every read cache"""
+        await set_all_update_flags(self.namespace)
+        if self._read_cache is not None:
+            await set_all_update_flags(self._read_cache_namespace)
+
+    def _valid_read_cache(self) -> TTLLRUCache | None:
+        if self._read_cache is not None and self._read_cache_updated.value:
+            self._read_cache.clear()
+            self._read_cache_epoch += 1
+            self._read_cache_updated.value = False
+        return self._read_cache
+
+    async def _get_records(self, ids: list[str]) -> list[dict[str, Any] | None]:
+        """Stored records of `ids`, served from the read cache when possible"""
+        cache = self._valid_read_cache()
+        if cache is None:
+            async with self._storage_lock:
+                return [self._data.get(id) for id in ids]
+
+        records = [cache.get(id) for id in ids]
+        missing = [i for i, record in enumerate(records) if record is None]
+        if missing:
+            epoch = self._read_cache_epoch
+            async with self._storage_lock:
+                for i in missing:
+                    records[i] = self._data.get(ids[i])
+            # Records read before an invalidation seen meanwhile may be stale
+            if epoch == self._read_cache_epoch:
+                for i in missing:
+                    if records[i]:
+                        cache.put(ids[i], records[i])
+        return records
+
     async def index_done_callback(self) -> None:
         async with self._storage_lock:
             if self.storage_updated.value:
@@ -102,36 +161,38 @@ class JsonKVStorage(BaseKVStorage):
                     result[key] = value
             return result
 
-    async def get_by_id(self, id: str) -> dict[str, Any] | None:
+    async def get_keys(self) -> list[str]:
+        """Ids of all stored records, without copying the records"""
         async with self._storage_lock:
-            result = self._data.get(id)
-            if result:
+            return list(self._data.keys())
+
+    async def get_by_id(self, id: str) -> dict[str, Any] | None:
+        (result,) = await self._get_records([id])
+        if result:
+            # Create a copy to avoid modifying the original data
+            result = dict(result)
+            # Ensure time fields are present, provide default values for old data
+            result.setdefault("create_time", 0)
+            result.setdefault("update_time", 0)
+            # Ensure _id field contains the clean ID
+            result["_id"] = id
+        return result
+
+    async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
+        results = []
+        for id, data in zip(ids, await self._get_records(ids)):
+            if data:
                 # Create a copy to avoid modifying the original data
-                result = dict(result)
+                result = {k: v for k, v in data.items()}
                 # Ensure time fields are present, provide default values for old data
                 result.setdefault("create_time", 0)
                 result.setdefault("update_time", 0)
                 # Ensure _id field contains the clean ID
                 result["_id"] = id
-            return result
-
-    async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
-        async with self._storage_lock:
-            results = []
-            for id in ids:
-                data = self._data.get(id, None)
-                if data:
-                    # Create a copy to avoid modifying the original data
-                    result = {k: v for k, v in data.items()}
-                    # Ensure time fields are present, provide default values for old data
-                    result.setdefault("create_time", 0)
-                    result.setdefault("update_time", 0)
-                    # Ensure _id field contains the clean ID
-                    result["_id"] = id
-                    results.append(result)
-                else:
-                    results.append(None)
-            return results
+                results.append(result)
+            else:
+                results.append(None)
+        return results
 
     async def filter_keys(self, keys: set[str]) -> set[str]:
         async with self._storage_lock:
@@ -169,7 +230,7 @@ class JsonKVStorage(BaseKVStorage):
                 v["_id"] = k
 
             self._data.update(data)
-            await set_all_update_flags(self.namespace)
+            await self._set_updated()
 
     async def delete(self, ids: list[str]) -> None:
         """Delete specific records from storage by their IDs
@@ -192,7 +253,7 @@ class JsonKVStorage(BaseKVStorage):
                     any_deleted = True
 
             if any_deleted:
-                await set_all_update_flags(self.namespace)
+                await self._set_updated()
 
     async def drop_cache_by_modes(self, modes: list[str] | None = None) -> bool:
         """Delete specific records from storage by cache mode
@@ -227,7 +288,7 @@ class JsonKVStorage(BaseKVStorage):
                     self._data.pop(key, None)
 
                 if keys_to_delete:
-                    await set_all_update_flags(self.namespace)
+                    await self._set_updated()
                     logger.info(
                         f"Dropped {len(keys_to_delete)} cache entries for modes: {modes}"
                     )
@@ -301,7 +362,7 @@ class JsonKVStorage(BaseKVStorage):
         try:
             async with self._storage_lock:
                 self._data.clear()
-                await set_all_update_flags(self.namespace)
+                await self._set_updated()
 
             await self.index_done_callback()
             logger.info(f"Process {os.getpid()} drop {self.namespace}")
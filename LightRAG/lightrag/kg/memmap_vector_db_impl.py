@@ -0,0 +1,699 @@
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+from typing import Any, final
+from dataclasses import dataclass
+import numpy as np
+
+from lightrag.utils import (
+    logger,
+    compute_mdhash_id,
+    stack_embeddings,
+)
+from lightrag.base import BaseVectorStorage
+from .filter_index import FilterIndex
+from .ann_index import top_k_by_score
+from .shared_storage import (
+    get_data_init_lock,
+    get_storage_lock,
+    get_update_flag,
+    set_all_update_flags,
+    try_initialize_namespace,
+)
+
+# Rewrite the files once dead rows make up more than this share of all rows
+DEFAULT_COMPACT_RATIO = 0.5
+# Never compact storages smaller than this, appending is always cheaper
+DEFAULT_COMPACT_MIN_ROWS = 1024
+
+
+@final
+@dataclass
+class MemmapVectorDBStorage(BaseVectorStorage):
+    """
+    File-based vector storage backed by a memory-mapped float32 matrix.
+
+    Two files are kept per namespace:
+    - vdb_<namespace>.vec: normalized float32 vectors, one contiguous row per record
+    - vdb_<namespace>.meta.jsonl: a header line followed by one line per upsert
+      or delete, referencing vector rows by index
+
+    Both files are append-only: an upsert writes a new row and supersedes the
+    old one, a delete writes a tombstone. Dead rows are dropped by compaction
+    once they exceed `compact_ratio` of the file. Loading maps the vector file
+    without copying it, and a reload after another process saved only parses
+    the new tail of the sidecar.
+    """
+
+    def __post_init__(self):
+        # Initialize basic attributes
+        self._storage_lock = None
+        self.storage_updated = None
+
+        # Use global config value if specified, otherwise use default
+        kwargs = self.global_config.get("vector_db_storage_cls_kwargs", {})
+        cosine_threshold = kwargs.get("cosine_better_than_threshold")
+        if cosine_threshold is None:
+            raise ValueError(
+                "cosine_better_than_threshold must be specified in vector_db_storage_cls_kwargs"
+            )
+        self.cosine_better_than_threshold = cosine_threshold
+        self._compact_ratio = float(kwargs.get("compact_ratio", DEFAULT_COMPACT_RATIO))
+        self._compact_min_rows = int(
+            kwargs.get("compact_min_rows", DEFAULT_COMPACT_MIN_ROWS)
+        )
+
+        working_dir = self.global_config["working_dir"]
+        if self.workspace:
+            # Include workspace in the file path for data isolation
+            storage_dir = os.path.join(working_dir, self.workspace)
+            os.makedirs(storage_dir, exist_ok=True)
+        else:
+            # Default behavior when workspace is empty
+            storage_dir = working_dir
+        self._vector_file = os.path.join(storage_dir, f"vdb_{self.namespace}.vec")
+        self._meta_file = os.path.join(storage_dir, f"vdb_{self.namespace}.meta.jsonl")
+        # Legacy NanoVectorDB file, imported once if no memmap files exist yet
+        self._legacy_file = os.path.join(storage_dir, f"vdb_{self.namespace}.json")
+
+        self._max_batch_size = self.global_config["embedding_batch_num"]
+        self._dim = self.embedding_func.embedding_dim
+
+        self._reset_state()
+        self._load()
+
+    async def initialize(self):
+        """Initialize storage data"""
+        # Get the update flag for cross-process update notification
+        self.storage_updated = await get_update_flag(self.namespace)
+        # Get the storage lock for use in other methods
+        self._storage_lock = get_storage_lock(enable_logging=False)
+        async with get_data_init_lock():
+            need_init = await try_initialize_namespace(self.namespace)
+            if self._generation is None:
+                # Pick up the files of a process that imported the legacy file
+                self._load()
+                if (
+                    need_init
+                    and self._generation is None
+                    and os.path.exists(self._legacy_file)
+                ):
+                    self._import_legacy_file()
+
+    # --------------------------------------------------------------------------------
+    # In-memory state
+    # --------------------------------------------------------------------------------
+
+    def _reset_state(self):
+        """Forget everything held in memory, files are left untouched"""
+        self._generation: str | None = None
+        # Persisted vectors, mapped read-only from the vector file
+        self._vectors = np.empty((0, self._dim), dtype=np.float32)
+        # Vectors appended since the last save, rows follow the persisted ones
+        self._pending_vectors: list[np.ndarray] = []
+        self._pending_records: list[dict[str, Any]] = []
+        self._total_rows = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._id_to_row: dict[str, int] = {}
+        self._row_meta: dict[int, dict[str, Any]] = {}
+        # Inverted index answering `ids` filters
+        self._filter_index = FilterIndex()
+        # Byte offset of the sidecar already applied to memory
+        self._meta_offset = 0
+
+    @property
+    def _persisted_rows(self) -> int:
+        return self._vectors.shape[0]
+
+    def _grow_alive(self, n_rows: int):
+        if n_rows > len(self._alive):
+            alive = np.zeros(max(n_rows, 2 * len(self._alive), 1024), dtype=bool)
+            alive[: len(self._alive)] = self._alive
+            self._alive = alive
+
+    def _apply_record(self, record: dict[str, Any]):
+        """Apply one sidecar record to the in-memory index"""
+        if "delete" in record:
+            row = self._id_to_row.pop(record["delete"], None)
+            if row is not None:
+                self._alive[row] = False
+                self._row_meta.pop(row, None)
+                self._filter_index.remove(record["delete"])
+            return
+
+        row = record["row"]
+        meta = record["meta"]
+        old_row = self._id_to_row.get(meta["__id__"])
+        if old_row is not None:
+            self._alive[old_row] = False
+            self._row_meta.pop(old_row, None)
+        self._grow_alive(row + 1)
+        self._alive[row] = True
+        self._id_to_row[meta["__id__"]] = row
+        self._row_meta[row] = meta
+        self._filter_index.add(meta["__id__"], meta)
+
+    def _map_vectors(self):
+        """Map the vector file read-only, the OS page cache does the rest"""
+        if not os.path.exists(self._vector_file):
+            self._vectors = np.empty((0, self._dim), dtype=np.float32)
+            return
+        row_bytes = self._dim * np.dtype(np.float32).itemsize
+        n_rows = os.path.getsize(self._vector_file) // row_bytes
+        if n_rows == 0:
+            self._vectors = np.empty((0, self._dim), dtype=np.float32)
+            return
+        self._vectors = np.memmap(
+            self._vector_file, dtype=np.float32, mode="r", shape=(n_rows, self._dim)
+        )
+
+    # --------------------------------------------------------------------------------
+    # Persistence
+    # --------------------------------------------------------------------------------
+
+    def _read_header(self) -> dict[str, Any] | None:
+        if not os.path.exists(self._meta_file):
+            return None
+        with open(self._meta_file, "r", encoding="utf-8") as f:
+            line = f.readline()
+        return json.loads(line) if line.strip() else None
+
+    def _load(self):
+        """Load storage from disk, replacing everything held in memory"""
+        self._reset_state()
+        header = self._read_header()
+        if header is None:
+            return
+
+        if header["dim"] != self._dim:
+            raise ValueError(
+                f"Embedding dim mismatch for {self.namespace}: "
+                f"file has {header['dim']}, embedding_func has {self._dim}"
+            )
+        self._generation = header["generation"]
+        self._map_vectors()
+        self._total_rows = self._persisted_rows
+        self._grow_alive(self._total_rows)
+        self._read_meta_tail()
+        logger.info(
+            f"Memmap VDB {self.namespace} loaded {len(self._id_to_row)} vectors "
+            f"({self._total_rows} rows) from {self._vector_file}"
+        )
+
+    def _read_meta_tail(self):
+        """Apply sidecar records written after `_meta_offset`"""
+        with open(self._meta_file, "rb") as f:
+            if self._meta_offset == 0:
+                self._meta_offset = len(f.readline())  # Skip header
+            else:
+                f.seek(self._meta_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Partially written record, pick it up on the next reload
+                    break
+                self._apply_record(json.loads(line))
+                self._meta_offset += len(line)
+
+    def _reload(self):
+        """Catch up with changes saved by another process"""
+        header = self._read_header()
+        if (
+            header is None
+            or header["generation"] != self._generation
+            or os.path.getsize(self._meta_file) < self._meta_offset
+            or self._pending_records
+        ):
+            # Files were dropped or compacted, or unsaved local changes must be
+            # discarded: start over
+            self._load()
+            return
+
+        # Same generation: files only grew, so replay the tail
+        self._map_vectors()
+        self._total_rows = self._persisted_rows
+        self._grow_alive(self._total_rows)
+        self._read_meta_tail()
+
+    def _write_header(self, f):
+        self._generation = uuid.uuid4().hex
+        f.write(
+            json.dumps({"dim": self._dim, "generation": self._generation}) + "\n"
+        )
+
+    def _save(self):
+        """Append pending rows and records to disk"""
+        if self._generation is None:
+            # First save creates the files
+            with open(self._vector_file, "wb"):
+                pass
+            with open(self._meta_file, "w", encoding="utf-8") as f:
+                self._write_header(f)
+            self._meta_offset = os.path.getsize(self._meta_file)
+
+        if not self._pending_records:
+            return
+
+        # Vectors go first: rows without a sidecar record are simply dead
+        if self._pending_vectors:
+            row_bytes = self._dim * np.dtype(np.float32).itemsize
+            with open(self._vector_file, "r+b") as f:
+                # Drop a partially written row left by an interrupted save
+                f.seek(self._persisted_rows * row_bytes)
+                f.truncate()
+                np.concatenate(self._pending_vectors).astype(
+                    np.float32, copy=False
+                ).tofile(f)
+        with open(self._meta_file, "a", encoding="utf-8") as f:
+            for record in self._pending_records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        self._pending_vectors = []
+        self._pending_records = []
+        self._map_vectors()
+        self._meta_offset = os.path.getsize(self._meta_file)
+
+        dead_rows = self._total_rows - len(self._id_to_row)
+        if (
+            self._total_rows >= self._compact_min_rows
+            and dead_rows > self._compact_ratio * self._total_rows
+        ):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite both files keeping only live rows"""
+        live_rows = sorted(self._row_meta)
+        logger.info(
+            f"Memmap VDB {self.namespace} compacting {self._total_rows} -> {len(live_rows)} rows"
+        )
+        tmp_vector_file = self._vector_file + ".tmp"
+        tmp_meta_file = self._meta_file + ".tmp"
+
+        chunk = 65536
+        with open(tmp_vector_file, "wb") as f:
+            for i in range(0, len(live_rows), chunk):
+                rows = np.asarray(live_rows[i : i + chunk], dtype=np.int64)
+                np.asarray(self._vectors[rows], dtype=np.float32).tofile(f)
+        with open(tmp_meta_file, "w", encoding="utf-8") as f:
+            self._write_header(f)
+            for new_row, old_row in enumerate(live_rows):
+                record = {"row": new_row, "meta": self._row_meta[old_row]}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        # Release the mapping before replacing the file (required on Windows)
+        self._vectors = np.empty((0, self._dim), dtype=np.float32)
+        os.replace(tmp_vector_file, self._vector_file)
+        os.replace(tmp_meta_file, self._meta_file)
+        self._load()
+
+    def _import_legacy_file(self):
+        """Import a NanoVectorDB json file so existing working dirs keep working"""
+        try:
+            with open(self._legacy_file, "r", encoding="utf-8") as f:
+                storage = json.load(f)
+            data = storage.get("data", [])
+            if storage.get("embedding_dim", self._dim) != self._dim or not data:
+                return
+            matrix = np.frombuffer(
+                base64.b64decode(storage["matrix"]), dtype=np.float32
+            ).reshape(-1, self._dim)
+        except Exception as e:
+            logger.warning(f"Could not import {self._legacy_file}: {e}")
+            return
+
+        for i, dp in enumerate(data):
+            self._append(dp, matrix[i : i + 1])
+        self._save()
+        logger.info(
+            f"Memmap VDB {self.namespace} imported {len(data)} vectors from {self._legacy_file}"
+        )
+
+    # --------------------------------------------------------------------------------
+    # Mutations
+    # --------------------------------------------------------------------------------
+
+    def _append(self, meta: dict[str, Any], vectors: np.ndarray):
+        """Stage one record with its (1, dim) normalized vector"""
+        row = self._total_rows
+        self._total_rows += 1
+        self._pending_vectors.append(vectors)
+        record = {"row": row, "meta": meta}
+        self._pending_records.append(record)
+        self._apply_record(record)
+
+    def _remove(self, ids: list[str]) -> int:
+        removed = 0
+        for id in ids:
+            if id in self._id_to_row:
+                record = {"delete": id}
+                self._pending_records.append(record)
+                self._apply_record(record)
+                removed += 1
+        return removed
+
+    async def _check_updated(self):
+        """Reload if another process saved, caller must hold the storage lock"""
+        if self.storage_updated.value:
+            logger.info(
+                f"Process {os.getpid()} reloading {self.namespace} due to update by another process"
+            )
+            self._reload()
+            self.storage_updated.value = False
+
+    async def upsert(self, data: dict[str, dict[str, Any]]) -> None:
+        """
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+        """
+
+        logger.debug(f"Inserting {len(data)} to {self.namespace}")
+        if not data:
+            return
+
+        current_time = int(time.time())
+        list_data = [
+            {
+                "__id__": k,
+                "__created_at__": current_time,
+                **{k1: v1 for k1, v1 in v.items() if k1 in self.meta_fields},
+            }
+            for k, v in data.items()
+        ]
+        contents = [v["content"] for v in data.values()]
+        batches = [
+            contents[i : i + self._max_batch_size]
+            for i in range(0, len(contents), self._max_batch_size)
+        ]
+
+        # Execute embedding outside of lock to avoid long lock times
+        embedding_tasks = [self.embedding_func(batch) for batch in batches]
+        embeddings_list = await asyncio.gather(*embedding_tasks)
+
+        embeddings = stack_embeddings(embeddings_list)
+        if len(embeddings) != len(list_data):
+            # sometimes the embedding is not returned correctly. just log it.
+            logger.error(
+                f"embedding is not 1-1 with data, {len(embeddings)} != {len(list_data)}"
+            )
+            return
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1, norms)
+
+        async with self._storage_lock:
+            await self._check_updated()
+            for i, meta in enumerate(list_data):
+                self._append(meta, embeddings[i : i + 1])
+        return [m["__id__"] for m in list_data]
+
+    async def query(
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding=None,
+    ) -> list[dict[str, Any]]:
+        if query_embedding is not None:
+            embedding = query_embedding
+        else:
+            # Execute embedding outside of lock to avoid improve cocurrent
+            embedding = await self.embedding_func(
+                [query], _priority=5
+            )  # higher priority for query
+            embedding = embedding[0]
+
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        if norm > 0:
+            embedding = embedding / norm
+
+        async with self._storage_lock:
+            await self._check_updated()
+            if not self._id_to_row:
+                return []
+            if ids:
+                return self._filtered_query(embedding, top_k, ids)
+            scores = self._vectors @ embedding
+            if self._pending_vectors:
+                scores = np.concatenate(
+                    [scores, np.concatenate(self._pending_vectors) @ embedding]
+                )
+            scores[~self._alive[: self._total_rows]] = -np.inf
+
+            k = min(top_k, len(self._id_to_row))
+            top_rows = np.argpartition(-scores, k - 1)[:k]
+            top_rows = top_rows[np.argsort(-scores[top_rows])]
+
+            results = []
+            for row in top_rows:
+                score = float(scores[row])
+                if score < self.cosine_better_than_threshold:
+                    break
+                meta = self._row_meta[int(row)]
+                results.append(
+                    {
+                        **meta,
+                        "id": meta["__id__"],
+                        "distance": score,
+                        "created_at": meta.get("__created_at__"),
+                    }
+                )
+        return results
+
+    def _filtered_query(
+        self, embedding: np.ndarray, top_k: int, ids: list[str]
+    ) -> list[dict[str, Any]]:
+        """Exact search over the rows selected by the `ids` filter only"""
+        rows = np.array(
+            sorted(self._id_to_row[i] for i in self._filter_index.lookup(ids)),
+            dtype=np.int64,
+        )
+        if len(rows) == 0:
+            return []
+        persisted = rows[rows < self._persisted_rows]
+        scores = np.asarray(self._vectors[persisted]) @ embedding
+        if len(persisted) < len(rows):
+            pending = np.concatenate(self._pending_vectors)
+            pending_rows = rows[len(persisted) :] - self._persisted_rows
+            scores = np.concatenate([scores, pending[pending_rows] @ embedding])
+
+        results = []
+        for i in top_k_by_score(scores, top_k):
+            score = float(scores[i])
+            if score < self.cosine_better_than_threshold:
+                break
+            meta = self._row_meta[int(rows[i])]
+            results.append(
+                {
+                    **meta,
+                    "id": meta["__id__"],
+                    "distance": score,
+                    "created_at": meta.get("__created_at__"),
+                }
+            )
+        return results
+
+    async def get_ids_by_filter(self, ids: list[str]) -> list[str]:
+        """Return the ids of vectors selected by an `ids` query filter"""
+        async with self._storage_lock:
+            await self._check_updated()
+            return list(self._filter_index.lookup(ids))
+
+    @property
+    async def client_storage(self):
+        async with self._storage_lock:
+            await self._check_updated()
+            return {"data": [self._row_meta[row] for row in sorted(self._row_meta)]}
+
+    async def delete(self, ids: list[str]):
+        """Delete vectors with specified IDs
+
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+
+        Args:
+            ids: List of vector IDs to be deleted
+        """
+        try:
+            async with self._storage_lock:
+                await self._check_updated()
+                removed = self._remove(ids)
+            logger.debug(f"Successfully deleted {removed} vectors from {self.namespace}")
+        except Exception as e:
+            logger.error(f"Error while deleting vectors from {self.namespace}: {e}")
+
+    async def delete_entity(self, entity_name: str) -> None:
+        """
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+        """
+
+        try:
+            entity_id = compute_mdhash_id(entity_name, prefix="ent-")
+            logger.debug(
+                f"Attempting to delete entity {entity_name} with ID {entity_id}"
+            )
+            async with self._storage_lock:
+                await self._check_updated()
+                removed = self._remove([entity_id])
+            if removed:
+                logger.debug(f"Successfully deleted entity {entity_name}")
+            else:
+                logger.debug(f"Entity {entity_name} not found in storage")
+        except Exception as e:
+            logger.error(f"Error deleting entity {entity_name}: {e}")
+
+    async def delete_entity_relation(self, entity_name: str) -> None:
+        """
+        Importance notes:
+        1. Changes will be persisted to disk during the next index_done_callback
+        2. Only one process should updating the storage at a time before index_done_callback,
+           KG-storage-log should be used to avoid data corruption
+        """
+
+        try:
+            async with self._storage_lock:
+                await self._check_updated()
+                ids_to_delete = [
+                    meta["__id__"]
+                    for meta in self._row_meta.values()
+                    if meta.get("src_id") == entity_name
+                    or meta.get("tgt_id") == entity_name
+                ]
+                logger.debug(
+                    f"Found {len(ids_to_delete)} relations for entity {entity_name}"
+                )
+                self._remove(ids_to_delete)
+            if ids_to_delete:
+                logger.debug(
+                    f"Deleted {len(ids_to_delete)} relations for {entity_name}"
+                )
+            else:
+                logger.debug(f"No relations found for entity {entity_name}")
+        except Exception as e:
+            logger.error(f"Error deleting relations for {entity_name}: {e}")
+
+    async def index_done_callback(self) -> bool:
+        """Append pending changes to disk"""
+        async with self._storage_lock:
+            # Check if storage was updated by another process
+            if self.storage_updated.value:
+                # Storage was updated by another process, reload data instead of saving
+                logger.warning(
+                    f"Storage for {self.namespace} was updated by another process, reloading..."
+                )
+                self._load()
+                # Reset update flag
+                self.storage_updated.value = False
+                return False  # Return error
+
+        # Acquire lock and perform persistence
+        async with self._storage_lock:
+            try:
+                if not self._pending_records:
+                    return True
+                # Save data to disk
+                self._save()
+                # Notify other processes that data has been updated
+                await set_all_update_flags(self.namespace)
+                # Reset own update flag to avoid self-reloading
+                self.storage_updated.value = False
+                return True  # Return success
+            except Exception as e:
+                logger.error(f"Error saving data for {self.namespace}: {e}")
+                return False  # Return error
+
+    async def get_by_id(self, id: str) -> dict[str, Any] | None:
+        """Get vector data by its ID
+
+        Args:
+            id: The unique identifier of the vector
+
+        Returns:
+            The vector data if found, or None if not found
+        """
+        async with self._storage_lock:
+            await self._check_updated()
+            row = self._id_to_row.get(id)
+            if row is None:
+                return None
+            meta = self._row_meta[row]
+        return {
+            **meta,
+            "id": meta["__id__"],
+            "created_at": meta.get("__created_at__"),
+        }
+
+    async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
+        """Get multiple vector data by their IDs
+
+        Args:
+            ids: List of unique identifiers
+
+        Returns:
+            List of vector data objects that were found
+        """
+        if not ids:
+            return []
+
+        async with self._storage_lock:
+            await self._check_updated()
+            metas = [
+                self._row_meta[self._id_to_row[id]]
+                for id in ids
+                if id in self._id_to_row
+            ]
+        return [
+            {
+                **meta,
+                "id": meta["__id__"],
+                "created_at": meta.get("__created_at__"),
+            }
+            for meta in metas
+        ]
+
+    async def drop(self) -> dict[str, str]:
+        """Drop all vector data from storage and clean up resources
+
+        This method will:
+        1. Remove the vector and sidecar files if they exist
+        2. Reset the in-memory index
+        3. Update flags to notify other processes
+        4. Changes is persisted to disk immediately
+
+        Returns:
+            dict[str, str]: Operation status and message
+            - On success: {"status": "success", "message": "data dropped"}
+            - On failure: {"status": "error", "message": "<error details>"}
+        """
+        try:
+            async with self._storage_lock:
+                self._reset_state()
+                for file_name in (
+                    self._vector_file,
+                    self._meta_file,
+                    self._legacy_file,
+                ):
+                    if os.path.exists(file_name):
+                        os.remove(file_name)
+
+                # Notify other processes that data has been updated
+                await set_all_update_flags(self.namespace)
+                # Reset own update flag to avoid self-reloading
+                self.storage_updated.value = False
+
+                logger.info(
+                    f"Process {os.getpid()} drop {self.namespace}(file:{self._vector_file})"
+                )
+            return {"status": "success", "message": "data dropped"}
+        except Exception as e:
+            logger.error(f"Error dropping {self.namespace}: {e}")
+            return {"status": "error", "message": str(e)}
@@ -1468,13 +1468,20 @@ class MongoVectorDBStorage(BaseVectorStorage):
         return list_data
 
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding=None,
     ) -> list[dict[str, Any]]:
         """Queries the vector database using Atlas Vector Search."""
-        # Generate the embedding
-        embedding = await self.embedding_func(
-            [query], _priority=5
-        )  # higher priority for query
+        # Generate the embedding unless a precomputed one was provided
+        if query_embedding is not None:
+            embedding = [np.asarray(query_embedding)]
+        else:
+            embedding = await self.embedding_func(
+                [query], _priority=5
+            )  # higher priority for query
 
         # Convert numpy array to a list to ensure compatibility with MongoDB
         query_vector = embedding[0].tolist()
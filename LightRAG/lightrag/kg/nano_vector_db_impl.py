@@ -8,6 +8,7 @@ import time
 from lightrag.utils import (
     logger,
     compute_mdhash_id,
+    stack_embeddings,
 )
 import pipmaster as pm
 from lightrag.base import BaseVectorStorage
@@ -16,6 +17,14 @@ if not pm.is_installed("nano-vectordb"):
     pm.install("nano-vectordb")
 
 from nano_vectordb import NanoVectorDB
+from .filter_index import FilterIndex
+from .ann_index import (
+    IVFIndex,
+    DEFAULT_ANN_MIN_ROWS,
+    DEFAULT_NPROBE,
+    recall_latency_report,
+    top_k_by_score,
+)
 from .shared_storage import (
     get_storage_lock,
     get_update_flag,
@@ -41,6 +50,25 @@ class NanoVectorDBStorage(BaseVectorStorage):
             )
         self.cosine_better_than_threshold = cosine_threshold
 
+        # Optional approximate search, exact brute-force scan by default
+        ann_index = kwargs.get("ann_index")
+        if ann_index not in (None, "ivf"):
+            raise ValueError(
+                f"NanoVectorDBStorage does not support ann_index={ann_index!r}, use 'ivf'"
+            )
+        self._ann = (
+            IVFIndex(
+                nlist=kwargs.get("ann_nlist"),
+                nprobe=kwargs.get("ann_nprobe", DEFAULT_NPROBE),
+                min_rows=kwargs.get("ann_min_rows", DEFAULT_ANN_MIN_ROWS),
+            )
+            if ann_index
+            else None
+        )
+        # Built lazily on the first query with an `ids` filter
+        self._filter_index: FilterIndex | None = None
+        self._id_to_row: dict[str, int] | None = None
+
         working_dir = self.global_config["working_dir"]
         if self.workspace:
             # Include workspace in the file path for data isolation
@@ -55,11 +83,16 @@ class NanoVectorDBStorage(BaseVectorStorage):
                 working_dir, f"vdb_{self.namespace}.json"
             )
         self._max_batch_size = self.global_config["embedding_batch_num"]
+        # Trained IVF centroids, shared by every process through this file
+        self._ann_file_name = os.path.splitext(self._client_file_name)[0] + ".ivf.npz"
+        self._ann_file_mtime: int | None = None
+        self._ann_build_task: asyncio.Task | None = None
 
         self._client = NanoVectorDB(
             self.embedding_func.embedding_dim,
             storage_file=self._client_file_name,
         )
+        self._load_ann_centroids()
 
     async def initialize(self):
         """Initialize storage data"""
@@ -68,6 +101,16 @@ class NanoVectorDBStorage(BaseVectorStorage):
         # Get the storage lock for use in other methods
         self._storage_lock = get_storage_lock(enable_logging=False)
 
+    async def finalize(self):
+        """Stop a background IVF build still running"""
+        if self._ann_build_task is not None and not self._ann_build_task.done():
+            self._ann_build_task.cancel()
+            try:
+                await self._ann_build_task
+            except asyncio.CancelledError:
+                pass
+            self._ann.end_build()
+
     async def _get_client(self):
         """Check if the storage should be reloaded"""
         # Acquire lock to prevent concurrent read and write
@@ -82,11 +125,72 @@ class NanoVectorDBStorage(BaseVectorStorage):
                     self.embedding_func.embedding_dim,
                     storage_file=self._client_file_name,
                 )
+                self._reset_indexes()
                 # Reset update flag
                 self.storage_updated.value = False
 
             return self._client
 
+    def _reset_indexes(self):
+        """Forget secondary indexes after the client was replaced
+
+        IVF centroids are kept, or replaced by newer ones another process
+        saved, so only the rows are reassigned by the next build.
+        """
+        if self._ann is not None:
+            self._ann.invalidate()
+            self._load_ann_centroids()
+        self._filter_index = None
+        self._id_to_row = None
+
+    def _load_ann_centroids(self):
+        if self._ann is None or not os.path.exists(self._ann_file_name):
+            return
+        mtime = os.stat(self._ann_file_name).st_mtime_ns
+        if mtime != self._ann_file_mtime and self._ann.load(
+            self._ann_file_name, self.embedding_func.embedding_dim
+        ):
+            self._ann_file_mtime = mtime
+
+    def _schedule_ann_build(self, client: NanoVectorDB):
+        """Train or realign the IVF index in the background if it is due"""
+        if self._ann is None or not self._ann.needs_build(len(client)):
+            return
+        if self._ann_build_task is None or self._ann_build_task.done():
+            self._ann_build_task = asyncio.create_task(self._build_ann(client))
+
+    async def _build_ann(self, client: NanoVectorDB):
+        # Exact search serves queries until the result is installed
+        matrix = getattr(client, "_NanoVectorDB__storage")["matrix"]
+        token = self._ann.begin_build(len(matrix))
+        try:
+            state = await asyncio.to_thread(self._ann.build, matrix)
+        except Exception as e:
+            self._ann.end_build()
+            logger.warning(f"IVF index build failed for {self.namespace}: {e}")
+            return
+        current = getattr(self._client, "_NanoVectorDB__storage")["matrix"]
+        if not self._ann.install(state, token, current):
+            logger.debug(f"IVF index of {self.namespace} changed while building, retrying later")
+
+    def _delete_from_client(self, client: NanoVectorDB, ids: list[str]):
+        """Delete ids from the client, keeping the secondary indexes aligned"""
+        if self._filter_index is not None:
+            for id in ids:
+                self._filter_index.remove(id)
+        # Deletion shifts rows, rebuild the row lookup on next use
+        self._id_to_row = None
+        if self._ann is not None and self._ann.tracks_rows:
+            ids_set = set(ids)
+            storage = getattr(client, "_NanoVectorDB__storage")
+            keep = np.array(
+                [dp["__id__"] not in ids_set for dp in storage["data"]], dtype=bool
+            )
+            client.delete(ids)
+            self._ann.remove(keep)
+        else:
+            client.delete(ids)
+
     async def upsert(self, data: dict[str, dict[str, Any]]) -> None:
         """
         Importance notes:
@@ -118,12 +222,32 @@ class NanoVectorDBStorage(BaseVectorStorage):
         embedding_tasks = [self.embedding_func(batch) for batch in batches]
         embeddings_list = await asyncio.gather(*embedding_tasks)
 
-        embeddings = np.concatenate(embeddings_list)
+        embeddings = stack_embeddings(embeddings_list)
         if len(embeddings) == len(list_data):
             for i, d in enumerate(list_data):
                 d["__vector__"] = embeddings[i]
             client = await self._get_client()
+            rows_before = len(client)
             results = client.upsert(datas=list_data)
+            if self._filter_index is not None:
+                for d in list_data:
+                    self._filter_index.add(d["__id__"], d)
+            if self._id_to_row is not None:
+                # Inserts are appended, updates keep their row
+                for i, id in enumerate(results["insert"]):
+                    self._id_to_row[id] = rows_before + i
+            if self._ann is not None and self._ann.tracks_rows:
+                storage = getattr(client, "_NanoVectorDB__storage")
+                rows = list(range(rows_before, len(client)))
+                if results["update"]:
+                    updated = set(results["update"])
+                    rows += [
+                        i
+                        for i, dp in enumerate(storage["data"][:rows_before])
+                        if dp["__id__"] in updated
+                    ]
+                rows = np.array(rows, dtype=np.int64)
+                self._ann.assign(rows, storage["matrix"][rows])
             return results
         else:
             # sometimes the embedding is not returned correctly. just log it.
@@ -132,20 +256,34 @@ class NanoVectorDBStorage(BaseVectorStorage):
             )
 
     async def query(
-        self, query: str, top_k: int, ids: list[str] | None = None
+        self,
+        query: str,
+        top_k: int,
+        ids: list[str] | None = None,
+        query_embedding=None,
     ) -> list[dict[str, Any]]:
-        # Execute embedding outside of lock to avoid improve cocurrent
-        embedding = await self.embedding_func(
-            [query], _priority=5
-        )  # higher priority for query
-        embedding = embedding[0]
+        if query_embedding is not None:
+            embedding = query_embedding
+        else:
+            # Execute embedding outside of lock to avoid improve cocurrent
+            embedding = await self.embedding_func(
+                [query], _priority=5
+            )  # higher priority for query
+            embedding = embedding[0]
 
         client = await self._get_client()
-        results = client.query(
-            query=embedding,
-            top_k=top_k,
-            better_than_threshold=self.cosine_better_than_threshold,
-        )
+        results = None
+        if ids:
+            results = self._filtered_query(client, embedding, top_k, ids)
+        elif self._ann is not None:
+            self._schedule_ann_build(client)
+            results = self._ann_query(client, embedding, top_k)
+        if results is None:
+            results = client.query(
+                query=embedding,
+                top_k=top_k,
+                better_than_threshold=self.cosine_better_than_threshold,
+            )
         results = [
             {
                 **dp,
@@ -157,6 +295,121 @@ class NanoVectorDBStorage(BaseVectorStorage):
         ]
         return results
 
+    def _filtered_query(
+        self,
+        client: NanoVectorDB,
+        embedding: np.ndarray,
+        top_k: int,
+        ids: list[str],
+    ) -> list[dict[str, Any]]:
+        """Score only the rows selected by the `ids` filter"""
+        storage = getattr(client, "_NanoVectorDB__storage")
+        filter_index = self._get_filter_index(client)
+        if self._id_to_row is None:
+            self._id_to_row = {dp["__id__"]: i for i, dp in enumerate(storage["data"])}
+
+        rows = np.array(
+            sorted(self._id_to_row[id] for id in filter_index.lookup(ids)),
+            dtype=np.int64,
+        )
+        if len(rows) == 0:
+            return []
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+        scores = storage["matrix"][rows] @ embedding
+        results = []
+        for i in top_k_by_score(scores, top_k):
+            if scores[i] < self.cosine_better_than_threshold:
+                break
+            results.append(
+                {**storage["data"][rows[i]], "__metrics__": float(scores[i])}
+            )
+        return results
+
+    def _get_filter_index(self, client: NanoVectorDB) -> FilterIndex:
+        if self._filter_index is None:
+            self._filter_index = FilterIndex()
+            self._filter_index.build(getattr(client, "_NanoVectorDB__storage")["data"])
+        return self._filter_index
+
+    async def get_ids_by_filter(self, ids: list[str]) -> list[str]:
+        """Return the ids of vectors selected by an `ids` query filter"""
+        client = await self._get_client()
+        return list(self._get_filter_index(client).lookup(ids))
+
+    def _ann_query(
+        self,
+        client: NanoVectorDB,
+        embedding: np.ndarray,
+        top_k: int,
+        nprobe: int | None = None,
+    ) -> list[dict[str, Any]] | None:
+        """Query through the IVF index, None if it is not in use yet"""
+        storage = getattr(client, "_NanoVectorDB__storage")
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+        found = self._ann.search(storage["matrix"], embedding, top_k, nprobe=nprobe)
+        if found is None:
+            return None
+        results = []
+        for row, score in zip(*found):
+            if score < self.cosine_better_than_threshold:
+                break
+            results.append({**storage["data"][row], "__metrics__": float(score)})
+        return results
+
+    async def ann_report(
+        self,
+        num_queries: int = 100,
+        top_k: int = 10,
+        nprobe_values: list[int] | None = None,
+    ) -> list[dict[str, Any]]:
+        """Compare recall and latency of the IVF index against exact search
+
+        Stored vectors sampled from the storage are used as queries.
+
+        Returns:
+            One row per setting with `setting` (nprobe), `recall` and `latency_ms`
+        """
+        if self._ann is None:
+            raise ValueError(f"ann_index is not enabled for {self.namespace}")
+
+        client = await self._get_client()
+        matrix = getattr(client, "_NanoVectorDB__storage")["matrix"]
+        if len(matrix) == 0:
+            return []
+        # Force training even on small storages so the report is meaningful
+        min_rows, self._ann.min_rows = self._ann.min_rows, 0
+        try:
+            if self._ann_build_task is not None:
+                await self._ann_build_task
+            if self._ann.needs_build(len(matrix)):
+                await self._build_ann(client)
+            if not self._ann.is_ready(len(matrix)):
+                raise ValueError(
+                    f"{self.namespace} changed while the IVF index was built, retry"
+                )
+            rng = np.random.default_rng(0)
+            queries = matrix[
+                rng.choice(len(matrix), min(num_queries, len(matrix)), replace=False)
+            ]
+
+            def exact_search(query, k):
+                return top_k_by_score(matrix @ query, k).tolist()
+
+            def ann_search(query, k, nprobe):
+                return self._ann.search(matrix, query, k, nprobe=nprobe)[0].tolist()
+
+            return recall_latency_report(
+                exact_search,
+                ann_search,
+                queries,
+                top_k,
+                nprobe_values or [1, 2, 4, 8, 16, 32],
+            )
+        finally:
+            self._ann.min_rows = min_rows
+
     @property
     async def client_storage(self):
         client = await self._get_client()
@@ -175,7 +428,7 @@ class NanoVectorDBStorage(BaseVectorStorage):
         """
         try:
             client = await self._get_client()
-            client.delete(ids)
+            self._delete_from_client(client, ids)
             logger.debug(
                 f"Successfully deleted {len(ids)} vectors from {self.namespace}"
             )
@@ -199,7 +452,7 @@ class NanoVectorDBStorage(BaseVectorStorage):
             # Check if the entity exists
             client = await self._get_client()
             if client.get([entity_id]):
-                client.delete([entity_id])
+                self._delete_from_client(client, [entity_id])
                 logger.debug(f"Successfully deleted entity {entity_name}")
             else:
                 logger.debug(f"Entity {entity_name} not found in storage")
@@ -227,7 +480,7 @@ class NanoVectorDBStorage(BaseVectorStorage):
 
             if ids_to_delete:
                 client = await self._get_client()
-                client.delete(ids_to_delete)
+                self._delete_from_client(client, ids_to_delete)
                 logger.debug(
                     f"Deleted {len(ids_to_delete)} relations for {entity_name}"
                 )
@@ -249,6 +502,7 @@ class NanoVectorDBStorage(BaseVectorStorage):
                     self.embedding_func.embedding_dim,
                     storage_file=self._client_file_name,
                 )
+                self._reset_indexes()
                 # Reset update flag
                 self.storage_updated.value = False
                 return False  # Return error
@@ -258,6 +512,9 @@ class NanoVectorDBStorage(BaseVectorStorage):
             try:
                 # Save data to disk
                 self._client.save()
+                if self._ann is not None and self._ann.unsaved:
+                    self._ann.save(self._ann_file_name)
+                    self._ann_file_mtime = os.stat(self._ann_file_name).st_mtime_ns
                 # Notify other processes that data has been updated
                 await set_all_update_flags(self.namespace)
                 # Reset own update flag to avoid self-reloading
@@ -333,11 +590,16 @@ class NanoVectorDBStorage(BaseVectorStorage):
                 # delete _client_file_name
                 if os.path.exists(self._client_file_name):
                     os.remove(self._client_file_name)
+                if os.path.exists(self._ann_file_name):
+                    os.remove(self._ann_file_name)
 
                 self._client = NanoVectorDB(
                     self.embedding_func.embedding_dim,
                     storage_file=self._client_file_name,
                 )
+                self._reset_indexes()
+                if self._ann is not None:
+                    self._ann.reset()
 
                 # Notify other processes that data has been updated
                 await set_all_update_flags(self.namespace)
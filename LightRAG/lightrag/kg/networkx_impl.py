@@ -1,6 +1,8 @@
+import json
 import os
+import uuid
 from dataclasses import dataclass
-from typing import final
+from typing import Any, final
 
 from lightrag.types import KnowledgeGraph, KnowledgeGraphNode, KnowledgeGraphEdge
 from lightrag.utils import logger
@@ -13,6 +15,7 @@ if not pm.is_installed("networkx"):
     pm.install("networkx")
 
 import networkx as nx
+from .graph_snapshot import BINARY_SNAPSHOT_SUFFIX, read_graph, write_graph
 from .shared_storage import (
     get_storage_lock,
     get_update_flag,
@@ -26,6 +29,16 @@ from dotenv import load_dotenv
 # the OS environment variables take precedence over the .env file
 load_dotenv(dotenv_path=".env", override=False)
 
+# The operation log is folded into a new GraphML snapshot once it holds more
+# operations than this fraction of the graph size (nodes + edges)
+OPLOG_COMPACT_RATIO = float(os.getenv("NETWORKX_OPLOG_COMPACT_RATIO", 0.5))
+OPLOG_COMPACT_MIN_OPS = int(os.getenv("NETWORKX_OPLOG_COMPACT_MIN_OPS", 10000))
+# Graph attribute tying a snapshot to the operation log started with it
+SNAPSHOT_GENERATION_KEY = "oplog_generation"
+# "graphml" keeps snapshots readable by GraphML tooling, "binary" loads much
+# faster (see graph_snapshot.py); either format is read when the other is absent
+SNAPSHOT_FORMAT = os.getenv("NETWORKX_SNAPSHOT_FORMAT", "graphml").lower()
+
 
 @final
 @dataclass
@@ -33,7 +46,7 @@ class NetworkXStorage(BaseGraphStorage):
     @staticmethod
     def load_nx_graph(file_name) -> nx.Graph:
         if os.path.exists(file_name):
-            return nx.read_graphml(file_name)
+            return read_graph(file_name)
         return None
 
     @staticmethod
@@ -41,35 +54,45 @@ class NetworkXStorage(BaseGraphStorage):
         logger.info(
             f"Writing graph with {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges"
         )
-        nx.write_graphml(graph, file_name)
+        write_graph(graph, file_name)
 
     def __post_init__(self):
         working_dir = self.global_config["working_dir"]
         if self.workspace:
             # Include workspace in the file path for data isolation
-            workspace_dir = os.path.join(working_dir, self.workspace)
-            os.makedirs(workspace_dir, exist_ok=True)
-            self._graphml_xml_file = os.path.join(
-                workspace_dir, f"graph_{self.namespace}.graphml"
-            )
+            storage_dir = os.path.join(working_dir, self.workspace)
+            os.makedirs(storage_dir, exist_ok=True)
         else:
             # Default behavior when workspace is empty
-            self._graphml_xml_file = os.path.join(
-                working_dir, f"graph_{self.namespace}.graphml"
-            )
+            storage_dir = working_dir
+        self._graphml_xml_file = os.path.join(
+            storage_dir, f"graph_{self.namespace}.graphml"
+        )
+        self._binary_graph_file = os.path.join(
+            storage_dir, f"graph_{self.namespace}{BINARY_SNAPSHOT_SUFFIX}"
+        )
+        if SNAPSHOT_FORMAT == "binary":
+            self._snapshot_file = self._binary_graph_file
+            self._other_snapshot_file = self._graphml_xml_file
+        else:
+            self._snapshot_file = self._graphml_xml_file
+            self._other_snapshot_file = self._binary_graph_file
+        # Append-only log of the changes made since the snapshot was written
+        self._oplog_file = os.path.join(
+            storage_dir, f"graph_{self.namespace}.oplog.jsonl"
+        )
         self._storage_lock = None
         self.storage_updated = None
         self._graph = None
 
         # Load initial graph
-        preloaded_graph = NetworkXStorage.load_nx_graph(self._graphml_xml_file)
-        if preloaded_graph is not None:
+        snapshot_file = self._load_graph()
+        if snapshot_file is not None:
             logger.info(
-                f"Loaded graph from {self._graphml_xml_file} with {preloaded_graph.number_of_nodes()} nodes, {preloaded_graph.number_of_edges()} edges"
+                f"Loaded graph from {snapshot_file} with {self._graph.number_of_nodes()} nodes, {self._graph.number_of_edges()} edges"
             )
         else:
             logger.info("Created new empty graph")
-        self._graph = preloaded_graph or nx.Graph()
 
     async def initialize(self):
         """Initialize storage data"""
@@ -78,6 +101,221 @@ class NetworkXStorage(BaseGraphStorage):
         # Get the storage lock for use in other methods
         self._storage_lock = get_storage_lock()
 
+    # --------------------------------------------------------------------------------
+    # Snapshot + operation log persistence
+    # --------------------------------------------------------------------------------
+
+    def _load_graph(self) -> str | None:
+        """Load the snapshot and replay the operation log started with it
+
+        Returns:
+            The snapshot file loaded, None for a new empty graph
+        """
+        self._graph = None
+        # chunk id -> nodes / edges whose source_id holds it, built on first use
+        self._chunk_nodes: dict[str, set[str]] | None = None
+        self._chunk_edges: dict[str, set[tuple[str, str]]] | None = None
+        snapshot_file = None
+        # Fall back to the other format to pick up a graph saved before a format switch
+        for file_name in (self._snapshot_file, self._other_snapshot_file):
+            self._graph = NetworkXStorage.load_nx_graph(file_name)
+            if self._graph is not None:
+                snapshot_file = file_name
+                break
+        self._graph = self._graph or nx.Graph()
+        snapshot_generation = self._graph.graph.pop(SNAPSHOT_GENERATION_KEY, None)
+        # Operations made since the last save, not yet in the log
+        self._pending_ops: list[dict[str, Any]] = []
+        self._generation: str | None = None
+        # Byte offset of the log already applied to the graph
+        self._oplog_offset = 0
+        self._oplog_ops = 0
+
+        header, header_size = self._read_oplog_header()
+        if header is None:
+            return snapshot_file
+        if header["generation"] != snapshot_generation:
+            # Interrupted compaction: the snapshot already holds these operations
+            logger.warning(
+                f"Ignoring operation log {self._oplog_file} not matching the graph snapshot"
+            )
+            return snapshot_file
+        self._generation = header["generation"]
+        self._oplog_offset = header_size
+        self._replay_oplog()
+        return snapshot_file
+
+    def _read_oplog_header(self) -> tuple[dict[str, Any] | None, int]:
+        if not os.path.exists(self._oplog_file):
+            return None, 0
+        with open(self._oplog_file, "rb") as f:
+            line = f.readline()
+        if not line.endswith(b"\n"):
+            return None, 0
+        return json.loads(line), len(line)
+
+    def _replay_oplog(self) -> int:
+        """Apply the complete log lines past the current offset"""
+        applied = 0
+        with open(self._oplog_file, "rb") as f:
+            f.seek(self._oplog_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Partially written by an interrupted save
+                    break
+                self._apply_op(json.loads(line))
+                self._oplog_offset += len(line)
+                applied += 1
+        self._oplog_ops += applied
+        return applied
+
+    def _apply_op(self, op: dict[str, Any]):
+        """Apply one operation to the graph, keeping the chunk index in sync"""
+        graph = self._graph
+        indexed = self._chunk_nodes is not None
+        kind = op["op"]
+        if kind == "upsert_node":
+            node_id = op["id"]
+            if indexed and node_id in graph:
+                self._index_node(node_id, add=False)
+            graph.add_node(node_id, **op["data"])
+            if indexed:
+                self._index_node(node_id)
+        elif kind == "upsert_edge":
+            source, target = op["source"], op["target"]
+            if indexed and graph.has_edge(source, target):
+                self._index_edge(source, target, add=False)
+            graph.add_edge(source, target, **op["data"])
+            if indexed:
+                self._index_edge(source, target)
+        elif kind == "delete_node":
+            node_id = op["id"]
+            if graph.has_node(node_id):
+                if indexed:
+                    self._index_node(node_id, add=False)
+                    for neighbor in graph.adj[node_id]:
+                        self._index_edge(node_id, neighbor, add=False)
+                graph.remove_node(node_id)
+        elif kind == "delete_edge":
+            source, target = op["source"], op["target"]
+            if graph.has_edge(source, target):
+                if indexed:
+                    self._index_edge(source, target, add=False)
+                graph.remove_edge(source, target)
+
+    def _record_op(self, op: dict[str, Any]):
+        """Apply a local change and queue it for the operation log"""
+        self._apply_op(op)
+        self._pending_ops.append(op)
+
+    # --------------------------------------------------------------------------------
+    # chunk id -> nodes / edges index
+    # --------------------------------------------------------------------------------
+
+    @staticmethod
+    def _source_chunk_ids(data: dict[str, Any]) -> list[str]:
+        source_id = data.get("source_id")
+        return source_id.split(GRAPH_FIELD_SEP) if source_id else []
+
+    @staticmethod
+    def _update_index(index: dict[str, set], chunk_ids: list[str], key, add: bool):
+        for chunk_id in chunk_ids:
+            if add:
+                index.setdefault(chunk_id, set()).add(key)
+            else:
+                keys = index.get(chunk_id)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del index[chunk_id]
+
+    def _index_node(self, node_id: str, add: bool = True):
+        chunk_ids = self._source_chunk_ids(self._graph.nodes[node_id])
+        self._update_index(self._chunk_nodes, chunk_ids, node_id, add)
+
+    def _index_edge(self, source: str, target: str, add: bool = True):
+        # Undirected graph: key each edge by its sorted endpoints
+        key = (source, target) if source <= target else (target, source)
+        chunk_ids = self._source_chunk_ids(self._graph.adj[source][target])
+        self._update_index(self._chunk_edges, chunk_ids, key, add)
+
+    def _ensure_chunk_index(self):
+        if self._chunk_nodes is not None:
+            return
+        self._chunk_nodes = {}
+        self._chunk_edges = {}
+        for node_id in self._graph.nodes:
+            self._index_node(node_id)
+        for source, target in self._graph.edges:
+            self._index_edge(source, target)
+
+    def _reload(self):
+        """Catch up with another process's save, replaying only the log tail if possible"""
+        header, _ = self._read_oplog_header()
+        if (
+            self._pending_ops
+            or self._generation is None
+            or header is None
+            or header["generation"] != self._generation
+        ):
+            self._load_graph()
+            return
+        applied = self._replay_oplog()
+        logger.info(f"Replayed {applied} graph operations for {self.namespace}")
+
+    def _needs_compaction(self) -> bool:
+        graph_size = self._graph.number_of_nodes() + self._graph.number_of_edges()
+        return self._oplog_ops + len(self._pending_ops) > max(
+            OPLOG_COMPACT_MIN_OPS, OPLOG_COMPACT_RATIO * graph_size
+        )
+
+    def _save(self):
+        if self._generation is None or self._needs_compaction():
+            self._write_snapshot()
+        else:
+            self._append_oplog()
+
+    def _append_oplog(self):
+        data = "".join(
+            json.dumps(op, ensure_ascii=False) + "\n" for op in self._pending_ops
+        ).encode("utf-8")
+        with open(self._oplog_file, "r+b") as f:
+            # Drop a line left half-written by an interrupted save
+            f.seek(self._oplog_offset)
+            f.truncate()
+            f.write(data)
+        self._oplog_offset += len(data)
+        self._oplog_ops += len(self._pending_ops)
+        self._pending_ops = []
+
+    def _write_snapshot(self):
+        """Write a full snapshot and start an empty operation log"""
+        generation = uuid.uuid4().hex
+        # Keep the extension, it selects the snapshot format
+        base, ext = os.path.splitext(self._snapshot_file)
+        tmp_graph_file = f"{base}.tmp{ext}"
+        tmp_oplog_file = self._oplog_file + ".tmp"
+
+        self._graph.graph[SNAPSHOT_GENERATION_KEY] = generation
+        try:
+            NetworkXStorage.write_nx_graph(self._graph, tmp_graph_file)
+        finally:
+            self._graph.graph.pop(SNAPSHOT_GENERATION_KEY, None)
+        header = (json.dumps({"generation": generation}) + "\n").encode("utf-8")
+        with open(tmp_oplog_file, "wb") as f:
+            f.write(header)
+
+        # Snapshot first: a crash in between leaves an old log that is ignored
+        os.replace(tmp_graph_file, self._snapshot_file)
+        os.replace(tmp_oplog_file, self._oplog_file)
+        if os.path.exists(self._other_snapshot_file):
+            # Left over from before a format switch and now outdated
+            os.remove(self._other_snapshot_file)
+        self._generation = generation
+        self._oplog_offset = len(header)
+        self._oplog_ops = 0
+        self._pending_ops = []
+
     async def _get_graph(self):
         """Check if the storage should be reloaded"""
         # Acquire lock to prevent concurrent read and write
@@ -88,9 +326,7 @@ class NetworkXStorage(BaseGraphStorage):
                     f"Process {os.getpid()} reloading graph {self.namespace} due to update by another process"
                 )
                 # Reload data
-                self._graph = (
-                    NetworkXStorage.load_nx_graph(self._graphml_xml_file) or nx.Graph()
-                )
+                self._reload()
                 # Reset update flag
                 self.storage_updated.value = False
 
@@ -130,6 +366,65 @@ class NetworkXStorage(BaseGraphStorage):
             return list(graph.edges(source_node_id))
         return None
 
+    async def get_nodes_batch(self, node_ids: list[str]) -> dict[str, dict]:
+        """Get nodes as a batch, resolving all ids under a single graph access"""
+        graph = await self._get_graph()
+        nodes = graph.nodes
+        return {node_id: nodes[node_id] for node_id in node_ids if node_id in nodes}
+
+    async def node_degrees_batch(self, node_ids: list[str]) -> dict[str, int]:
+        """Node degrees as a batch, 0 for nodes not in the graph"""
+        graph = await self._get_graph()
+        adj = graph.adj
+        return {
+            node_id: graph.degree(node_id) if node_id in adj else 0
+            for node_id in node_ids
+        }
+
+    async def edge_degrees_batch(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], int]:
+        """Edge degrees (sum of both endpoint degrees) as a batch"""
+        graph = await self._get_graph()
+        adj = graph.adj
+        degrees = {}
+        for src_id, tgt_id in edge_pairs:
+            for node_id in (src_id, tgt_id):
+                if node_id not in degrees:
+                    degrees[node_id] = graph.degree(node_id) if node_id in adj else 0
+        return {
+            (src_id, tgt_id): degrees[src_id] + degrees[tgt_id]
+            for src_id, tgt_id in edge_pairs
+        }
+
+    async def get_edges_batch(
+        self, pairs: list[dict[str, str]]
+    ) -> dict[tuple[str, str], dict]:
+        """Get edges as a batch, pairs missing from the graph are left out"""
+        graph = await self._get_graph()
+        adj = graph.adj
+        result = {}
+        for pair in pairs:
+            src_id = pair["src"]
+            tgt_id = pair["tgt"]
+            neighbors = adj.get(src_id)
+            if neighbors is not None and tgt_id in neighbors:
+                result[(src_id, tgt_id)] = neighbors[tgt_id]
+        return result
+
+    async def get_nodes_edges_batch(
+        self, node_ids: list[str]
+    ) -> dict[str, list[tuple[str, str]]]:
+        """Get the edges of several nodes as a batch, [] for unknown nodes"""
+        graph = await self._get_graph()
+        adj = graph.adj
+        return {
+            node_id: [(node_id, neighbor) for neighbor in adj[node_id]]
+            if node_id in adj
+            else []
+            for node_id in node_ids
+        }
+
     async def upsert_node(self, node_id: str, node_data: dict[str, str]) -> None:
         """
         Importance notes:
@@ -137,8 +432,8 @@ class NetworkXStorage(BaseGraphStorage):
         2. Only one process should updating the storage at a time before index_done_callback,
            KG-storage-log should be used to avoid data corruption
         """
-        graph = await self._get_graph()
-        graph.add_node(node_id, **node_data)
+        await self._get_graph()
+        self._record_op({"op": "upsert_node", "id": node_id, "data": dict(node_data)})
 
     async def upsert_edge(
         self, source_node_id: str, target_node_id: str, edge_data: dict[str, str]
@@ -149,8 +444,15 @@ class NetworkXStorage(BaseGraphStorage):
         2. Only one process should updating the storage at a time before index_done_callback,
            KG-storage-log should be used to avoid data corruption
         """
-        graph = await self._get_graph()
-        graph.add_edge(source_node_id, target_node_id, **edge_data)
+        await self._get_graph()
+        self._record_op(
+            {
+                "op": "upsert_edge",
+                "source": source_node_id,
+                "target": target_node_id,
+                "data": dict(edge_data),
+            }
+        )
 
     async def delete_node(self, node_id: str) -> None:
         """
@@ -161,7 +463,7 @@ class NetworkXStorage(BaseGraphStorage):
         """
         graph = await self._get_graph()
         if graph.has_node(node_id):
-            graph.remove_node(node_id)
+            self._record_op({"op": "delete_node", "id": node_id})
             logger.debug(f"Node {node_id} deleted from the graph.")
         else:
             logger.warning(f"Node {node_id} not found in the graph for deletion.")
@@ -180,7 +482,7 @@ class NetworkXStorage(BaseGraphStorage):
         graph = await self._get_graph()
         for node in nodes:
             if graph.has_node(node):
-                graph.remove_node(node)
+                self._record_op({"op": "delete_node", "id": node})
 
     async def remove_edges(self, edges: list[tuple[str, str]]):
         """Delete multiple edges
@@ -196,7 +498,9 @@ class NetworkXStorage(BaseGraphStorage):
         graph = await self._get_graph()
         for source, target in edges:
             if graph.has_edge(source, target):
-                graph.remove_edge(source, target)
+                self._record_op(
+                    {"op": "delete_edge", "source": source, "target": target}
+                )
 
     async def get_all_labels(self) -> list[str]:
         """
@@ -373,30 +677,30 @@ class NetworkXStorage(BaseGraphStorage):
         return result
 
     async def get_nodes_by_chunk_ids(self, chunk_ids: list[str]) -> list[dict]:
-        chunk_ids_set = set(chunk_ids)
         graph = await self._get_graph()
+        self._ensure_chunk_index()
+        node_ids = set()
+        for chunk_id in chunk_ids:
+            node_ids.update(self._chunk_nodes.get(chunk_id, ()))
         matching_nodes = []
-        for node_id, node_data in graph.nodes(data=True):
-            if "source_id" in node_data:
-                node_source_ids = set(node_data["source_id"].split(GRAPH_FIELD_SEP))
-                if not node_source_ids.isdisjoint(chunk_ids_set):
-                    node_data_with_id = node_data.copy()
-                    node_data_with_id["id"] = node_id
-                    matching_nodes.append(node_data_with_id)
+        for node_id in node_ids:
+            node_data_with_id = graph.nodes[node_id].copy()
+            node_data_with_id["id"] = node_id
+            matching_nodes.append(node_data_with_id)
         return matching_nodes
 
     async def get_edges_by_chunk_ids(self, chunk_ids: list[str]) -> list[dict]:
-        chunk_ids_set = set(chunk_ids)
         graph = await self._get_graph()
+        self._ensure_chunk_index()
+        edge_keys = set()
+        for chunk_id in chunk_ids:
+            edge_keys.update(self._chunk_edges.get(chunk_id, ()))
         matching_edges = []
-        for u, v, edge_data in graph.edges(data=True):
-            if "source_id" in edge_data:
-                edge_source_ids = set(edge_data["source_id"].split(GRAPH_FIELD_SEP))
-                if not edge_source_ids.isdisjoint(chunk_ids_set):
-                    edge_data_with_nodes = edge_data.copy()
-                    edge_data_with_nodes["source"] = u
-                    edge_data_with_nodes["target"] = v
-                    matching_edges.append(edge_data_with_nodes)
+        for u, v in edge_keys:
+            edge_data_with_nodes = graph.adj[u][v].copy()
+            edge_data_with_nodes["source"] = u
+            edge_data_with_nodes["target"] = v
+            matching_edges.append(edge_data_with_nodes)
         return matching_edges
 
     async def index_done_callback(self) -> bool:
@@ -408,9 +712,7 @@ class NetworkXStorage(BaseGraphStorage):
                 logger.info(
                     f"Graph for {self.namespace} was updated by another process, reloading..."
                 )
-                self._graph = (
-                    NetworkXStorage.load_nx_graph(self._graphml_xml_file) or nx.Graph()
-                )
+                self._reload()
                 # Reset update flag
                 self.storage_updated.value = False
                 return False  # Return error
@@ -418,8 +720,10 @@ class NetworkXStorage(BaseGraphStorage):
         # Acquire lock and perform persistence
         async with self._storage_lock:
             try:
-                # Save data to disk
-                NetworkXStorage.write_nx_graph(self._graph, self._graphml_xml_file)
+                if not self._pending_ops and self._generation is not None:
+                    return True  # Nothing changed since the last save
+                # Append the changes to the operation log, or compact into a snapshot
+                self._save()
                 # Notify other processes that data has been updated
                 await set_all_update_flags(self.namespace)
                 # Reset own update flag to avoid self-reloading
@@ -431,11 +735,21 @@ class NetworkXStorage(BaseGraphStorage):
 
         return True
 
+    async def export_graphml(self, file_name: str) -> None:
+        """Write the current graph, including unsaved changes, to a GraphML file
+
+        Lets GraphML tooling such as the graph visualizer read graphs stored in
+        the binary snapshot format or with an operation log tail.
+        """
+        graph = await self._get_graph()
+        async with self._storage_lock:
+            nx.write_graphml(graph, file_name)
+
     async def drop(self) -> dict[str, str]:
         """Drop all graph data from storage and clean up resources
 
         This method will:
-        1. Remove the graph storage file if it exists
+        1. Remove the graph snapshot and operation log files if they exist
         2. Reset the graph to an empty state
         3. Update flags to notify other processes
         4. Changes is persisted to disk immediately
@@ -448,15 +762,20 @@ class NetworkXStorage(BaseGraphStorage):
         try:
             async with self._storage_lock:
                 # delete _client_file_name
-                if os.path.exists(self._graphml_xml_file):
-                    os.remove(self._graphml_xml_file)
-                self._graph = nx.Graph()
+                for file_name in (
+                    self._graphml_xml_file,
+                    self._binary_graph_file,
+                    self._oplog_file,
+                ):
+                    if os.path.exists(file_name):
+                        os.remove(file_name)
+                self._load_graph()
                 # Notify other processes that data has been updated
                 await set_all_update_flags(self.namespace)
                 # Reset own update flag to avoid self-reloading
                 self.storage_updated.value = False
                 logger.info(
-                    f"Process {os.getpid()} drop graph {self.namespace} (file:{self._graphml_xml_file})"
+                    f"Process {os.getpid()} drop graph {self.namespace} (file:{self._snapshot_file})"
                 )
             return {"status": "success", "message": "data dropped"}
         except Exception as e:
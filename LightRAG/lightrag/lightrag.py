@@ -4,6 +4,7 @@ import traceback
 import asyncio
 import configparser
 import os
+import sys
 import time
 import warnings
 from dataclasses import asdict, dataclass, field
@@ -36,8 +37,24 @@ from lightrag.constants import (
     DEFAULT_MAX_TOTAL_TOKENS,
     DEFAULT_COSINE_THRESHOLD,
     DEFAULT_RELATED_CHUNK_NUMBER,
+    DEFAULT_QUERY_CACHE_MAX_ENTRIES,
+    DEFAULT_QUERY_CACHE_TTL,
+    DEFAULT_EMBEDDING_BATCH_MAX_NUM,
+    DEFAULT_EMBEDDING_BATCH_MAX_TOKENS,
+    DEFAULT_EMBEDDING_BATCH_LINGER,
+    DEFAULT_EMBEDDING_BATCH_TARGET_LATENCY,
+    DEFAULT_EMBEDDING_DISK_CACHE_MAX_MB,
+    DEFAULT_CHUNKING_EXECUTOR,
+    DEFAULT_DOCUMENT_SPOOL_THRESHOLD_MB,
 )
 from lightrag.utils import get_env_value
+from lightrag.embedding_batcher import batched_embedding_func
+from lightrag.embedding_cache import (
+    CACHE_FILE_NAME as EMBEDDING_CACHE_FILE_NAME,
+    EmbeddingDiskCache,
+    cached_embedding_func,
+    embedding_model_key,
+)
 
 from lightrag.kg import (
     STORAGES,
@@ -63,9 +80,13 @@ from .base import (
     DeletionResult,
 )
 from .namespace import NameSpace
+from .doc_content import CONTENT_DIR_NAME, content_file_path, spool_document
 from .operate import (
+    achunking,
     chunking_by_token_size,
     extract_entities,
+    get_chunking_executor,
+    shutdown_chunking_executors,
     merge_nodes_and_edges,
     kg_query,
     naive_query,
@@ -85,6 +106,7 @@ from .utils import (
     get_content_summary,
     clean_text,
     check_storage_env_vars,
+    bump_storage_generation,
     logger,
 )
 from .types import KnowledgeGraph
@@ -248,6 +270,30 @@ class LightRAG:
     Defaults to `chunking_by_token_size` if not specified.
     """
 
+    chunking_executor: str = field(
+        default=os.getenv("CHUNKING_EXECUTOR", DEFAULT_CHUNKING_EXECUTOR)
+    )
+    """Where documents are chunked: `thread` or `process` pool, or `none` for the event loop.
+
+    Use `process` with pure-Python tokenizers that hold the GIL. It requires a
+    picklable `chunking_func` and tokenizer, and scripts must guard their entry
+    point with `if __name__ == "__main__":`.
+    """
+
+    chunking_max_workers: int = field(
+        default=int(os.getenv("CHUNKING_MAX_WORKERS", 0))
+    )
+    """Worker count of the chunking pool, 0 uses the executor default (CPU based)."""
+
+    document_spool_threshold_mb: int = field(
+        default=int(
+            os.getenv(
+                "DOCUMENT_SPOOL_THRESHOLD_MB", DEFAULT_DOCUMENT_SPOOL_THRESHOLD_MB
+            )
+        )
+    )
+    """Streamed documents longer than this many megabytes of text are spooled to a compressed content file instead of being stored as one string."""
+
     # Embedding
     # ---
 
@@ -262,6 +308,58 @@ class LightRAG:
     )
     """Maximum number of concurrent embedding function calls."""
 
+    embedding_batch_max_num: int = field(
+        default=int(
+            os.getenv("EMBEDDING_BATCH_MAX_NUM", DEFAULT_EMBEDDING_BATCH_MAX_NUM)
+        )
+    )
+    """Upper bound the adaptive embedding batch size may grow to, starting from `embedding_batch_num`."""
+
+    embedding_batch_max_tokens: int = field(
+        default=int(
+            os.getenv("EMBEDDING_BATCH_MAX_TOKENS", DEFAULT_EMBEDDING_BATCH_MAX_TOKENS)
+        )
+    )
+    """Token budget of a single embedding request."""
+
+    embedding_batch_linger: float = field(
+        default=float(
+            os.getenv("EMBEDDING_BATCH_LINGER", DEFAULT_EMBEDDING_BATCH_LINGER)
+        )
+    )
+    """Seconds to wait for more texts before sending a partial embedding batch. 0 disables coalescing waits."""
+
+    embedding_batch_target_latency: float = field(
+        default=float(
+            os.getenv(
+                "EMBEDDING_BATCH_TARGET_LATENCY", DEFAULT_EMBEDDING_BATCH_TARGET_LATENCY
+            )
+        )
+    )
+    """Full embedding batches slower than this many seconds shrink the batch size."""
+
+    embedding_disk_cache: bool = field(
+        default=get_env_value("EMBEDDING_DISK_CACHE", True, bool)
+    )
+    """Reuse embeddings of unchanged texts from a persistent cache keyed by model and text."""
+
+    embedding_disk_cache_dir: str = field(
+        default=os.getenv("EMBEDDING_DISK_CACHE_DIR", "")
+    )
+    """Directory of embedding_cache.sqlite, defaults to the working directory. Point several instances at one directory to share embeddings."""
+
+    embedding_disk_cache_max_mb: int = field(
+        default=int(
+            os.getenv("EMBEDDING_DISK_CACHE_MAX_MB", DEFAULT_EMBEDDING_DISK_CACHE_MAX_MB)
+        )
+    )
+    """Size bound of the embedding cache, least recently used entries are evicted beyond it."""
+
+    embedding_disk_cache_model_key: str = field(
+        default=os.getenv("EMBEDDING_DISK_CACHE_MODEL_KEY", "")
+    )
+    """Name of the embedding model (and endpoint) used in cache keys. Derived from `embedding_func` when empty; the cache is disabled if that fails."""
+
     embedding_cache_config: dict[str, Any] = field(
         default_factory=lambda: {
             "enabled": False,
@@ -269,10 +367,10 @@ class LightRAG:
             "use_llm_check": False,
         }
     )
-    """Configuration for embedding cache.
-    - enabled: If True, enables caching to avoid redundant computations.
-    - similarity_threshold: Minimum similarity score to use cached embeddings.
-    - use_llm_check: If True, validates cached embeddings using an LLM.
+    """Configuration for the semantic query cache (requires enable_llm_cache).
+    - enabled: If True, a query whose embedding is close to a cached query of the same mode reuses its answer.
+    - similarity_threshold: Minimum cosine similarity between the two queries for a cache hit.
+    - use_llm_check: If True, an LLM must also judge the two queries equivalent.
     """
 
     # LLM Configuration
@@ -311,6 +409,18 @@ class LightRAG:
     enable_llm_cache_for_entity_extract: bool = field(default=True)
     """If True, enables caching for entity extraction steps to reduce LLM costs."""
 
+    query_cache_max_entries: int = field(
+        default=int(
+            os.getenv("QUERY_CACHE_MAX_ENTRIES", DEFAULT_QUERY_CACHE_MAX_ENTRIES)
+        )
+    )
+    """Size of the in-process LRU tier kept in front of the LLM response cache for query answers. 0 disables it."""
+
+    query_cache_ttl: int = field(
+        default=int(os.getenv("QUERY_CACHE_TTL", DEFAULT_QUERY_CACHE_TTL))
+    )
+    """Seconds a cached query answer stays valid, in both cache tiers. 0 means no expiry."""
+
     # Extensions
     # ---
 
@@ -381,6 +491,9 @@ class LightRAG:
             logger.info(f"Creating working directory {self.working_dir}")
             os.makedirs(self.working_dir)
 
+        # Fails on an unknown CHUNKING_EXECUTOR here rather than per document
+        get_chunking_executor(self.chunking_executor, self.chunking_max_workers)
+
         # Verify storage implementation compatibility and environment variables
         storage_configs = [
             ("KV_STORAGE", self.kv_storage),
@@ -415,10 +528,45 @@ class LightRAG:
         _print_config = ",\n  ".join([f"{k} = {v}" for k, v in global_config.items()])
         logger.debug(f"LightRAG init with param:\n  {_print_config}\n")
 
-        # Init Embedding
-        self.embedding_func = priority_limit_async_func_call(
-            self.embedding_func_max_async
-        )(self.embedding_func)
+        # Init Embedding: calls from all storages are coalesced into adaptive
+        # batches, then run with priority-based concurrency control
+        self.embedding_func = batched_embedding_func(
+            max_async=self.embedding_func_max_async,
+            batch_size=self.embedding_batch_num,
+            max_batch_size=self.embedding_batch_max_num,
+            max_batch_tokens=self.embedding_batch_max_tokens,
+            linger=self.embedding_batch_linger,
+            target_latency=self.embedding_batch_target_latency,
+            tokenizer=self.tokenizer,
+        )(
+            priority_limit_async_func_call(self.embedding_func_max_async)(
+                self.embedding_func
+            )
+        )
+        # Texts embedded before, by any instance sharing the cache file, skip
+        # the queue entirely
+        if self.embedding_disk_cache and self.embedding_func is not None:
+            model_key = embedding_model_key(
+                self.embedding_func, self.embedding_disk_cache_model_key
+            )
+            if model_key is None:
+                logger.warning(
+                    "Embedding disk cache disabled: the embedding model cannot be "
+                    "identified from embedding_func, set embedding_disk_cache_model_key "
+                    "(EMBEDDING_DISK_CACHE_MODEL_KEY) to enable it"
+                )
+            else:
+                self.embedding_func = cached_embedding_func(
+                    EmbeddingDiskCache(
+                        os.path.join(
+                            self.embedding_disk_cache_dir or self.working_dir,
+                            EMBEDDING_CACHE_FILE_NAME,
+                        ),
+                        model_key=model_key,
+                        dim=self.embedding_func.embedding_dim,
+                        max_bytes=self.embedding_disk_cache_max_mb * 1024 * 1024,
+                    )
+                )(self.embedding_func)
 
         # Initialize all storages
         self.key_string_value_json_storage_cls: type[BaseKVStorage] = (
@@ -585,6 +733,23 @@ class LightRAG:
 
             await asyncio.gather(*tasks)
 
+            embedding_cache = getattr(self.embedding_func, "cache", None)
+            if embedding_cache is not None:
+                logger.info(f"Embedding cache stats: {embedding_cache.stats()}")
+
+            # Stop the dispatcher of the embedding micro-batcher
+            embedding_batcher = getattr(self.embedding_func, "batcher", None)
+            if embedding_batcher is not None:
+                await embedding_batcher.aclose()
+
+            # Stop the chunking worker threads or processes
+            await asyncio.to_thread(shutdown_chunking_executors)
+
+            # Close pooled LLM/embedding HTTP clients, only if the binding was used
+            openai_binding = sys.modules.get("lightrag.llm.openai")
+            if openai_binding is not None:
+                await openai_binding.close_openai_async_clients()
+
             self._storages_status = StoragesStatus.FINALIZED
             logger.debug("Finalized Storages")
 
@@ -674,6 +839,50 @@ class LightRAG:
             split_by_character, split_by_character_only
         )
 
+    def insert_stream(
+        self,
+        source: Any,
+        split_by_character: str | None = None,
+        split_by_character_only: bool = False,
+        doc_id: str | None = None,
+        file_path: str | None = None,
+    ) -> str | None:
+        """Sync Insert a single document read from a stream, see `ainsert_stream`"""
+        loop = always_get_an_event_loop()
+        return loop.run_until_complete(
+            self.ainsert_stream(
+                source, split_by_character, split_by_character_only, doc_id, file_path
+            )
+        )
+
+    async def ainsert_stream(
+        self,
+        source: Any,
+        split_by_character: str | None = None,
+        split_by_character_only: bool = False,
+        doc_id: str | None = None,
+        file_path: str | None = None,
+    ) -> str | None:
+        """Async Insert a single document read from a stream with bounded memory
+
+        Args:
+            source: Async or sync iterator of str/bytes chunks, or a binary/text file handle (sync or async `read`)
+            split_by_character: see `ainsert`
+            split_by_character_only: see `ainsert`
+            doc_id: unique document ID, if not provided, the MD5 hash ID of the content is used
+            file_path: file path of the document, used for citation
+
+        Returns:
+            The ID of the document, or None if it was empty
+        """
+        doc_id = await self.apipeline_enqueue_document_stream(
+            source, doc_id, file_path
+        )
+        await self.apipeline_process_enqueue_documents(
+            split_by_character, split_by_character_only
+        )
+        return doc_id
+
     # TODO: deprecated, use insert instead
     def insert_custom_chunks(
         self,
@@ -883,6 +1092,83 @@ class LightRAG:
         await self.doc_status.upsert(new_docs)
         logger.info(f"Stored {len(new_docs)} new unique documents")
 
+    def _document_content_dir(self) -> str:
+        if self.workspace:
+            return os.path.join(self.working_dir, self.workspace, CONTENT_DIR_NAME)
+        return os.path.join(self.working_dir, CONTENT_DIR_NAME)
+
+    async def apipeline_enqueue_document_stream(
+        self,
+        source: Any,
+        doc_id: str | None = None,
+        file_path: str | None = None,
+    ) -> str | None:
+        """
+        Enqueue a single document read from a stream
+
+        Documents up to `document_spool_threshold_mb` are enqueued through
+        `apipeline_enqueue_documents`. Larger ones are cleaned and hashed while
+        they are written to a gzip content file, and their status is stored
+        with an empty content; processing chunks them from the file.
+
+        Args:
+            source: Async or sync iterator of str/bytes chunks, or a binary/text file handle (sync or async `read`)
+            doc_id: unique document ID, if not provided, the MD5 hash ID of the content is used
+            file_path: file path of the document, used for citation
+
+        Returns:
+            The ID of the document, or None if it was empty
+        """
+        content_dir = self._document_content_dir()
+        spooled = await spool_document(
+            source, content_dir, self.document_spool_threshold_mb * 1024 * 1024
+        )
+        if not spooled.content_length:
+            if spooled.temp_file is not None:
+                os.unlink(spooled.temp_file)
+            logger.warning(f"Ignoring empty document {file_path or doc_id}")
+            return None
+
+        if spooled.temp_file is None:
+            await self.apipeline_enqueue_documents(
+                spooled.content,
+                ids=[doc_id] if doc_id else None,
+                file_paths=file_path,
+            )
+            return doc_id or f"doc-{spooled.doc_hash}"
+
+        doc_id = doc_id or f"doc-{spooled.doc_hash}"
+        if not await self.doc_status.filter_keys({doc_id}):
+            os.unlink(spooled.temp_file)
+            logger.info(f"Document {doc_id} is already in the storage")
+            return doc_id
+
+        os.replace(spooled.temp_file, content_file_path(content_dir, doc_id))
+        now = datetime.now(timezone.utc).isoformat()
+        await self.doc_status.upsert(
+            {
+                doc_id: {
+                    "status": DocStatus.PENDING,
+                    "content": "",
+                    "content_summary": spooled.content_summary,
+                    "content_length": spooled.content_length,
+                    "created_at": now,
+                    "updated_at": now,
+                    "file_path": file_path or "unknown_source",
+                }
+            }
+        )
+        logger.info(
+            f"Stored streamed document {doc_id} ({spooled.content_length:,} chars) in {content_dir}"
+        )
+        return doc_id
+
+    def _remove_document_content(self, doc_id: str):
+        try:
+            os.remove(content_file_path(self._document_content_dir(), doc_id))
+        except FileNotFoundError:
+            pass
+
     async def apipeline_process_enqueue_documents(
         self,
         split_by_character: str | None = None,
@@ -1021,6 +1307,16 @@ class LightRAG:
                                 pipeline_status["latest_message"] = log_message
                                 pipeline_status["history_messages"].append(log_message)
 
+                            # Documents spooled by apipeline_enqueue_document_stream
+                            # keep their text in a content file
+                            content_file = None
+                            if not status_doc.content:
+                                content_file = content_file_path(
+                                    self._document_content_dir(), doc_id
+                                )
+                                if not os.path.exists(content_file):
+                                    content_file = None
+
                             # Generate chunks from document
                             chunks: dict[str, Any] = {
                                 compute_mdhash_id(dp["content"], prefix="chunk-"): {
@@ -1029,13 +1325,19 @@ class LightRAG:
                                     "file_path": file_path,  # Add file path to each chunk
                                     "llm_cache_list": [],  # Initialize empty LLM cache list for each chunk
                                 }
-                                for dp in self.chunking_func(
+                                async for dp in achunking(
+                                    self.chunking_func,
                                     self.tokenizer,
                                     status_doc.content,
                                     split_by_character,
                                     split_by_character_only,
                                     self.chunk_overlap_token_size,
                                     self.chunk_token_size,
+                                    executor=get_chunking_executor(
+                                        self.chunking_executor,
+                                        self.chunking_max_workers,
+                                    ),
+                                    content_file=content_file,
                                 )
                             }
 
@@ -1070,7 +1372,20 @@ class LightRAG:
                             )
                             full_docs_task = asyncio.create_task(
                                 self.full_docs.upsert(
-                                    {doc_id: {"content": status_doc.content}}
+                                    {
+                                        doc_id: {
+                                            "content": status_doc.content,
+                                            **(
+                                                {
+                                                    "content_file": os.path.basename(
+                                                        content_file
+                                                    )
+                                                }
+                                                if content_file
+                                                else {}
+                                            ),
+                                        }
+                                    }
                                 )
                             )
                             text_chunks_task = asyncio.create_task(
@@ -1311,7 +1626,6 @@ class LightRAG:
                 self.full_docs,
                 self.doc_status,
                 self.text_chunks,
-                self.llm_response_cache,
                 self.entities_vdb,
                 self.relationships_vdb,
                 self.chunks_vdb,
@@ -1321,6 +1635,13 @@ class LightRAG:
         ]
         await asyncio.gather(*tasks)
 
+        # Cached query answers were built from the previous data. Bump only once
+        # the new data is saved and other workers are flagged to reload it, so
+        # answers they cache under the new generation are not built from stale data
+        await bump_storage_generation(self.llm_response_cache)
+        if self.llm_response_cache is not None:
+            await self.llm_response_cache.index_done_callback()
+
         log_message = "In memory DB persist to disk"
         logger.info(log_message)
 
@@ -1647,6 +1968,11 @@ class LightRAG:
         await self._query_done()
         return response
 
+    async def _graph_edit_done(self) -> None:
+        """Invalidate and persist the query cache after a direct graph edit"""
+        await bump_storage_generation(self.llm_response_cache)
+        await self.llm_response_cache.index_done_callback()
+
     async def _query_done(self):
         await self.llm_response_cache.index_done_callback()
 
@@ -1654,7 +1980,7 @@ class LightRAG:
         """Clear cache data from the LLM response cache storage.
 
         Args:
-            modes (list[str] | None): Modes of cache to clear. Options: ["default", "naive", "local", "global", "hybrid", "mix"].
+            modes (list[str] | None): Modes of cache to clear. Options: ["default", "naive", "local", "global", "hybrid", "mix", "keywords"].
                              "default" represents extraction cache.
                              If None, clears all cache.
 
@@ -1672,7 +1998,7 @@ class LightRAG:
             logger.warning("No cache storage configured")
             return
 
-        valid_modes = ["default", "naive", "local", "global", "hybrid", "mix"]
+        valid_modes = ["default", "naive", "local", "global", "hybrid", "mix", "keywords"]
 
         # Validate input
         if modes and not all(mode in valid_modes for mode in modes):
@@ -1833,6 +2159,7 @@ class LightRAG:
                     # Still need to delete the doc status and full doc
                     await self.full_docs.delete([doc_id])
                     await self.doc_status.delete([doc_id])
+                    self._remove_document_content(doc_id)
                     logger.info(f"Deleted document {doc_id} with no associated chunks")
                 except Exception as e:
                     logger.error(
@@ -2039,6 +2366,7 @@ class LightRAG:
             try:
                 await self.full_docs.delete([doc_id])
                 await self.doc_status.delete([doc_id])
+                self._remove_document_content(doc_id)
             except Exception as e:
                 logger.error(f"Failed to delete document and status: {e}")
                 raise Exception(f"Failed to delete document and status: {e}") from e
@@ -2101,12 +2429,14 @@ class LightRAG:
         """
         from .utils_graph import adelete_by_entity
 
-        return await adelete_by_entity(
+        result = await adelete_by_entity(
             self.chunk_entity_relation_graph,
             self.entities_vdb,
             self.relationships_vdb,
             entity_name,
         )
+        await self._graph_edit_done()
+        return result
 
     def delete_by_entity(self, entity_name: str) -> DeletionResult:
         """Synchronously delete an entity and all its relationships.
@@ -2134,12 +2464,14 @@ class LightRAG:
         """
         from .utils_graph import adelete_by_relation
 
-        return await adelete_by_relation(
+        result = await adelete_by_relation(
             self.chunk_entity_relation_graph,
             self.relationships_vdb,
             source_entity,
             target_entity,
         )
+        await self._graph_edit_done()
+        return result
 
     def delete_by_relation(
         self, source_entity: str, target_entity: str
@@ -2210,7 +2542,7 @@ class LightRAG:
         """
         from .utils_graph import aedit_entity
 
-        return await aedit_entity(
+        result = await aedit_entity(
             self.chunk_entity_relation_graph,
             self.entities_vdb,
             self.relationships_vdb,
@@ -2218,6 +2550,8 @@ class LightRAG:
             updated_data,
             allow_rename,
         )
+        await self._graph_edit_done()
+        return result
 
     def edit_entity(
         self, entity_name: str, updated_data: dict[str, str], allow_rename: bool = True
@@ -2244,7 +2578,7 @@ class LightRAG:
         """
         from .utils_graph import aedit_relation
 
-        return await aedit_relation(
+        result = await aedit_relation(
             self.chunk_entity_relation_graph,
             self.entities_vdb,
             self.relationships_vdb,
@@ -2252,6 +2586,8 @@ class LightRAG:
             target_entity,
             updated_data,
         )
+        await self._graph_edit_done()
+        return result
 
     def edit_relation(
         self, source_entity: str, target_entity: str, updated_data: dict[str, Any]
@@ -2277,13 +2613,15 @@ class LightRAG:
         """
         from .utils_graph import acreate_entity
 
-        return await acreate_entity(
+        result = await acreate_entity(
             self.chunk_entity_relation_graph,
             self.entities_vdb,
             self.relationships_vdb,
             entity_name,
             entity_data,
         )
+        await self._graph_edit_done()
+        return result
 
     def create_entity(
         self, entity_name: str, entity_data: dict[str, Any]
@@ -2308,7 +2646,7 @@ class LightRAG:
         """
         from .utils_graph import acreate_relation
 
-        return await acreate_relation(
+        result = await acreate_relation(
             self.chunk_entity_relation_graph,
             self.entities_vdb,
             self.relationships_vdb,
@@ -2316,6 +2654,8 @@ class LightRAG:
             target_entity,
             relation_data,
         )
+        await self._graph_edit_done()
+        return result
 
     def create_relation(
         self, source_entity: str, target_entity: str, relation_data: dict[str, Any]
@@ -2354,7 +2694,7 @@ class LightRAG:
         """
         from .utils_graph import amerge_entities
 
-        return await amerge_entities(
+        result = await amerge_entities(
             self.chunk_entity_relation_graph,
             self.entities_vdb,
             self.relationships_vdb,
@@ -2363,6 +2703,8 @@ class LightRAG:
             merge_strategy,
             target_entity_data,
         )
+        await self._graph_edit_done()
+        return result
 
     def merge_entities(
         self,
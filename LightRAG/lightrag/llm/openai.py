@@ -2,7 +2,11 @@ from  config import lightrag_embedding_model
 from ..utils import verbose_debug, VERBOSE_DEBUG
 import sys
 import os
+import json
+import base64
+import asyncio
 import logging
+import importlib.util
 
 if sys.version_info < (3, 9):
     from typing import AsyncIterator
@@ -19,7 +23,9 @@ from openai import (
     APIConnectionError,
     RateLimitError,
     APITimeoutError,
+    DefaultAsyncHttpxClient,
 )
+import httpx
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -52,6 +58,22 @@ class InvalidResponseError(Exception):
     pass
 
 
+# Connection pool limits of the shared clients returned by get_openai_async_client
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 100))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 20))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", 30))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "false").lower() in ("true", "1", "yes")
+# Request embeddings as base64 float32 bytes instead of JSON float lists
+OPENAI_EMBEDDING_BASE64 = os.getenv("OPENAI_EMBEDDING_BASE64", "true").lower() in (
+    "true",
+    "1",
+    "yes",
+)
+
+# (event loop id, api_key, base_url, client_configs) -> (loop, client)
+_client_pool: dict[tuple, tuple[asyncio.AbstractEventLoop, AsyncOpenAI]] = {}
+
+
 def create_openai_async_client(
     api_key: str | None = None,
     base_url: str | None = None,
@@ -97,6 +119,81 @@ def create_openai_async_client(
     return AsyncOpenAI(**merged_configs)
 
 
+def _pooled_http_client() -> httpx.AsyncClient:
+    http2 = OPENAI_HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("OPENAI_HTTP2 requires the h2 package, using HTTP/1.1")
+        http2 = False
+    return DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        http2=http2,
+    )
+
+
+def get_openai_async_client(
+    api_key: str | None = None,
+    base_url: str | None = None,
+    client_configs: dict[str, Any] = None,
+) -> AsyncOpenAI:
+    """Return a long-lived AsyncOpenAI client shared by calls with the same configuration.
+
+    Clients are pooled per event loop, API key, base URL and client_configs, so
+    their keep-alive connections are reused across calls instead of paying a new
+    TCP and TLS handshake each time. Callers must not close the returned client;
+    use close_openai_async_clients() on shutdown.
+
+    Args:
+        api_key: OpenAI API key. If None, uses the OPENAI_API_KEY environment variable.
+        base_url: Base URL for the OpenAI API. If None, uses the default OpenAI API URL.
+        client_configs: Additional configuration options for the AsyncOpenAI client.
+            An explicit "http_client" replaces the pooled connection settings.
+
+    Returns:
+        A shared AsyncOpenAI client instance.
+    """
+    loop = asyncio.get_running_loop()
+    client_configs = client_configs or {}
+    key = (
+        id(loop),
+        api_key or os.environ.get("OPENAI_API_KEY"),
+        base_url or os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1"),
+        json.dumps(client_configs, sort_keys=True, default=repr),
+    )
+    entry = _client_pool.get(key)
+    if entry is not None and entry[0] is loop:
+        return entry[1]
+
+    # Clients of closed loops cannot be used or cleanly closed anymore
+    for stale_key, (stale_loop, _) in list(_client_pool.items()):
+        if stale_loop.is_closed():
+            del _client_pool[stale_key]
+
+    if "http_client" not in client_configs:
+        client_configs = {**client_configs, "http_client": _pooled_http_client()}
+    client = create_openai_async_client(
+        api_key=api_key, base_url=base_url, client_configs=client_configs
+    )
+    _client_pool[key] = (loop, client)
+    return client
+
+
+async def close_openai_async_clients():
+    """Close the pooled clients created on the running event loop"""
+    loop = asyncio.get_running_loop()
+    for key, (client_loop, client) in list(_client_pool.items()):
+        if client_loop is not loop:
+            continue
+        del _client_pool[key]
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close OpenAI client: {e}")
+
+
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=1, min=4, max=10),
@@ -153,8 +250,8 @@ async def openai_complete_if_cache(
     # Extract client configuration options
     client_configs = kwargs.pop("openai_client_configs", {})
 
-    # Create the OpenAI client
-    openai_async_client = create_openai_async_client(
+    # Reuse the pooled client and its open connections
+    openai_async_client = get_openai_async_client(
         api_key=api_key, base_url=base_url, client_configs=client_configs
     )
 
@@ -191,21 +288,17 @@ async def openai_complete_if_cache(
             )
     except APIConnectionError as e:
         logger.error(f"OpenAI API Connection Error: {e}")
-        await openai_async_client.close()  # Ensure client is closed
         raise
     except RateLimitError as e:
         logger.error(f"OpenAI API Rate Limit Error: {e}")
-        await openai_async_client.close()  # Ensure client is closed
         raise
     except APITimeoutError as e:
         logger.error(f"OpenAI API Timeout Error: {e}")
-        await openai_async_client.close()  # Ensure client is closed
         raise
     except Exception as e:
         logger.error(
             f"OpenAI API Call Failed,\nModel: {model},\nParams: {kwargs}, Got: {e}"
         )
-        await openai_async_client.close()  # Ensure client is closed
         raise
 
     if hasattr(response, "__aiter__"):
@@ -274,8 +367,6 @@ async def openai_complete_if_cache(
                         logger.warning(
                             f"Failed to close stream response: {close_error}"
                         )
-                # Ensure client is closed in case of exception
-                await openai_async_client.close()
                 raise
             finally:
                 # Ensure resources are released even if no exception occurs
@@ -292,58 +383,41 @@ async def openai_complete_if_cache(
                             f"Failed to close stream response in finally block: {close_error}"
                         )
 
-                # This prevents resource leaks since the caller doesn't handle closing
-                try:
-                    await openai_async_client.close()
-                    logger.debug(
-                        "Successfully closed OpenAI client for streaming response"
-                    )
-                except Exception as client_close_error:
-                    logger.warning(
-                        f"Failed to close OpenAI client in streaming finally block: {client_close_error}"
-                    )
-
         return inner()
 
     else:
-        try:
-            if (
-                not response
-                or not response.choices
-                or not hasattr(response.choices[0], "message")
-                or not hasattr(response.choices[0].message, "content")
-            ):
-                logger.error("Invalid response from OpenAI API")
-                await openai_async_client.close()  # Ensure client is closed
-                raise InvalidResponseError("Invalid response from OpenAI API")
-
-            content = response.choices[0].message.content
-
-            if not content or content.strip() == "":
-                logger.error("Received empty content from OpenAI API")
-                await openai_async_client.close()  # Ensure client is closed
-                raise InvalidResponseError("Received empty content from OpenAI API")
-
-            if r"\u" in content:
-                content = safe_unicode_decode(content.encode("utf-8"))
-
-            if token_tracker and hasattr(response, "usage"):
-                token_counts = {
-                    "prompt_tokens": getattr(response.usage, "prompt_tokens", 0),
-                    "completion_tokens": getattr(
-                        response.usage, "completion_tokens", 0
-                    ),
-                    "total_tokens": getattr(response.usage, "total_tokens", 0),
-                }
-                token_tracker.add_usage(token_counts)
-
-            logger.debug(f"Response content len: {len(content)}")
-            verbose_debug(f"Response: {response}")
-
-            return content
-        finally:
-            # Ensure client is closed in all cases for non-streaming responses
-            await openai_async_client.close()
+        if (
+            not response
+            or not response.choices
+            or not hasattr(response.choices[0], "message")
+            or not hasattr(response.choices[0].message, "content")
+        ):
+            logger.error("Invalid response from OpenAI API")
+            raise InvalidResponseError("Invalid response from OpenAI API")
+
+        content = response.choices[0].message.content
+
+        if not content or content.strip() == "":
+            logger.error("Received empty content from OpenAI API")
+            raise InvalidResponseError("Received empty content from OpenAI API")
+
+        if r"\u" in content:
+            content = safe_unicode_decode(content.encode("utf-8"))
+
+        if token_tracker and hasattr(response, "usage"):
+            token_counts = {
+                "prompt_tokens": getattr(response.usage, "prompt_tokens", 0),
+                "completion_tokens": getattr(
+                    response.usage, "completion_tokens", 0
+                ),
+                "total_tokens": getattr(response.usage, "total_tokens", 0),
+            }
+            token_tracker.add_usage(token_counts)
+
+        logger.debug(f"Response content len: {len(content)}")
+        verbose_debug(f"Response: {response}")
+
+        return content
 
 
 async def openai_complete(
@@ -462,20 +536,41 @@ async def openai_embed(
             explicit parameters (api_key, base_url).
 
     Returns:
-        A numpy array of embeddings, one per input text.
+        A float32 numpy array of embeddings, one row per input text.
 
     Raises:
         APIConnectionError: If there is a connection error with the OpenAI API.
         RateLimitError: If the OpenAI API rate limit is exceeded.
         APITimeoutError: If the OpenAI API request times out.
     """
-    # Create the OpenAI client
-    openai_async_client = create_openai_async_client(
+    # Reuse the pooled client and its open connections
+    openai_async_client = get_openai_async_client(
         api_key=api_key, base_url=base_url, client_configs=client_configs
     )
 
-    async with openai_async_client:
-        response = await openai_async_client.embeddings.create(
-            model=model, input=texts, encoding_format="float"
-        )
-        return np.array([dp.embedding for dp in response.data])
+    response = await openai_async_client.embeddings.create(
+        model=model,
+        input=texts,
+        encoding_format="base64" if OPENAI_EMBEDDING_BASE64 else "float",
+    )
+    return _embeddings_to_matrix(response.data)
+
+
+def _embeddings_to_matrix(data: list[Any]) -> np.ndarray:
+    """Copy embedding items into one preallocated float32 matrix.
+
+    base64 items hold little-endian float32 bytes and are read with
+    np.frombuffer, skipping JSON float parsing. Servers that ignore
+    encoding_format return float lists, which are accepted as well.
+    """
+    matrix = None
+    for i, dp in enumerate(data):
+        embedding = dp.embedding
+        if isinstance(embedding, str):
+            embedding = np.frombuffer(base64.b64decode(embedding), dtype="<f4")
+        if matrix is None:
+            matrix = np.empty((len(data), len(embedding)), dtype=np.float32)
+        matrix[i] = embedding
+    if matrix is None:
+        return np.empty((0, 0), dtype=np.float32)
+    return matrix
@@ -1,14 +1,21 @@
 from __future__ import annotations
+import copy
 from functools import partial
+from dataclasses import replace
 
 from datetime import datetime
 import json
 import asyncio
 import json
+import logging
+import multiprocessing
 import re
 import os
-from typing import Any, AsyncIterator
+import sys
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator
 from collections import Counter, defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
 
 from .utils import (
     logger,
@@ -20,10 +27,14 @@ from .utils import (
     pack_user_ass_to_openai_messages,
     split_string_by_multi_markers,
     truncate_list_by_token_size,
+    token_upper_bound,
     process_combine_contexts,
     compute_args_hash,
     handle_cache,
     save_to_cache,
+    compute_query_cache_hash,
+    get_context_cache,
+    get_storage_generation,
     CacheData,
     get_conversation_turns,
     use_llm_func_with_cache,
@@ -38,6 +49,7 @@ from .base import (
     QueryParam,
 )
 from .prompt import PROMPTS
+from .doc_content import iter_document_text, read_document_text
 from .constants import (
     GRAPH_FIELD_SEP,
     DEFAULT_MAX_ENTITY_TOKENS,
@@ -86,6 +98,172 @@ def create_query_log(content):
 
 
 
+def _iter_segment_chunks(
+    tokenizer: Tokenizer,
+    segments: Iterable[str],
+    split_by_character_only: bool,
+    overlap_token_size: int,
+    max_token_size: int,
+) -> Iterator[dict[str, Any]]:
+    index = 0
+    for chunk in segments:
+        _tokens = tokenizer.encode(chunk)
+        if split_by_character_only or len(_tokens) <= max_token_size:
+            pieces = [(len(_tokens), chunk)]
+        else:
+            pieces = (
+                (
+                    min(max_token_size, len(_tokens) - start),
+                    tokenizer.decode(_tokens[start : start + max_token_size]),
+                )
+                for start in range(0, len(_tokens), max_token_size - overlap_token_size)
+            )
+        for _len, piece in pieces:
+            yield {
+                "tokens": _len,
+                "content": piece.strip(),
+                "chunk_order_index": index,
+            }
+            index += 1
+
+
+def _iter_token_windows(
+    tokenizer: Tokenizer,
+    token_blocks: Iterable[list[int]],
+    overlap_token_size: int,
+    max_token_size: int,
+) -> Iterator[dict[str, Any]]:
+    """Windows of `max_token_size` tokens every `max_token_size - overlap_token_size` tokens"""
+    step = max_token_size - overlap_token_size
+    if step <= 0:
+        raise ValueError("Chunk overlap must be smaller than the chunk size")
+    tokens: list[int] = []
+    start = 0
+    index = 0
+
+    def window() -> dict[str, Any]:
+        return {
+            "tokens": min(max_token_size, len(tokens) - start),
+            "content": tokenizer.decode(tokens[start : start + max_token_size]).strip(),
+            "chunk_order_index": index,
+        }
+
+    for block in token_blocks:
+        # Drop the tokens behind the current window once per block
+        del tokens[:start]
+        start = 0
+        tokens.extend(block)
+        # A full window does not depend on the tokens that follow it
+        while len(tokens) - start >= max_token_size:
+            yield window()
+            index += 1
+            start += step
+    while start < len(tokens):
+        yield window()
+        index += 1
+        start += step
+
+
+def iter_chunks_by_token_size(
+    tokenizer: Tokenizer,
+    content: str,
+    split_by_character: str | None = None,
+    split_by_character_only: bool = False,
+    overlap_token_size: int = 128,
+    max_token_size: int = 1024,
+) -> Iterator[dict[str, Any]]:
+    """Yield the chunks of `chunking_by_token_size` one by one, decoding each window only when it is reached"""
+    if split_by_character:
+        return _iter_segment_chunks(
+            tokenizer,
+            content.split(split_by_character),
+            split_by_character_only,
+            overlap_token_size,
+            max_token_size,
+        )
+    return _iter_token_windows(
+        tokenizer, [tokenizer.encode(content)], overlap_token_size, max_token_size
+    )
+
+
+# Text held back while waiting for a word boundary before it is encoded anyway
+FORCED_CUT_CHARS = 1 << 22
+
+
+def _word_boundary(text: str) -> int:
+    """Position of the last space between two non-space characters, -1 if none
+
+    Tokenizers that split words before a single space, as tiktoken does,
+    encode both sides of it independently.
+    """
+    pos = text.rfind(" ")
+    while pos > 0:
+        if (
+            pos + 1 < len(text)
+            and not text[pos - 1].isspace()
+            and not text[pos + 1].isspace()
+        ):
+            return pos
+        pos = text.rfind(" ", 0, pos)
+    return -1
+
+
+def iter_chunks_from_blocks(
+    tokenizer: Tokenizer,
+    blocks: Iterable[str],
+    split_by_character: str | None = None,
+    split_by_character_only: bool = False,
+    overlap_token_size: int = 128,
+    max_token_size: int = 1024,
+) -> Iterator[dict[str, Any]]:
+    """Chunk text arriving in blocks, like `chunking_by_token_size` on the joined text
+
+    With `split_by_character` the output is identical. Otherwise each block
+    is encoded up to its last word boundary, which matches encoding the whole
+    text for tokenizers that split words before a single space; text without
+    such a boundary is cut once FORCED_CUT_CHARS characters are pending.
+    """
+    if split_by_character:
+
+        def segments() -> Iterator[str]:
+            buffer = ""
+            for block in blocks:
+                buffer += block
+                # Only the new text can complete a segment
+                tail = buffer[-(len(block) + len(split_by_character) - 1) :]
+                if split_by_character not in tail:
+                    continue
+                *complete, buffer = buffer.split(split_by_character)
+                yield from complete
+            yield buffer
+
+        yield from _iter_segment_chunks(
+            tokenizer,
+            segments(),
+            split_by_character_only,
+            overlap_token_size,
+            max_token_size,
+        )
+        return
+
+    def token_blocks() -> Iterator[list[int]]:
+        pending = ""
+        for block in blocks:
+            pending += block
+            cut = _word_boundary(pending)
+            if cut < 0:
+                if len(pending) < FORCED_CUT_CHARS:
+                    continue
+                cut = len(pending)
+            yield tokenizer.encode(pending[:cut])
+            pending = pending[cut:]
+        yield tokenizer.encode(pending)
+
+    yield from _iter_token_windows(
+        tokenizer, token_blocks(), overlap_token_size, max_token_size
+    )
+
+
 def chunking_by_token_size(
     tokenizer: Tokenizer,
     content: str,
@@ -94,51 +272,136 @@ def chunking_by_token_size(
     overlap_token_size: int = 128,
     max_token_size: int = 1024,
 ) -> list[dict[str, Any]]:
-    tokens = tokenizer.encode(content)
-    results: list[dict[str, Any]] = []
-    if split_by_character:
-        raw_chunks = content.split(split_by_character)
-        new_chunks = []
-        if split_by_character_only:
-            for chunk in raw_chunks:
-                _tokens = tokenizer.encode(chunk)
-                new_chunks.append((len(_tokens), chunk))
+    return list(
+        iter_chunks_by_token_size(
+            tokenizer,
+            content,
+            split_by_character,
+            split_by_character_only,
+            overlap_token_size,
+            max_token_size,
+        )
+    )
+
+
+# Chunks handed back to the event loop per step when streaming from a thread
+CHUNK_STREAM_BATCH = 32
+
+_chunking_executors: dict[str, Executor] = {}
+
+
+def get_chunking_executor(kind: str, max_workers: int = 0) -> Executor | None:
+    """Shared executor that chunks documents off the event loop
+
+    `thread` suits tokenizers that release the GIL, such as tiktoken; `process`
+    suits pure-Python tokenizers and requires a picklable chunking function and
+    tokenizer; `none` chunks on the event loop as before.
+    """
+    if kind == "none":
+        return None
+    executor = _chunking_executors.get(kind)
+    if executor is None:
+        if kind == "thread":
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers or None, thread_name_prefix="lightrag-chunking"
+            )
+        elif kind == "process":
+            # Workers must not inherit the threads and locks of the server process
+            ctx = multiprocessing.get_context(
+                "spawn" if sys.platform == "win32" else "forkserver"
+            )
+            executor = ProcessPoolExecutor(
+                max_workers=max_workers or None, mp_context=ctx
+            )
         else:
-            for chunk in raw_chunks:
-                _tokens = tokenizer.encode(chunk)
-                if len(_tokens) > max_token_size:
-                    for start in range(
-                        0, len(_tokens), max_token_size - overlap_token_size
-                    ):
-                        chunk_content = tokenizer.decode(
-                            _tokens[start : start + max_token_size]
-                        )
-                        new_chunks.append(
-                            (min(max_token_size, len(_tokens) - start), chunk_content)
-                        )
-                else:
-                    new_chunks.append((len(_tokens), chunk))
-        for index, (_len, chunk) in enumerate(new_chunks):
-            results.append(
-                {
-                    "tokens": _len,
-                    "content": chunk.strip(),
-                    "chunk_order_index": index,
-                }
+            raise ValueError(
+                f"Unknown chunking executor '{kind}', expected thread, process or none"
             )
-    else:
-        for index, start in enumerate(
-            range(0, len(tokens), max_token_size - overlap_token_size)
+        _chunking_executors[kind] = executor
+    return executor
+
+
+def shutdown_chunking_executors() -> None:
+    """Shut down the shared chunking executors; they are recreated on next use"""
+    while _chunking_executors:
+        _, executor = _chunking_executors.popitem()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _iter_chunks(
+    chunking_func: Callable, args: tuple, content_file: str | None = None
+) -> Iterator[dict[str, Any]]:
+    """Chunks of `args`, or of the spooled `content_file` in place of the content"""
+    if content_file is None:
+        if chunking_func is chunking_by_token_size:
+            return iter_chunks_by_token_size(*args)
+        return iter(chunking_func(*args))
+    tokenizer, _, *options = args
+    if chunking_func is chunking_by_token_size:
+        return iter_chunks_from_blocks(
+            tokenizer, iter_document_text(content_file), *options
+        )
+    # Custom chunking functions take the whole text
+    return iter(chunking_func(tokenizer, read_document_text(content_file), *options))
+
+
+def _chunk_to_list(
+    chunking_func: Callable, args: tuple, content_file: str | None = None
+) -> list[dict[str, Any]]:
+    return list(_iter_chunks(chunking_func, args, content_file))
+
+
+async def achunking(
+    chunking_func: Callable,
+    tokenizer: Tokenizer,
+    content: str,
+    split_by_character: str | None,
+    split_by_character_only: bool,
+    overlap_token_size: int,
+    max_token_size: int,
+    executor: Executor | None = None,
+    content_file: str | None = None,
+) -> AsyncIterator[dict[str, Any]]:
+    """Run `chunking_func` on `executor` and yield its chunks in order
+
+    On a thread executor the default chunker streams, so chunks arrive while
+    later windows are still being decoded. A process executor returns the
+    chunks of a document at once. With `content_file` the text is read from
+    a spooled document (see `doc_content`) instead of `content`, block by
+    block for the default chunker.
+    """
+    args = (
+        tokenizer,
+        content,
+        split_by_character,
+        split_by_character_only,
+        overlap_token_size,
+        max_token_size,
+    )
+    if executor is None:
+        for chunk in _iter_chunks(chunking_func, args, content_file):
+            yield chunk
+        return
+
+    loop = asyncio.get_running_loop()
+    if isinstance(executor, ProcessPoolExecutor):
+        for chunk in await loop.run_in_executor(
+            executor, _chunk_to_list, chunking_func, args, content_file
         ):
-            chunk_content = tokenizer.decode(tokens[start : start + max_token_size])
-            results.append(
-                {
-                    "tokens": min(max_token_size, len(tokens) - start),
-                    "content": chunk_content.strip(),
-                    "chunk_order_index": index,
-                }
-            )
-    return results
+            yield chunk
+        return
+
+    chunk_iter = await loop.run_in_executor(
+        executor, _iter_chunks, chunking_func, args, content_file
+    )
+    while True:
+        batch = await loop.run_in_executor(
+            executor, lambda: list(islice(chunk_iter, CHUNK_STREAM_BATCH))
+        )
+        if not batch:
+            return
+        for chunk in batch:
+            yield chunk
 
 
 async def _handle_entity_relation_summary(
@@ -1635,7 +1898,7 @@ async def kg_query(
         use_model_func = partial(use_model_func, _priority=5)
 
     # Handle cache
-    args_hash = compute_args_hash(query_param.mode, query)
+    args_hash = await compute_query_cache_hash(query, query_param, hashing_kv)
     cached_response, quantized, min_val, max_val = await handle_cache(
         hashing_kv, args_hash, query, query_param.mode, cache_type="query"
     )
@@ -1680,6 +1943,7 @@ async def kg_query(
         text_chunks_db,
         query_param,
         chunks_vdb,
+        hashing_kv,
     )
 
     if query_param.only_need_context:
@@ -1713,10 +1977,12 @@ async def kg_query(
         return sys_prompt, log_file_path
 
     tokenizer: Tokenizer = global_config["tokenizer"]
-    len_of_prompts = len(tokenizer.encode(query + sys_prompt))
-    logger.debug(
-        f"[kg_query] Sending to LLM: {len_of_prompts:,} tokens (Query: {len(tokenizer.encode(query))}, System: {len(tokenizer.encode(sys_prompt))})"
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        query_tokens = tokenizer.count_tokens(query)
+        sys_prompt_tokens = len(tokenizer.encode(sys_prompt))
+        logger.debug(
+            f"[kg_query] Sending to LLM: {query_tokens + sys_prompt_tokens:,} tokens (Query: {query_tokens}, System: {sys_prompt_tokens})"
+        )
 
     response = await use_model_func(
         query,
@@ -1785,6 +2051,31 @@ async def get_keywords_from_query(
     return hl_keywords, ll_keywords
 
 
+# Keyword extractions currently running, so concurrent queries share one LLM call
+_keyword_extractions_in_flight: dict[tuple[int, str], asyncio.Future] = {}
+
+
+def _keywords_cache_hash(text: str, param: QueryParam, global_config: dict) -> str:
+    """Hash of everything that shapes the keyword-extraction prompt, but not the mode"""
+    history_context = (
+        get_conversation_turns(param.conversation_history, param.history_turns)
+        if param.conversation_history
+        else ""
+    )
+    model_name = (
+        getattr(param.model_func, "__qualname__", type(param.model_func).__name__)
+        if param.model_func
+        else ""
+    )
+    return compute_args_hash(
+        " ".join(text.split()).casefold(),
+        history_context,
+        global_config["addon_params"].get("language", PROMPTS["DEFAULT_LANGUAGE"]),
+        global_config["addon_params"].get("example_number", ""),
+        model_name,
+    )
+
+
 async def extract_keywords_only(
     text: str,
     param: QueryParam,
@@ -1795,12 +2086,16 @@ async def extract_keywords_only(
     Extract high-level and low-level keywords from the given 'text' using the LLM.
     This method does NOT build the final RAG context or provide a final answer.
     It ONLY extracts keywords (hl_keywords, ll_keywords).
+
+    Keywords do not depend on the query mode, so they are cached under the
+    shared "keywords" mode, keyed by the normalized query text: trying the same
+    question in several modes costs a single LLM call.
     """
 
     # 1. Handle cache if needed - add cache type for keywords
-    args_hash = compute_args_hash(param.mode, text)
-    cached_response, quantized, min_val, max_val = await handle_cache(
-        hashing_kv, args_hash, text, param.mode, cache_type="keywords"
+    args_hash = _keywords_cache_hash(text, param, global_config)
+    cached_response, _, _, _ = await handle_cache(
+        hashing_kv, args_hash, text, "keywords", cache_type="keywords"
     )
     if cached_response is not None:
         try:
@@ -1813,6 +2108,29 @@ async def extract_keywords_only(
                 "Invalid cache format for keywords, proceeding with extraction"
             )
 
+    in_flight_key = (id(hashing_kv), args_hash)
+    extraction = _keyword_extractions_in_flight.get(in_flight_key)
+    if extraction is None:
+        extraction = asyncio.ensure_future(
+            _extract_keywords_with_llm(
+                text, param, global_config, hashing_kv, args_hash
+            )
+        )
+        _keyword_extractions_in_flight[in_flight_key] = extraction
+        extraction.add_done_callback(
+            lambda _: _keyword_extractions_in_flight.pop(in_flight_key, None)
+        )
+    # Shielded: a cancelled query must not cancel the extraction others wait on
+    return await asyncio.shield(extraction)
+
+
+async def _extract_keywords_with_llm(
+    text: str,
+    param: QueryParam,
+    global_config: dict[str, str],
+    hashing_kv: BaseKVStorage | None,
+    args_hash: str,
+) -> tuple[list[str], list[str]]:
     # 2. Build the examples
     example_number = global_config["addon_params"].get("example_number", None)
     if example_number and example_number < len(PROMPTS["keywords_extraction_examples"]):
@@ -1838,10 +2156,11 @@ async def extract_keywords_only(
     )
 
     tokenizer: Tokenizer = global_config["tokenizer"]
-    len_of_prompts = len(tokenizer.encode(kw_prompt))
-    logger.debug(
-        f"[extract_keywords] Sending to LLM: {len_of_prompts:,} tokens (Prompt: {len_of_prompts})"
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        len_of_prompts = len(tokenizer.encode(kw_prompt))
+        logger.debug(
+            f"[extract_keywords] Sending to LLM: {len_of_prompts:,} tokens (Prompt: {len_of_prompts})"
+        )
 
     # 5. Call the LLM for keyword extraction
     if param.model_func:
@@ -1874,17 +2193,14 @@ async def extract_keywords_only(
             "high_level_keywords": hl_keywords,
             "low_level_keywords": ll_keywords,
         }
-        if hashing_kv.global_config.get("enable_llm_cache"):
+        if hashing_kv is not None and hashing_kv.global_config.get("enable_llm_cache"):
             await save_to_cache(
                 hashing_kv,
                 CacheData(
                     args_hash=args_hash,
                     content=json.dumps(cache_data),
                     prompt=text,
-                    quantized=quantized,
-                    min_val=min_val,
-                    max_val=max_val,
-                    mode=param.mode,
+                    mode="keywords",
                     cache_type="keywords",
                 ),
             )
@@ -1896,6 +2212,7 @@ async def _get_vector_context(
     query: str,
     chunks_vdb: BaseVectorStorage,
     query_param: QueryParam,
+    query_embedding=None,
 ) -> list[dict]:
     """
     Retrieve text chunks from the vector database without reranking or truncation.
@@ -1907,6 +2224,7 @@ async def _get_vector_context(
         query: The query string to search for
         chunks_vdb: Vector database containing document chunks
         query_param: Query parameters including chunk_top_k and ids
+        query_embedding: Optional precomputed embedding of the query
 
     Returns:
         List of text chunks with metadata
@@ -1915,7 +2233,12 @@ async def _get_vector_context(
         # Use chunk_top_k if specified, otherwise fall back to top_k
         search_top_k = query_param.chunk_top_k or query_param.top_k
 
-        results = await chunks_vdb.query(query, top_k=search_top_k, ids=query_param.ids)
+        results = await chunks_vdb.query(
+            query,
+            top_k=search_top_k,
+            ids=query_param.ids,
+            query_embedding=query_embedding,
+        )
         if not results:
             return []
 
@@ -1940,8 +2263,111 @@ async def _get_vector_context(
         return []
 
 
-async def _build_query_context(
+def _plan_query_embeddings(
     query: str,
+    ll_keywords: str,
+    hl_keywords: str,
+    query_param: QueryParam,
+    entities_vdb: BaseVectorStorage,
+    relationships_vdb: BaseVectorStorage,
+    chunks_vdb: BaseVectorStorage | None = None,
+) -> list[tuple[str, str]]:
+    """Collect the (target, text) pairs a query will search vector storages with.
+
+    Only storages sharing the entity storage's embedding function are planned, so
+    one batched call can serve all of them. Anything not planned here falls back
+    to the storage embedding the text itself.
+    """
+    embedding_func = entities_vdb.embedding_func
+    plan: list[tuple[str, str]] = []
+    if query_param.mode != "global" and ll_keywords:
+        plan.append(("entities", ll_keywords))
+    if (
+        query_param.mode != "local"
+        and hl_keywords
+        and relationships_vdb.embedding_func is embedding_func
+    ):
+        plan.append(("relationships", hl_keywords))
+    if (
+        query_param.mode == "mix"
+        and chunks_vdb is not None
+        and chunks_vdb.embedding_func is embedding_func
+    ):
+        plan.append(("chunks", query))
+    return plan
+
+
+async def _precompute_query_embeddings(
+    plan: list[tuple[str, str]], embedding_func
+) -> dict[tuple[str, str], Any]:
+    """Embed all planned query strings in one call, keyed by (target, text)."""
+    if len(plan) < 2:
+        # Nothing to batch, let the storage embed the single string itself
+        return {}
+
+    texts = list(dict.fromkeys(text for _, text in plan))
+    try:
+        embeddings = await embedding_func(texts, _priority=5)
+    except Exception as e:
+        logger.warning(f"Batched query embedding failed, falling back: {e}")
+        return {}
+    if len(embeddings) != len(texts):
+        logger.warning(
+            f"Query embedding is not 1-1 with texts, {len(embeddings)} != {len(texts)}"
+        )
+        return {}
+
+    by_text = dict(zip(texts, embeddings))
+    return {(target, text): by_text[text] for target, text in plan}
+
+
+async def _run_timed_branch(name: str, coro, timings: dict[str, float]):
+    """Await a retrieval branch and record its elapsed time in `timings`."""
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = time.perf_counter() - start
+
+
+# QueryParam fields that shape the entities, relations and chunks of a context
+_KG_CONTEXT_CACHE_FIELDS = (
+    "ids",
+    "entity_top_k",
+    "relation_top_k",
+    "entity_rerank_top_k",
+    "relation_rerank_top_k",
+    "max_entity_tokens",
+    "max_relation_tokens",
+    "enable_rerank",
+)
+
+
+async def _kg_context_cache_key(
+    ll_keywords: str,
+    hl_keywords: str,
+    query_param: QueryParam,
+    hashing_kv: BaseKVStorage,
+) -> str:
+    """Cache key of a _retrieve_kg_context result
+
+    hybrid, mix and their variants retrieve the same graph context and share
+    entries. The storage generation makes entries stale once data changes.
+    """
+    retrieval = query_param.mode if query_param.mode in ("local", "global") else "hybrid"
+    params = {name: getattr(query_param, name, None) for name in _KG_CONTEXT_CACHE_FIELDS}
+    if params["ids"]:
+        params["ids"] = sorted(params["ids"])
+    return compute_args_hash(
+        retrieval,
+        ll_keywords,
+        hl_keywords,
+        json.dumps(params, sort_keys=True, ensure_ascii=False, default=str),
+        await get_storage_generation(hashing_kv),
+    )
+
+
+async def _retrieve_kg_context(
     ll_keywords: str,
     hl_keywords: str,
     knowledge_graph_inst: BaseGraphStorage,
@@ -1949,12 +2375,22 @@ async def _build_query_context(
     relationships_vdb: BaseVectorStorage,
     text_chunks_db: BaseKVStorage,
     query_param: QueryParam,
+    query_embeddings: dict[tuple[str, str], Any],
     chunks_vdb: BaseVectorStorage = None,
-):
-    logger.info(f"Process {os.getpid()} building query context...")
+) -> tuple[list[dict], list[dict], list[dict]]:
+    """Entities, relations and related text chunks found through the graph.
+
+    Everything here depends only on the keywords, the retrieval parameters and
+    the indexed data, never on the query text itself, which is what makes the
+    result cacheable across near-identical questions.
+    """
+    # Entities and relations are linked to documents through their chunks, so
+    # extend a document filter with the chunk ids of those documents
+    kg_query_param = query_param
+    if query_param.ids and chunks_vdb is not None:
+        chunk_ids = await chunks_vdb.get_ids_by_filter(query_param.ids)
+        kg_query_param = replace(query_param, ids=list(query_param.ids) + chunk_ids)
 
-    # Collect all chunks from different sources
-    all_chunks = []
     entities_context = []
     relations_context = []
 
@@ -1973,7 +2409,8 @@ async def _build_query_context(
             ll_keywords,
             knowledge_graph_inst,
             entities_vdb,relationships_vdb,
-            query_param,
+            kg_query_param,
+            query_embedding=query_embeddings.get(("entities", ll_keywords)),
         )
         original_node_datas = node_datas
         original_edge_datas = use_relations
@@ -1988,25 +2425,52 @@ async def _build_query_context(
             hl_keywords,
             knowledge_graph_inst,
             relationships_vdb,entities_vdb,
-            query_param,
+            kg_query_param,
+            query_embedding=query_embeddings.get(("relationships", hl_keywords)),
         )
         original_edge_datas = edge_datas
         original_node_datas = use_entities
 
     else:  # hybrid or mix mode
-        ll_data = await _get_node_data(
-            ll_keywords,
-            knowledge_graph_inst,
-            entities_vdb,relationships_vdb,
-            query_param,
-        )
-        hl_data = await _get_edge_data(
-            hl_keywords,
-            knowledge_graph_inst,
-            relationships_vdb,entities_vdb,
-            query_param,
+        # Local and global retrieval are independent, so run them concurrently:
+        # latency is bounded by the slowest branch.
+        branch_timings: dict[str, float] = {}
+        branch_tasks = [
+            _run_timed_branch(
+                "local",
+                _get_node_data(
+                    ll_keywords,
+                    knowledge_graph_inst,
+                    entities_vdb,relationships_vdb,
+                    kg_query_param,
+                    query_embedding=query_embeddings.get(("entities", ll_keywords)),
+                ),
+                branch_timings,
+            ),
+            _run_timed_branch(
+                "global",
+                _get_edge_data(
+                    hl_keywords,
+                    knowledge_graph_inst,
+                    relationships_vdb,entities_vdb,
+                    kg_query_param,
+                    query_embedding=query_embeddings.get(
+                        ("relationships", hl_keywords)
+                    ),
+                ),
+                branch_timings,
+            ),
+        ]
+
+        branch_start = time.perf_counter()
+        branch_results = await asyncio.gather(*branch_tasks)
+        logger.info(
+            "Retrieval branches: "
+            + ", ".join(f"{k} {v:.3f}s" for k, v in branch_timings.items())
+            + f" (wall {time.perf_counter() - branch_start:.3f}s)"
         )
 
+        ll_data, hl_data = branch_results[0], branch_results[1]
         (ll_entities_context, ll_relations_context, ll_node_datas, ll_edge_datas) = (
             ll_data
         )
@@ -2014,15 +2478,6 @@ async def _build_query_context(
             hl_data
         )
 
-        # Get vector chunks first if in mix mode
-        if query_param.mode == "mix" and chunks_vdb:
-            vector_chunks = await _get_vector_context(
-                query,
-                chunks_vdb,
-                query_param,
-            )
-            all_chunks.extend(vector_chunks)
-
         # Store original data from both sources
         original_node_datas = ll_node_datas + hl_node_datas
         original_edge_datas = ll_edge_datas + hl_edge_datas
@@ -2036,11 +2491,10 @@ async def _build_query_context(
         )
 
     logger.info(
-        f"Initial context: {len(entities_context)} entities, {len(relations_context)} relations, {len(all_chunks)} chunks"
+        f"Initial context: {len(entities_context)} entities, {len(relations_context)} relations"
     )
-    if len(entities_context) + len(relations_context) + len(all_chunks) == 0:
-        logger.warning("No entities, relations, or chunks found for the query.")
-        return 'No entities, relations, or doc chunks.', '[empty]'
+    if not entities_context and not relations_context:
+        return [], [], []
 
     # Unified token control system - Apply precise token limits to entities and relations
     tokenizer = text_chunks_db.global_config.get("tokenizer")
@@ -2060,13 +2514,6 @@ async def _build_query_context(
                 "max_relation_tokens", DEFAULT_MAX_RELATION_TOKENS
             ),
         )
-        max_total_tokens = getattr(
-            query_param,
-            "max_total_tokens",
-            text_chunks_db.global_config.get(
-                "max_total_tokens", DEFAULT_MAX_TOTAL_TOKENS
-            ),
-        )
 
         # Truncate entities based on complete JSON serialization
         if entities_context:
@@ -2140,22 +2587,6 @@ async def _build_query_context(
                 final_edge_datas.append(edge)
                 seen_edges.add(pair)
 
-    if query_param.enable_rerank:
-        entities_context = await rerank_nodes(
-            query=query,
-            nodes=entities_context,
-            query_param=query_param,
-            global_config=entities_vdb.global_config, 
-        )
-        relations_context = await rerank_edges(
-            query=query,
-            edges=relations_context,
-            query_param=query_param,
-            global_config=relationships_vdb.global_config,
-        )
-
-
-
     # Get text chunks based on final filtered data
     text_chunk_tasks = []
 
@@ -2179,17 +2610,135 @@ async def _build_query_context(
         )
 
     # Execute text chunk retrieval in parallel
+    all_chunks = []
     if text_chunk_tasks:
         text_chunk_results = await asyncio.gather(*text_chunk_tasks)
         for chunks in text_chunk_results:
             if chunks:
                 all_chunks.extend(chunks)
 
+    return entities_context, relations_context, all_chunks
+
+
+async def _build_query_context(
+    query: str,
+    ll_keywords: str,
+    hl_keywords: str,
+    knowledge_graph_inst: BaseGraphStorage,
+    entities_vdb: BaseVectorStorage,
+    relationships_vdb: BaseVectorStorage,
+    text_chunks_db: BaseKVStorage,
+    query_param: QueryParam,
+    chunks_vdb: BaseVectorStorage = None,
+    hashing_kv: BaseKVStorage | None = None,
+):
+    logger.info(f"Process {os.getpid()} building query context...")
+
+    # Entities, relations and their chunks depend only on the keywords and the
+    # retrieval parameters, so repeated questions reuse them until the indexed
+    # data changes
+    context_cache = get_context_cache(hashing_kv)
+    context_key = None
+    cached_kg_context = None
+    if context_cache is not None:
+        context_key = await _kg_context_cache_key(
+            ll_keywords, hl_keywords, query_param, hashing_kv
+        )
+        cached_kg_context = context_cache.get(context_key)
+        if cached_kg_context is not None:
+            logger.info("Retrieval context cache hit")
+
+    # Embed every string this query will search with in a single batched call
+    embedding_plan = _plan_query_embeddings(
+        query,
+        ll_keywords,
+        hl_keywords,
+        query_param,
+        entities_vdb,
+        relationships_vdb,
+        chunks_vdb,
+    )
+    if cached_kg_context is not None:
+        embedding_plan = [item for item in embedding_plan if item[0] == "chunks"]
+    query_embeddings = await _precompute_query_embeddings(
+        embedding_plan, entities_vdb.embedding_func
+    )
+
+    async def get_kg_context():
+        if cached_kg_context is not None:
+            return copy.deepcopy(cached_kg_context)
+        kg_context = await _retrieve_kg_context(
+            ll_keywords,
+            hl_keywords,
+            knowledge_graph_inst,
+            entities_vdb,
+            relationships_vdb,
+            text_chunks_db,
+            query_param,
+            query_embeddings,
+            chunks_vdb,
+        )
+        if context_cache is not None:
+            context_cache.put(context_key, copy.deepcopy(kg_context))
+        return kg_context
+
+    # The vector branch of mix mode depends on the full query, not the
+    # keywords, so it is never cached and runs alongside the graph retrieval
+    branch_timings: dict[str, float] = {}
+    branch_tasks = [_run_timed_branch("kg", get_kg_context(), branch_timings)]
+    if query_param.mode == "mix" and chunks_vdb:
+        branch_tasks.append(
+            _run_timed_branch(
+                "vector",
+                _get_vector_context(
+                    query,
+                    chunks_vdb,
+                    query_param,
+                    query_embedding=query_embeddings.get(("chunks", query)),
+                ),
+                branch_timings,
+            )
+        )
+    branch_results = await asyncio.gather(*branch_tasks)
+    logger.info(
+        "Context branches: "
+        + ", ".join(f"{k} {v:.3f}s" for k, v in branch_timings.items())
+    )
+    entities_context, relations_context, kg_chunks = branch_results[0]
+
+    # Vector chunks come first in mix mode
+    all_chunks = list(branch_results[1]) if len(branch_results) > 1 else []
+    all_chunks.extend(kg_chunks)
+
+    if len(entities_context) + len(relations_context) + len(all_chunks) == 0:
+        logger.warning("No entities, relations, or chunks found for the query.")
+        return 'No entities, relations, or doc chunks.', '[empty]'
+
+    tokenizer = text_chunks_db.global_config.get("tokenizer")
+    max_total_tokens = getattr(
+        query_param,
+        "max_total_tokens",
+        text_chunks_db.global_config.get("max_total_tokens", DEFAULT_MAX_TOTAL_TOKENS),
+    )
+
+    if query_param.enable_rerank:
+        entities_context = await rerank_nodes(
+            query=query,
+            nodes=entities_context,
+            query_param=query_param,
+            global_config=entities_vdb.global_config, 
+        )
+        relations_context = await rerank_edges(
+            query=query,
+            edges=relations_context,
+            query_param=query_param,
+            global_config=relationships_vdb.global_config,
+        )
+
     # Apply token processing to chunks if tokenizer is available
     text_units_context = []
     only_dc = query_param.mode in ('hybrid_dc', 'mix_dc', 'naive') 
     if tokenizer and all_chunks:
-        # Calculate dynamic token limit for text chunks
         entities_str = json.dumps(entities_context, ensure_ascii=False)
         relations_str = json.dumps(relations_context, ensure_ascii=False)
 
@@ -2227,7 +2776,13 @@ async def _build_query_context(
         kg_context = kg_context_template.format(
             entities_str=entities_str, relations_str=relations_str
         )
-        kg_context_tokens = len(tokenizer.encode(kg_context))
+        # The UTF-8 length bounds the count of byte-level tokenizers without
+        # encoding, the context is counted exactly near the budget boundary
+        byte_level = getattr(tokenizer, "byte_level", False)
+        if byte_level:
+            kg_context_tokens = token_upper_bound(kg_context)
+        else:
+            kg_context_tokens = tokenizer.count_tokens(kg_context)
 
         # Calculate actual system prompt overhead dynamically
         # 1. Calculate conversation history tokens
@@ -2237,7 +2792,7 @@ async def _build_query_context(
                 query_param.conversation_history, query_param.history_turns
             )
         history_tokens = (
-            len(tokenizer.encode(history_context)) if history_context else 0
+            tokenizer.count_tokens(history_context) if history_context else 0
         )
 
         # 2. Calculate system prompt template tokens (excluding content_data)
@@ -2262,16 +2817,20 @@ async def _build_query_context(
             response_type=response_type,
             user_prompt=user_prompt,
         )
-        sys_prompt_template_tokens = len(tokenizer.encode(sample_sys_prompt))
+        sys_prompt_template_tokens = tokenizer.count_tokens(sample_sys_prompt)
 
         # Total system prompt overhead = template + query tokens
-        query_tokens = len(tokenizer.encode(query))
+        query_tokens = tokenizer.count_tokens(query)
         sys_prompt_overhead = sys_prompt_template_tokens + query_tokens
 
         buffer_tokens = 100  # Safety buffer as requested
 
         # Calculate available tokens for text chunks
         used_tokens = kg_context_tokens + sys_prompt_overhead + buffer_tokens
+        if byte_level and used_tokens > max_total_tokens - buffer_tokens:
+            exact_tokens = tokenizer.count_tokens(kg_context)
+            used_tokens -= kg_context_tokens - exact_tokens
+            kg_context_tokens = exact_tokens
         available_chunk_tokens = max_total_tokens - used_tokens
 
         logger.debug(
@@ -2388,6 +2947,7 @@ async def _get_node_data(
     entities_vdb: BaseVectorStorage,
     relationships_vdb: BaseVectorStorage,
     query_param: QueryParam,
+    query_embedding=None,
 ):
     # get similar entities
     logger.info(
@@ -2396,7 +2956,10 @@ async def _get_node_data(
     if not len(query):
         return "", "", [], []
     results = await entities_vdb.query(
-        query, top_k=query_param.entity_top_k, ids=query_param.ids
+        query,
+        top_k=query_param.entity_top_k,
+        ids=query_param.ids,
+        query_embedding=query_embedding,
     )
     if query_param.enable_rerank:
         results = await rerank_nodes(
@@ -2559,16 +3122,10 @@ async def _find_most_related_text_unit_from_entities(
                 all_text_units_lookup[c_id] = index
                 tasks.append((c_id, index, this_edges))
 
-    # Process in batches tasks at a time to avoid overwhelming resources
-    batch_size = 5
-    results = []
-
-    for i in range(0, len(tasks), batch_size):
-        batch_tasks = tasks[i : i + batch_size]
-        batch_results = await asyncio.gather(
-            *[text_chunks_db.get_by_id(c_id) for c_id, _, _ in batch_tasks]
-        )
-        results.extend(batch_results)
+    # One batched read instead of a storage round trip per chunk
+    results = (
+        await text_chunks_db.get_by_ids([c_id for c_id, _, _ in tasks]) if tasks else []
+    )
 
     for (c_id, index, this_edges), data in zip(tasks, results):
         all_text_units_lookup[c_id] = {
@@ -2675,6 +3232,7 @@ async def _get_edge_data(
     relationships_vdb: BaseVectorStorage,
     entities_vdb: BaseVectorStorage,
     query_param: QueryParam,
+    query_embedding=None,
 ):
     logger.info(
         f"Query edges: {keywords}, top_k: {query_param.relation_top_k}, cosine: {relationships_vdb.cosine_better_than_threshold}"
@@ -2682,7 +3240,10 @@ async def _get_edge_data(
     if not len(keywords):
         return "", "", [], []
     results = await relationships_vdb.query(
-        keywords, top_k=query_param.relation_top_k, ids=query_param.ids
+        keywords,
+        top_k=query_param.relation_top_k,
+        ids=query_param.ids,
+        query_embedding=query_embedding,
     )
     if query_param.enable_rerank:
         results = await rerank_edges(
@@ -2857,24 +3418,22 @@ async def _find_related_text_unit_from_relationships(
         for dp in edge_datas
         if dp["source_id"] is not None
     ]
-    all_text_units_lookup = {}
-
-    async def fetch_chunk_data(c_id, index):
-        if c_id not in all_text_units_lookup:
-            chunk_data = await text_chunks_db.get_by_id(c_id)
-            # Only store valid data
-            if chunk_data is not None and "content" in chunk_data:
-                all_text_units_lookup[c_id] = {
-                    "data": chunk_data,
-                    "order": index,
-                }
-
-    tasks = []
+    # Each chunk keeps the order of the first relationship that references it
+    chunk_orders = {}
     for index, unit_list in enumerate(text_units):
         for c_id in unit_list:
-            tasks.append(fetch_chunk_data(c_id, index))
+            chunk_orders.setdefault(c_id, index)
 
-    await asyncio.gather(*tasks)
+    all_text_units_lookup = {}
+    chunk_ids = list(chunk_orders)
+    chunk_datas = await text_chunks_db.get_by_ids(chunk_ids) if chunk_ids else []
+    for c_id, chunk_data in zip(chunk_ids, chunk_datas):
+        # Only store valid data
+        if chunk_data is not None and "content" in chunk_data:
+            all_text_units_lookup[c_id] = {
+                "data": chunk_data,
+                "order": chunk_orders[c_id],
+            }
 
     if not all_text_units_lookup:
         logger.warning("No valid text chunks found")
@@ -2920,7 +3479,7 @@ async def naive_query(
         use_model_func = partial(use_model_func, _priority=5)
 
     # Handle cache
-    args_hash = compute_args_hash(query_param.mode, query)
+    args_hash = await compute_query_cache_hash(query, query_param, hashing_kv)
     cached_response, quantized, min_val, max_val = await handle_cache(
         hashing_kv, args_hash, query, query_param.mode, cache_type="query"
     )
@@ -2948,7 +3507,7 @@ async def naive_query(
         history_context = get_conversation_turns(
             query_param.conversation_history, query_param.history_turns
         )
-    history_tokens = len(tokenizer.encode(history_context)) if history_context else 0
+    history_tokens = tokenizer.count_tokens(history_context) if history_context else 0
 
     # Calculate system prompt template tokens (excluding content_data)
     user_prompt = query_param.user_prompt if query_param.user_prompt else ""
@@ -2970,10 +3529,10 @@ async def naive_query(
         history=history_context,
         user_prompt=user_prompt,
     )
-    sys_prompt_template_tokens = len(tokenizer.encode(sample_sys_prompt))
+    sys_prompt_template_tokens = tokenizer.count_tokens(sample_sys_prompt)
 
     # Total system prompt overhead = template + query tokens
-    query_tokens = len(tokenizer.encode(query))
+    query_tokens = tokenizer.count_tokens(query)
     sys_prompt_overhead = sys_prompt_template_tokens + query_tokens
 
     buffer_tokens = 100  # Safety buffer
@@ -3050,10 +3609,12 @@ async def naive_query(
     if query_param.only_need_prompt:
         return sys_prompt, log_file_path
 
-    len_of_prompts = len(tokenizer.encode(query + sys_prompt))
-    logger.debug(
-        f"[naive_query] Sending to LLM: {len_of_prompts:,} tokens (Query: {len(tokenizer.encode(query))}, System: {len(tokenizer.encode(sys_prompt))})"
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        query_tokens = tokenizer.count_tokens(query)
+        sys_prompt_tokens = len(tokenizer.encode(sys_prompt))
+        logger.debug(
+            f"[naive_query] Sending to LLM: {query_tokens + sys_prompt_tokens:,} tokens (Query: {query_tokens}, System: {sys_prompt_tokens})"
+        )
 
     response = await use_model_func(
         query,
@@ -3118,7 +3679,7 @@ async def kg_query_with_keywords(
         # Apply higher priority (5) to query relation LLM function
         use_model_func = partial(use_model_func, _priority=5)
 
-    args_hash = compute_args_hash(query_param.mode, query)
+    args_hash = await compute_query_cache_hash(query, query_param, hashing_kv)
     cached_response, quantized, min_val, max_val = await handle_cache(
         hashing_kv, args_hash, query, query_param.mode, cache_type="query"
     )
@@ -3151,6 +3712,7 @@ async def kg_query_with_keywords(
         text_chunks_db,
         query_param,
         chunks_vdb=chunks_vdb,
+        hashing_kv=hashing_kv,
     )
     if not context:
         return PROMPTS["fail_response"]
@@ -3178,10 +3740,12 @@ async def kg_query_with_keywords(
         return sys_prompt
 
     tokenizer: Tokenizer = global_config["tokenizer"]
-    len_of_prompts = len(tokenizer.encode(query + sys_prompt))
-    logger.debug(
-        f"[kg_query_with_keywords] Sending to LLM: {len_of_prompts:,} tokens (Query: {len(tokenizer.encode(query))}, System: {len(tokenizer.encode(sys_prompt))})"
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        query_tokens = tokenizer.count_tokens(query)
+        sys_prompt_tokens = len(tokenizer.encode(sys_prompt))
+        logger.debug(
+            f"[kg_query_with_keywords] Sending to LLM: {query_tokens + sys_prompt_tokens:,} tokens (Query: {query_tokens}, System: {sys_prompt_tokens})"
+        )
 
     # 6. Generate response
     response = await use_model_func(
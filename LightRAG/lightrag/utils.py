@@ -9,7 +9,11 @@ import logging
 import logging.handlers
 import os
 import re
-from dataclasses import dataclass
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, fields
 from functools import wraps
 from hashlib import md5
 from typing import Any, Protocol, Callable, TYPE_CHECKING, List
@@ -19,6 +23,8 @@ from lightrag.constants import (
     DEFAULT_LOG_MAX_BYTES,
     DEFAULT_LOG_BACKUP_COUNT,
     DEFAULT_LOG_FILENAME,
+    DEFAULT_TOKEN_COUNT_CACHE_SIZE,
+    DEFAULT_SEMANTIC_CACHE_MAX_ENTRIES,
 )
 
 
@@ -240,6 +246,13 @@ class EmbeddingFunc:
         return await self.func(*args, **kwargs)
 
 
+def stack_embeddings(embeddings_list: list[np.ndarray]) -> np.ndarray:
+    """Join embedding batches into one float32 matrix, copying only if needed"""
+    if len(embeddings_list) == 1:
+        return np.asarray(embeddings_list[0], dtype=np.float32)
+    return np.concatenate(embeddings_list, axis=0, dtype=np.float32)
+
+
 def locate_json_string_body_from_string(content: str) -> str | None:
     """Locate the JSON string body from a string"""
     try:
@@ -661,6 +674,10 @@ class Tokenizer:
     A wrapper around a tokenizer to provide a consistent interface for encoding and decoding.
     """
 
+    byte_level: bool = False
+    """True if no token covers less than one UTF-8 byte and `encode` adds no special
+    tokens, so the byte length of a text bounds its token count."""
+
     def __init__(self, model_name: str, tokenizer: TokenizerInterface):
         """
         Initializes the Tokenizer with a tokenizer model name and a tokenizer instance.
@@ -696,12 +713,63 @@ class Tokenizer:
         """
         return self.tokenizer.decode(tokens)
 
+    def __getstate__(self) -> dict[str, Any]:
+        # Worker processes rebuild the count cache on demand
+        state = self.__dict__.copy()
+        state.pop("_count_cache", None)
+        return state
+
+    def count_tokens(self, content: str) -> int:
+        """
+        Counts the tokens of a string, memoizing the count of recently seen strings.
+
+        Entity, relation and chunk texts recur across the truncation steps of a
+        query and across queries, so most calls are served without encoding.
+
+        Args:
+            content: The string to count.
+
+        Returns:
+            The number of tokens `encode` would return.
+        """
+        key = md5(content.encode("utf-8")).digest()
+        cache = self.__dict__.get("_count_cache")
+        if cache is None:
+            # Created lazily, subclasses may not call Tokenizer.__init__
+            cache = self.__dict__.setdefault(
+                "_count_cache", TTLLRUCache(DEFAULT_TOKEN_COUNT_CACHE_SIZE)
+            )
+        with _token_count_lock:
+            count = cache.get(key)
+        if count is None:
+            count = len(self.encode(content))
+            with _token_count_lock:
+                cache.put(key, count)
+        return count
+
+
+# Guards the OrderedDict of every Tokenizer count cache, counting may run in threads
+_token_count_lock = threading.Lock()
+
+
+def token_upper_bound(content: str) -> int:
+    """Cheap upper bound of the token count of a string for byte-level tokenizers
+
+    Byte-level tokenizers never emit a token covering less than one byte, so
+    the UTF-8 length bounds the count without encoding. Only valid when
+    `Tokenizer.byte_level` is set.
+    """
+    return len(content.encode("utf-8"))
+
 
 class TiktokenTokenizer(Tokenizer):
     """
     A Tokenizer implementation using the tiktoken library.
     """
 
+    # Byte-level BPE, and encode() never adds special tokens
+    byte_level = True
+
     def __init__(self, model_name: str = "gpt-4o-mini"):
         """
         Initializes the TiktokenTokenizer with a specified model name.
@@ -766,12 +834,23 @@ def truncate_list_by_token_size(
     max_token_size: int,
     tokenizer: Tokenizer,
 ) -> list[int]:
-    """Truncate a list of data by token size"""
+    """Truncate a list of data by token size
+
+    With a byte-level tokenizer, lists whose byte length already fits the
+    budget are returned without encoding. Otherwise items are counted in
+    order, through the tokenizer's count cache, until the budget is exceeded.
+    """
     if max_token_size <= 0:
         return []
+    texts = [key(data) for data in list_data]
+    if (
+        getattr(tokenizer, "byte_level", False)
+        and sum(map(token_upper_bound, texts)) <= max_token_size
+    ):
+        return list_data
     tokens = 0
-    for i, data in enumerate(list_data):
-        tokens += len(tokenizer.encode(key(data)))
+    for i, text in enumerate(texts):
+        tokens += tokenizer.count_tokens(text)
         if tokens > max_token_size:
             return list_data[:i]
     return list_data
@@ -852,6 +931,328 @@ def dequantize_embedding(
     return (quantized * scale + min_val).astype(np.float32)
 
 
+# Cache key of the token that changes whenever the indexed data changes
+STORAGE_GENERATION_KEY = "storage_generation"
+
+# Query cache entries read per storage call when seeding the semantic index
+SEMANTIC_CACHE_SEED_BATCH = 256
+# Seconds between checks for semantic cache entries written by other processes
+SEMANTIC_CACHE_REFRESH_INTERVAL = 30
+
+# QueryParam fields that cannot change a cached answer
+_QUERY_CACHE_IGNORED_FIELDS = {"stream", "model_func"}
+
+
+async def get_storage_generation(hashing_kv) -> str:
+    """Current storage generation, kept in the LLM response cache it guards"""
+    if hashing_kv is None:
+        return ""
+    entry = await hashing_kv.get_by_id(STORAGE_GENERATION_KEY)
+    return entry["return"] if entry else ""
+
+
+async def bump_storage_generation(hashing_kv) -> str:
+    """Start a new storage generation, making every cached query answer stale
+
+    Call after documents, entities or relations change.
+    """
+    if hashing_kv is None:
+        return ""
+    generation = uuid.uuid4().hex
+    await hashing_kv.upsert(
+        {
+            STORAGE_GENERATION_KEY: {
+                "return": generation,
+                "cache_type": "generation",
+                "original_prompt": "",
+                "mode": "default",
+                "chunk_id": None,
+            }
+        }
+    )
+    for attr in ("_query_lru", "_context_lru"):
+        lru = getattr(hashing_kv, attr, None)
+        if lru is not None:
+            lru.clear()
+    # Answers of older generations can no longer match, drop their embeddings
+    index = getattr(hashing_kv, "_semantic_cache_index", None)
+    if index is not None:
+        hashing_kv._semantic_cache_index = SemanticCacheIndex(
+            generation, index.max_entries
+        )
+    return generation
+
+
+async def compute_query_cache_hash(query: str, query_param, hashing_kv) -> str:
+    """Cache hash of a query answer: "{scope}-{query hash}"
+
+    The scope covers every QueryParam field that affects the answer plus the
+    storage generation, so answers are never reused across parameter sets or
+    after the indexed data changed. Semantic cache matches stay within a scope.
+    """
+    params = {
+        f.name: getattr(query_param, f.name)
+        for f in fields(query_param)
+        if f.name not in _QUERY_CACHE_IGNORED_FIELDS
+    }
+    if params.get("ids"):
+        params["ids"] = sorted(params["ids"])
+    if query_param.model_func is not None:
+        params["model_func"] = getattr(
+            query_param.model_func, "__qualname__", type(query_param.model_func).__name__
+        )
+    scope = compute_args_hash(
+        json.dumps(params, sort_keys=True, ensure_ascii=False, default=str),
+        await get_storage_generation(hashing_kv),
+    )
+    return f"{scope}-{compute_args_hash(query)}"
+
+
+def semantic_cache_scope(cache_key: str) -> str:
+    """{mode}:{cache_type}:{scope} part of a cache key, scope may be empty"""
+    key_prefix, hash_value = cache_key.rsplit(":", 1)
+    scope = hash_value.split("-", 1)[0] if "-" in hash_value else ""
+    return f"{key_prefix}:{scope}"
+
+
+class TTLLRUCache:
+    """Bounded LRU mapping whose entries also expire after `ttl` seconds (0: never)"""
+
+    def __init__(self, max_entries: int, ttl: float = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        stored_at, value = item
+        if self.ttl and time.time() - stored_at > self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any, stored_at: float | None = None):
+        self._data[key] = (stored_at or time.time(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _cache_entry_expired(hashing_kv, cache_entry: dict[str, Any]) -> bool:
+    ttl = hashing_kv.global_config.get("query_cache_ttl", 0)
+    updated = cache_entry.get("update_time")
+    return bool(ttl and updated and time.time() - updated > ttl)
+
+
+def _get_attached_lru(hashing_kv, attr: str) -> TTLLRUCache | None:
+    lru = getattr(hashing_kv, attr, None)
+    if lru is None:
+        max_entries = hashing_kv.global_config.get("query_cache_max_entries", 0)
+        if max_entries <= 0:
+            return None
+        lru = TTLLRUCache(
+            max_entries, hashing_kv.global_config.get("query_cache_ttl", 0)
+        )
+        setattr(hashing_kv, attr, lru)
+    return lru
+
+
+def _get_query_lru(hashing_kv) -> TTLLRUCache | None:
+    """LRU tier attached to the cache storage, None when disabled"""
+    return _get_attached_lru(hashing_kv, "_query_lru")
+
+
+def get_context_cache(hashing_kv) -> TTLLRUCache | None:
+    """In-memory cache of assembled retrieval contexts, None when disabled
+
+    It lives next to the query LRU on the LLM response cache storage, shares
+    its size and TTL settings and is cleared with it whenever the storage
+    generation changes. Keys must include get_storage_generation().
+    """
+    if hashing_kv is None:
+        return None
+    return _get_attached_lru(hashing_kv, "_context_lru")
+
+
+class SemanticCacheIndex:
+    """In-memory index of the query embeddings stored in an LLM response cache
+
+    Entries are grouped by semantic_cache_scope() so a lookup only compares
+    against answers cached for the same mode, parameters and generation.
+    Only entries of the current storage generation are indexed, and each
+    scope keeps its `max_entries` most recently used entries.
+    """
+
+    def __init__(self, generation: str = "", max_entries: int = 0):
+        self.generation = generation
+        self.max_entries = max_entries or DEFAULT_SEMANTIC_CACHE_MAX_ENTRIES
+        # Scope -> OrderedDict of cache key -> (prompt, normalized embedding)
+        self._scopes: dict[str, OrderedDict[str, tuple[str, np.ndarray]]] = {}
+        # Stacked view of a scope as (keys, prompts, matrix), rebuilt after changes
+        self._matrices: dict[str, tuple[list[str], list[str], np.ndarray]] = {}
+        # Cache keys already read from the storage, indexed or not
+        self.seen: set[str] = set()
+        self.seeded_at = 0.0
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._scopes.values())
+
+    def add(self, cache_key: str, embedding: np.ndarray, prompt: str):
+        prefix = semantic_cache_scope(cache_key)
+        entries = self._scopes.setdefault(prefix, OrderedDict())
+        if cache_key in entries:
+            return
+        norm = np.linalg.norm(embedding)
+        entries[cache_key] = (
+            prompt,
+            (embedding / norm if norm > 0 else embedding).astype(np.float32),
+        )
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        self._matrices.pop(prefix, None)
+
+    def add_entry(self, cache_key: str, entry: dict[str, Any]) -> bool:
+        """Index a stored cache entry, False if it carries no embedding of this generation"""
+        self.seen.add(cache_key)
+        if not entry.get("embedding") or entry.get("embedding_shape") is None:
+            return False
+        if entry.get("generation", "") != self.generation:
+            return False
+        quantized = np.frombuffer(
+            bytes.fromhex(entry["embedding"]), dtype=np.uint8
+        ).reshape(entry["embedding_shape"])
+        embedding = dequantize_embedding(
+            quantized, entry["embedding_min"], entry["embedding_max"]
+        )
+        self.add(cache_key, embedding, entry.get("original_prompt", ""))
+        return True
+
+    def touch(self, cache_key: str):
+        """Mark an entry as used so eviction spares it"""
+        entries = self._scopes.get(semantic_cache_scope(cache_key))
+        if entries is not None and cache_key in entries:
+            entries.move_to_end(cache_key)
+
+    def search(
+        self, prefix: str, embedding: np.ndarray, threshold: float
+    ) -> list[tuple[str, str, float]]:
+        """Cached (key, prompt, similarity) at or above threshold, best first"""
+        entries = self._scopes.get(prefix)
+        if not entries:
+            return []
+        stacked = self._matrices.get(prefix)
+        if stacked is None:
+            stacked = self._matrices[prefix] = (
+                list(entries),
+                [prompt for prompt, _ in entries.values()],
+                np.stack([vector for _, vector in entries.values()]),
+            )
+        keys, prompts, matrix = stacked
+        norm = np.linalg.norm(embedding)
+        scores = matrix @ (embedding / norm if norm > 0 else embedding)
+        order = np.argsort(-scores)
+        return [
+            (keys[i], prompts[i], float(scores[i]))
+            for i in order
+            if scores[i] >= threshold
+        ]
+
+
+def _is_query_cache_key(cache_key: str) -> bool:
+    parts = cache_key.split(":", 2)
+    return len(parts) == 3 and parts[1] == "query" and parts[0] != "default"
+
+
+async def _seed_semantic_cache_index(hashing_kv, index: SemanticCacheIndex):
+    """Index query entries written since the last seed, by this or another process
+
+    Keys are listed and only unseen query entries are read, in batches, so
+    the extraction cache and the responses of other entries are never copied.
+    """
+    index.seeded_at = time.monotonic()
+    if not exists_func(hashing_kv, "get_keys"):
+        return
+    try:
+        keys = [
+            key
+            for key in await hashing_kv.get_keys()
+            if key not in index.seen and _is_query_cache_key(key)
+        ]
+        for i in range(0, len(keys), SEMANTIC_CACHE_SEED_BATCH):
+            batch = keys[i : i + SEMANTIC_CACHE_SEED_BATCH]
+            for cache_key, entry in zip(batch, await hashing_kv.get_by_ids(batch)):
+                if isinstance(entry, dict):
+                    index.add_entry(cache_key, entry)
+    except Exception as e:
+        logger.warning(f"Could not seed semantic cache index: {e}")
+
+
+async def _get_semantic_cache_index(
+    hashing_kv, max_entries: int = 0
+) -> SemanticCacheIndex:
+    """Index attached to the cache storage, for the current storage generation
+
+    A new generation, bumped here or by another process, replaces the index.
+    Entries cached by other processes are picked up every
+    SEMANTIC_CACHE_REFRESH_INTERVAL seconds.
+    """
+    generation = await get_storage_generation(hashing_kv)
+    index = getattr(hashing_kv, "_semantic_cache_index", None)
+    if index is None or index.generation != generation:
+        index = SemanticCacheIndex(generation, max_entries)
+        hashing_kv._semantic_cache_index = index
+        await _seed_semantic_cache_index(hashing_kv, index)
+    elif time.monotonic() - index.seeded_at > SEMANTIC_CACHE_REFRESH_INTERVAL:
+        await _seed_semantic_cache_index(hashing_kv, index)
+    return index
+
+
+def _semantic_cache_config(hashing_kv, mode: str, cache_type: str | None) -> dict:
+    """embedding_cache_config if semantic caching applies to this lookup, else {}"""
+    config = hashing_kv.global_config.get("embedding_cache_config") or {}
+    if (
+        not config.get("enabled")
+        or mode == "default"
+        or cache_type != "query"
+        or hashing_kv.embedding_func is None
+    ):
+        return {}
+    return config
+
+
+async def _llm_confirms_similarity(
+    hashing_kv, prompt: str, cached_prompt: str, threshold: float
+) -> bool:
+    from lightrag.prompt import PROMPTS
+
+    llm_func = hashing_kv.global_config.get("llm_model_func")
+    if llm_func is None:
+        return True
+    check_prompt = PROMPTS["similarity_check"].format(
+        original_prompt=prompt, cached_prompt=cached_prompt
+    )
+    try:
+        llm_result = await llm_func(check_prompt)
+        similarity = float(remove_think_tags(llm_result).strip())
+    except Exception as e:
+        logger.warning(f"LLM similarity check failed: {e}")
+        return False
+    logger.debug(f"LLM similarity check: {similarity:.2f}")
+    return similarity >= threshold
+
+
 async def handle_cache(
     hashing_kv,
     args_hash,
@@ -859,7 +1260,19 @@ async def handle_cache(
     mode="default",
     cache_type=None,
 ):
-    """Generic cache handling function with flattened cache keys"""
+    """Generic cache handling function with flattened cache keys
+
+    Besides the exact lookup, query answers are matched semantically when
+    `embedding_cache_config["enabled"]` is set: the prompt embedding is compared
+    with the embeddings of cached prompts of the same mode, and the best one at
+    or above `similarity_threshold` is returned, after an LLM confirmation when
+    `use_llm_check` is set.
+
+    Returns:
+        (cached response or None, quantized prompt embedding, min, max); the
+        embedding fields are only set on a semantic cache miss and should be
+        passed on to save_to_cache through CacheData
+    """
     if hashing_kv is None:
         return None, None, None, None
 
@@ -872,11 +1285,57 @@ async def handle_cache(
 
     # Use flattened cache key format: {mode}:{cache_type}:{hash}
     flattened_key = generate_cache_key(mode, cache_type, args_hash)
+    lru = _get_query_lru(hashing_kv) if mode != "default" else None
+    if lru is not None:
+        cached = lru.get(flattened_key)
+        if cached is not None:
+            logger.debug(f"In-memory cache hit(key:{flattened_key})")
+            return cached, None, None, None
+
     cache_entry = await hashing_kv.get_by_id(flattened_key)
+    if cache_entry and mode != "default" and _cache_entry_expired(hashing_kv, cache_entry):
+        logger.debug(f"Cache entry expired(key:{flattened_key})")
+        cache_entry = None
     if cache_entry:
         logger.debug(f"Flattened cache hit(key:{flattened_key})")
+        if lru is not None:
+            lru.put(
+                flattened_key,
+                cache_entry["return"],
+                stored_at=cache_entry.get("update_time"),
+            )
         return cache_entry["return"], None, None, None
 
+    semantic_config = _semantic_cache_config(hashing_kv, mode, cache_type)
+    if semantic_config:
+        threshold = semantic_config.get("similarity_threshold", 0.95)
+        embedding = (await hashing_kv.embedding_func([prompt], _priority=5))[0]
+        embedding = np.asarray(embedding, dtype=np.float32)
+        index = await _get_semantic_cache_index(
+            hashing_kv, semantic_config.get("max_entries", 0)
+        )
+        for cache_key, cached_prompt, similarity in index.search(
+            semantic_cache_scope(flattened_key), embedding, threshold
+        ):
+            if semantic_config.get("use_llm_check") and not (
+                await _llm_confirms_similarity(
+                    hashing_kv, prompt, cached_prompt, threshold
+                )
+            ):
+                # Only the best candidate is worth an LLM call
+                break
+            cached = await hashing_kv.get_by_id(cache_key)
+            if cached and not _cache_entry_expired(hashing_kv, cached):
+                index.touch(cache_key)
+                logger.info(
+                    f"Semantic cache hit(key:{cache_key} similarity:{similarity:.3f})"
+                )
+                return cached["return"], None, None, None
+            # Entry dropped or expired since it was indexed, try the next candidate
+        quantized, min_val, max_val = quantize_embedding(embedding)
+        logger.debug(f"Cache missed(mode:{mode} type:{cache_type})")
+        return None, quantized, min_val, max_val
+
     logger.debug(f"Cache missed(mode:{mode} type:{cache_type})")
     return None, None, None, None
 
@@ -934,16 +1393,32 @@ async def save_to_cache(hashing_kv, cache_data: CacheData):
         "embedding_shape": cache_data.quantized.shape
         if cache_data.quantized is not None
         else None,
-        "embedding_min": cache_data.min_val,
-        "embedding_max": cache_data.max_val,
+        "embedding_min": float(cache_data.min_val)
+        if cache_data.min_val is not None
+        else None,
+        "embedding_max": float(cache_data.max_val)
+        if cache_data.max_val is not None
+        else None,
         "original_prompt": cache_data.prompt,
     }
+    if cache_data.quantized is not None:
+        # Semantic matches are only valid within the generation they were cached in
+        cache_entry["generation"] = await get_storage_generation(hashing_kv)
 
     logger.info(f" == LLM cache == saving: {flattened_key}")
 
     # Save using flattened key
     await hashing_kv.upsert({flattened_key: cache_entry})
 
+    lru = getattr(hashing_kv, "_query_lru", None)
+    if lru is not None and cache_data.mode != "default":
+        lru.put(flattened_key, cache_data.content)
+
+    # Keep an already seeded semantic index in step with the storage
+    index = getattr(hashing_kv, "_semantic_cache_index", None)
+    if index is not None:
+        index.add_entry(flattened_key, cache_entry)
+
 
 def safe_unicode_decode(content):
     # Regular expression to find all Unicode escape sequences of the form \uXXXX
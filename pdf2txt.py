@@ -1,6 +1,17 @@
 import PyPDF2
+import hashlib
+import json
 import os
 import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# 清单文件, 保存在输出根目录下, 记录已转换PDF的内容哈希
+MANIFEST_FILE = '.pdf2txt_manifest.json'
+# 计算哈希时每次读取的字节数
+HASH_BLOCK_SIZE = 1 << 20
+# 转换过程中至少每隔多少秒保存一次清单, 中断后可以从此处继续
+MANIFEST_SAVE_INTERVAL = 10
 
 
 def ensure_directory_exists(directory):
@@ -9,6 +20,61 @@ def ensure_directory_exists(directory):
         os.makedirs(directory)
 
 
+def file_hash(path):
+    """分块计算文件内容的md5, 不把整个文件读入内存"""
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _replace_atomically(write, path):
+    """先写入同目录下的临时文件再原子替换, 中断时不会留下写了一半的输出"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _extract_pages(pdf_path, txt_path):
+    """
+    逐页提取文本并直接写入文件, 不在内存中拼接全部页面
+
+    返回 (总页数, 无文本的页码列表)
+    """
+    empty_pages = []
+
+    def write(tmp_path):
+        with open(pdf_path, 'rb') as pdf_file, \
+                open(tmp_path, 'w', encoding='utf-8') as txt_file:
+            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            written = False
+            for page_num, page in enumerate(pdf_reader.pages):
+                page_text = page.extract_text()
+                if page_text:
+                    # 与原先 '\n\n'.join(...) 的输出保持一致
+                    if written:
+                        txt_file.write('\n\n')
+                    txt_file.write(page_text)
+                    written = True
+                else:
+                    empty_pages.append(page_num + 1)
+            empty_pages.insert(0, len(pdf_reader.pages))
+
+    _replace_atomically(write, txt_path)
+    return empty_pages[0], empty_pages[1:]
+
+
+def _txt_path(pdf_path, output_dir):
+    pdf_filename = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.join(output_dir, f"{pdf_filename}.txt")
+
+
 def pdf_to_txt(pdf_path, output_dir):
     """
     将单个PDF文件转换为TXT文本并保存到指定目录
@@ -18,78 +84,240 @@ def pdf_to_txt(pdf_path, output_dir):
         output_dir (str): 输出目录
     """
     try:
-        # 获取PDF文件名（不含扩展名）
-        pdf_filename = os.path.splitext(os.path.basename(pdf_path))[0]
-        txt_filename = f"{pdf_filename}.txt"
-        txt_path = os.path.join(output_dir, txt_filename)
-
-        # 打开PDF文件
-        with open(pdf_path, 'rb') as pdf_file:
-            # 创建PDF阅读器对象
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
+        txt_path = _txt_path(pdf_path, output_dir)
+        num_pages, empty_pages = _extract_pages(pdf_path, txt_path)
+        for page_num in empty_pages:
+            print(f"警告: {pdf_path} 第 {page_num} 页没有可提取的文本")
+        print(f"已处理: {pdf_path} -> {txt_path}")
+    except Exception as e:
+        print(f"处理 {pdf_path} 时发生错误: {str(e)}")
 
-            # 获取PDF的总页数
-            num_pages = len(pdf_reader.pages)
 
-            # 提取文本内容
-            text_content = []
-            for page_num in range(num_pages):
-                # 获取第page_num页
-                page = pdf_reader.pages[page_num]
+# 工作进程中的已知输出: 内容哈希 -> 已存在的TXT文件路径
+_known_outputs = {}
+# 工作进程中已知没有可提取文本的PDF内容哈希
+_empty_digests = set()
 
-                # 提取页面文本
-                page_text = page.extract_text()
 
-                if page_text:
-                    # text_content.append(f"--- 第 {page_num + 1} 页 ---")
-                    text_content.append(page_text)
-                else:
-                    print(f"警告: {pdf_path} 第 {page_num + 1} 页没有可提取的文本")
+def _init_worker(known_outputs, empty_digests):
+    global _known_outputs, _empty_digests
+    _known_outputs = known_outputs
+    _empty_digests = empty_digests
 
-            # 将提取的文本写入TXT文件
-            with open(txt_path, 'w', encoding='utf-8') as txt_file:
-                txt_file.write('\n\n'.join(text_content))
 
-            print(f"已处理: {pdf_path} -> {txt_path}")
+def _convert_worker(pdf_path, txt_path):
+    """
+    在工作进程中转换单个PDF, 内容未变的文件直接跳过或复制已有输出
 
+    返回结果字典, 由主进程打印并写入清单
+    """
+    start = time.perf_counter()
+    result = {'hash': None, 'status': 'converted', 'pages': 0, 'empty_pages': []}
+    try:
+        result['hash'] = digest = file_hash(pdf_path)
+        existing = _known_outputs.get(digest)
+        if digest in _empty_digests:
+            # 内容相同的PDF已确认没有文本, 只需写出空的TXT
+            _replace_atomically(lambda tmp: open(tmp, 'w').close(), txt_path)
+            result['status'] = 'empty'
+        elif existing == txt_path and os.path.exists(txt_path):
+            # 源文件只是时间戳变化, 内容与上次转换时相同
+            result['status'] = 'unchanged'
+        elif existing and os.path.exists(existing):
+            # 内容相同的PDF已在别处转换过
+            _replace_atomically(lambda tmp: shutil.copyfile(existing, tmp), txt_path)
+            result['status'] = 'copied'
+        else:
+            result['pages'], result['empty_pages'] = _extract_pages(pdf_path, txt_path)
     except Exception as e:
-        print(f"处理 {pdf_path} 时发生错误: {str(e)}")
+        result['status'] = 'error'
+        result['error'] = str(e)
+    result['elapsed'] = time.perf_counter() - start
+    return result
 
 
-def process_pdf_files_recursively(input_dir, output_root_dir):
+def load_manifest(output_root_dir):
+    """
+    读取清单: {内容哈希: {'pages': 页数, 'empty': 是否没有文本, 'sources': {相对路径: [大小, mtime_ns]}}}
+    """
+    path = os.path.join(output_root_dir, MANIFEST_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"警告: 清单 {path} 无法读取, 将重新转换全部文件: {str(e)}")
+        return {}
+
+
+def save_manifest(output_root_dir, manifest):
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+    _replace_atomically(write, os.path.join(output_root_dir, MANIFEST_FILE))
+
+
+def _find_pdf_files(input_dir, output_root_dir):
+    """遍历输入目录, 创建对应的输出目录, 返回 [(PDF路径, 相对路径, TXT路径)]"""
+    jobs = []
+    for dir_path, dir_names, file_names in os.walk(input_dir):
+        dir_names.sort()
+        relative_dir = os.path.relpath(dir_path, input_dir)
+        output_dir = os.path.normpath(os.path.join(output_root_dir, relative_dir))
+        ensure_directory_exists(output_dir)
+        for item in sorted(file_names):
+            if item.lower().endswith('.pdf'):
+                pdf_path = os.path.join(dir_path, item)
+                relative_path = os.path.normpath(os.path.join(relative_dir, item))
+                jobs.append((pdf_path, relative_path, _txt_path(pdf_path, output_dir)))
+    return jobs
+
+
+def _is_up_to_date(pdf_path, txt_path, recorded, empty=False):
+    """
+    输出比源文件新, 且源文件大小和修改时间与清单记录一致
+
+    没有文本的PDF只比较清单记录, 它们的空TXT会被 clean_empty 删除
+    """
+    if recorded is None:
+        return False
+    try:
+        pdf_stat = os.stat(pdf_path)
+        if [pdf_stat.st_size, pdf_stat.st_mtime_ns] != recorded:
+            return False
+        return empty or os.stat(txt_path).st_mtime_ns >= pdf_stat.st_mtime_ns
+    except OSError:
+        return False
+
+
+def _format_throughput(result, pdf_path):
+    elapsed = max(result['elapsed'], 1e-6)
+    size_mb = os.path.getsize(pdf_path) / (1 << 20)
+    return (
+        f"{result['pages']} 页, {size_mb:.2f} MB, {elapsed:.2f}s, "
+        f"{result['pages'] / elapsed:.1f} 页/s, {size_mb / elapsed:.2f} MB/s"
+    )
+
+
+def process_pdf_files_recursively(input_dir, output_root_dir, max_workers=None, force=False):
     """
     递归处理目录中的所有PDF文件
 
+    多个PDF在进程池中并行转换。输出根目录下的清单按内容哈希记录已转换的文件,
+    再次运行时跳过输出比源文件新且内容未变的PDF, 中断后可以继续转换。
+    没有可提取文本的PDF同样记录在清单中, 其空TXT被删除后也不会重复转换。
+
     参数:
         input_dir (str): 输入根目录
         output_root_dir (str): 输出根目录
+        max_workers (int): 并行转换的进程数, 默认为CPU核数
+        force (bool): 忽略清单, 重新转换全部文件
     """
     # 确保输出根目录存在
     ensure_directory_exists(output_root_dir)
 
-    # 遍历输入目录中的所有项目
-    for item in os.listdir(input_dir):
-        item_path = os.path.join(input_dir, item)
-
-        # 如果是目录，则递归处理
-        if os.path.isdir(item_path):
-            # 构建对应的输出目录
-            relative_path = os.path.relpath(item_path, input_dir)
-            output_dir = os.path.join(output_root_dir, relative_path)
-            ensure_directory_exists(output_dir)
-
-            # 递归处理子目录
-            process_pdf_files_recursively(item_path, output_root_dir)
-
-        # 如果是PDF文件，则进行转换
-        elif os.path.isfile(item_path) and item.lower().endswith('.pdf'):
-            # 确定该文件对应的输出目录
-            relative_dir = os.path.relpath(os.path.dirname(item_path), input_dir)
-            output_dir = os.path.join(output_root_dir, relative_dir)
-            ensure_directory_exists(output_dir)
+    manifest = {} if force else load_manifest(output_root_dir)
+    # 相对路径 -> 内容哈希, 内容哈希 -> 已存在的输出, 以及没有文本的内容哈希
+    source_hashes = {}
+    known_outputs = {}
+    empty_digests = {digest for digest, entry in manifest.items() if entry.get('empty')}
+    jobs = _find_pdf_files(input_dir, output_root_dir)
+    txt_paths = {relative_path: txt_path for _, relative_path, txt_path in jobs}
+    for digest, entry in manifest.items():
+        for relative_path in entry['sources']:
+            source_hashes[relative_path] = digest
+            txt_path = txt_paths.get(relative_path)
+            if txt_path is not None and os.path.exists(txt_path):
+                known_outputs.setdefault(digest, txt_path)
+
+    pending = []
+    skipped = 0
+    for pdf_path, relative_path, txt_path in jobs:
+        digest = source_hashes.get(relative_path)
+        recorded = manifest[digest]['sources'][relative_path] if digest else None
+        if _is_up_to_date(pdf_path, txt_path, recorded, digest in empty_digests):
+            skipped += 1
+        else:
+            pending.append((pdf_path, relative_path, txt_path))
+    print(f"共 {len(jobs)} 个PDF文件, {skipped} 个已是最新, {len(pending)} 个待转换")
+    if not pending:
+        return
 
-            # 转换PDF为TXT
-            pdf_to_txt(item_path, output_dir)
+    def record(relative_path, pdf_path, digest, pages, empty):
+        old = source_hashes.pop(relative_path, None)
+        if old is not None and old in manifest:
+            manifest[old]['sources'].pop(relative_path, None)
+            if not manifest[old]['sources']:
+                del manifest[old]
+        pdf_stat = os.stat(pdf_path)
+        entry = manifest.setdefault(digest, {'pages': pages, 'empty': empty, 'sources': {}})
+        entry['sources'][relative_path] = [pdf_stat.st_size, pdf_stat.st_mtime_ns]
+        source_hashes[relative_path] = digest
+
+    start = time.perf_counter()
+    last_save = start
+    total_pages = 0
+    total_bytes = 0
+    failed = 0
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker,
+            initargs=(known_outputs, empty_digests)
+        ) as executor:
+            futures = {
+                executor.submit(_convert_worker, pdf_path, txt_path): (pdf_path, relative_path, txt_path)
+                for pdf_path, relative_path, txt_path in pending
+            }
+            try:
+                for future in as_completed(futures):
+                    pdf_path, relative_path, txt_path = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # 例如工作进程崩溃, 进程池会让其余任务同样失败
+                        result = {'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+
+                    if result['status'] == 'error':
+                        failed += 1
+                        print(f"处理 {pdf_path} 时发生错误: {result['error']}")
+                        continue
+                    for page_num in result['empty_pages']:
+                        print(f"警告: {pdf_path} 第 {page_num} 页没有可提取的文本")
+                    if result['status'] == 'converted':
+                        total_pages += result['pages']
+                        total_bytes += os.path.getsize(pdf_path)
+                        empty = len(result['empty_pages']) == result['pages']
+                        print(f"已处理: {pdf_path} -> {txt_path} ({_format_throughput(result, pdf_path)})")
+                    else:
+                        entry = manifest.get(result['hash'], {})
+                        result['pages'] = entry.get('pages', 0)
+                        empty = entry.get('empty', False)
+                        if result['status'] == 'empty':
+                            print(f"内容与已确认无文本的文件相同, 跳过转换: {pdf_path}")
+                        elif result['status'] == 'copied':
+                            print(f"内容与已转换的文件相同, 复制输出: {pdf_path} -> {txt_path}")
+                        else:
+                            print(f"内容未变, 跳过转换: {pdf_path} -> {txt_path}")
+                    record(relative_path, pdf_path, result['hash'], result['pages'], empty)
+
+                    if time.perf_counter() - last_save >= MANIFEST_SAVE_INTERVAL:
+                        save_manifest(output_root_dir, manifest)
+                        last_save = time.perf_counter()
+            except BaseException:
+                # 中断时不再等待尚未开始的转换
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+    finally:
+        # 中断时也保存已完成的部分
+        save_manifest(output_root_dir, manifest)
+
+    elapsed = max(time.perf_counter() - start, 1e-6)
+    print(
+        f"转换完成: {len(pending) - failed} 个成功, {failed} 个失败, 用时 {elapsed:.1f}s, "
+        f"{total_pages / elapsed:.1f} 页/s, {total_bytes / (1 << 20) / elapsed:.2f} MB/s"
+    )
 
 import os
 
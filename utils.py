@@ -1,41 +1,94 @@
 # config_loader.py
+import os
+import re
 import sys
+import tempfile
+import threading
 from types import SimpleNamespace
 
-_cfg = None  # 全局单例
+CONFIG_FILE = 'config.py'
+
+_cfg = None  # 全局单例, 当前配置快照
+_cfg_stamp = None  # 加载 _cfg 时 config.py 的 (mtime_ns, size)
+_cfg_lock = threading.RLock()
+
+
+class ConfigSnapshot(SimpleNamespace):
+    """只读配置快照: 修改配置请使用 set_config"""
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"Config is read-only, use set_config('{key}', ...)")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"Config is read-only, cannot delete '{key}'")
+
+
+def _file_stamp():
+    stat = os.stat(CONFIG_FILE)
+    return stat.st_mtime_ns, stat.st_size
+
 
 def load_config():
     """加载或重新加载 config.py"""
-    global _cfg
-    config_vars = {}
-    with open('config.py', 'r', encoding='utf-8') as f:
-        exec(f.read(), {}, config_vars)
-    _cfg = SimpleNamespace(**{
-        k: v for k, v in config_vars.items()
-        if not k.startswith('__')
-    })
+    global _cfg, _cfg_stamp
+    with _cfg_lock:
+        stamp = _file_stamp()
+        config_vars = {}
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            exec(f.read(), {}, config_vars)
+        _cfg = ConfigSnapshot(**{
+            k: v for k, v in config_vars.items()
+            if not k.startswith('__')
+        })
+        _cfg_stamp = stamp
+        return _cfg
 
 def config():
-    """获取全局单例 config"""
+    """获取全局单例 config
 
-    load_config()
+    只有 config.py 的修改时间或大小变化时才重新 exec, 其余调用只需一次 stat。
+    返回的快照不可修改, 可以在多线程间安全共享。
+    """
+    try:
+        stamp = _file_stamp()
+    except OSError:
+        # 文件暂时不可读(例如正在被替换), 继续使用上一次的配置
+        if _cfg is not None:
+            return _cfg
+        raise
+    if stamp != _cfg_stamp:
+        with _cfg_lock:
+            if _file_stamp() != _cfg_stamp:
+                load_config()
     return _cfg
 
 def set_config(key: str, value):
-    """修改配置参数"""
-    if not hasattr(_cfg, key):
-        raise AttributeError(f"Config has no attribute '{key}'")
-    setattr(_cfg, key, value)
-    # save to config.py
-    with open('config.py', 'r+', encoding='utf-8') as f:
-        lines = f.readlines()
-        f.seek(0)
-        for line in lines:
-            if line.startswith(key):
-                f.write(f"{key} = {repr(value)}\n")
-            else:
-                f.write(line)
-        f.truncate()
+    """修改配置参数
+
+    先写入临时文件再原子替换 config.py, 读者不会看到写了一半的文件。
+    """
+    with _cfg_lock:
+        if not hasattr(config(), key):
+            raise AttributeError(f"Config has no attribute '{key}'")
+        pattern = re.compile(rf"^{re.escape(key)}\s*=")
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        lines = [
+            f"{key} = {repr(value)}\n" if pattern.match(line) else line
+            for line in lines
+        ]
+        config_dir = os.path.dirname(os.path.abspath(CONFIG_FILE))
+        fd, tmp_path = tempfile.mkstemp(dir=config_dir, prefix='.config.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            os.chmod(tmp_path, os.stat(CONFIG_FILE).st_mode & 0o777)
+            os.replace(tmp_path, CONFIG_FILE)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        # 同一秒内写入时 mtime 可能不变, 直接重新加载而不依赖文件时间戳
+        return load_config()
 
 # 初始化
-load_config()
\ No newline at end of file
+load_config()